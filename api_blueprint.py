@@ -1,47 +1,224 @@
 import os
-from flask import Blueprint, jsonify, request, current_app, send_from_directory
+from datetime import datetime
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 import re
+import mariadb
+import requests
 from helpers import search_google_books_by_isbn, search_google_books_multiple, insert_book, get_all_books, filter_books, validate_isbn
-from werkzeug.utils import secure_filename
-from helpers import update_book_ebook_path,get_ebook_path_by_book_id,create_upload_folder,update_physical_copy
-
-ALLOWED_EXTENSIONS = {'pdf', 'epub', 'mobi', 'azw3'}
+from helpers import update_book_ebook_path,get_ebook_by_book_id,update_physical_copy,get_ebook_store_stats
+from helpers import warm_all_covers, get_db_pool_stats, get_books_page, DEFAULT_PAGE_SIZE, search_library
+from helpers import get_book, get_book_tags, iter_books, add_books_by_isbn, ISBN_BATCH_LIMIT
+from helpers import get_enrichment_status, retry_failed_enrichment
+from helpers import STATUS_OPTIONS, update_book_status_by_id, update_book_status_and_rating_by_id, remove_book_by_id
+from helpers import bulk_update_books, facet_index
+from export import EXPORT_FORMATS, export_chunks, export_columns
+from importer import start_import, get_import
+from http_cache import revision_etag
+from covers import prefetcher as cover_prefetcher
+from ebooks import store as ebook_store, send_ebook, UploadError, OffsetMismatch, UPLOAD_CHUNK_SIZE
+from google_cache import GoogleBooksError, fetch_volumes, cache as google_books_cache
 
 api_bp = Blueprint('api', __name__)
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
 @api_bp.route('/sample')
 def sample_api():
     return jsonify(message="This is a sample API endpoint.")
 
+def get_listing_filters():
+    """Read the shared listing filters from the query string."""
+    tag_ids = [int(tag_id) for tag_id in request.args.getlist('tags') if tag_id.isdigit()]
+    return {
+        'status_filters': request.args.getlist('status_filter') or None,
+        'format_filters': request.args.getlist('format_filter') or None,
+        'rating_filters': request.args.getlist('rating_filter') or None,
+        'tag_ids': tag_ids or None,
+    }
+
+def get_requested_fields():
+    """Read fields=a,b (repeatable or comma separated) from the query string."""
+    return [f.strip() for value in request.args.getlist('fields') for f in value.split(',') if f.strip()]
+
 @api_bp.route('/get_books')
+@revision_etag
 def api_get_books():
-    """Get books with optional filtering"""
-    # Get filter parameters from query string
-    status_filters = request.args.getlist('status_filter')
-    format_filters = request.args.getlist('format_filter')
-    rating_filters = request.args.getlist('rating_filter')
-    tag_ids = request.args.getlist('tags')
-    
-    # Convert tag IDs to integers
-    if tag_ids:
-        tag_ids = [int(tag_id) for tag_id in tag_ids if tag_id.isdigit()]
-    
-    # Check if any filters are applied
-    if status_filters or format_filters or rating_filters or tag_ids:
-        books = filter_books(
-            status_filters=status_filters if status_filters else None,
-            format_filters=format_filters if format_filters else None,
-            rating_filters=rating_filters if rating_filters else None,
-            tag_ids=tag_ids if tag_ids else None
+    """Get books with optional filtering.
+
+    Passing limit and/or cursor returns a keyset-paginated page as
+    {"books": [...], "next_cursor": ...}; fields=id,title,... (repeatable or
+    comma separated) projects each book onto the given keys. Without any of
+    these the whole filtered library is returned as a plain list.
+    """
+    filters = get_listing_filters()
+    fields = get_requested_fields()
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+
+    if limit is not None or cursor is not None:
+        books, next_cursor = get_books_page(
+            limit=limit if limit is not None else DEFAULT_PAGE_SIZE,
+            cursor=cursor,
+            fields=fields or None,
+            **filters
         )
+        return jsonify(books=books, next_cursor=next_cursor)
+
+    if fields:
+        books, _ = get_books_page(limit=None, fields=fields, **filters)
+        return jsonify(books)
+
+    # Check if any filters are applied
+    if any(filters.values()):
+        books = filter_books(**filters)
     else:
         books = get_all_books()
-    
+
     return jsonify(books)
 
+@api_bp.route('/search_library')
+@revision_etag
+def api_search_library():
+    """Search the library by title, author, series, publisher and description.
+
+    Accepts the listing filters plus limit, offset and fields; returns
+    {"books": [...], "next_offset": ...} ranked by relevance.
+    """
+    fields = get_requested_fields()
+    books, next_offset = search_library(
+        request.args.get('q', ''),
+        limit=request.args.get('limit', 20),
+        offset=request.args.get('offset', 0),
+        fields=fields or None,
+        **get_listing_filters()
+    )
+    return jsonify(books=books, next_offset=next_offset)
+
+@api_bp.route('/books/<int:book_id>')
+def api_get_book(book_id):
+    """Get one book by id. Accepts fields like /get_books."""
+    book = get_book(book_id, fields=get_requested_fields() or None)
+    if book is None:
+        return jsonify(success=False, message="Book not found"), 404
+    return jsonify(book)
+
+@api_bp.route('/books/bulk', methods=['POST'])
+def api_bulk_update_books():
+    """Apply {"operations": [{"ids": [...], "status": ..., "add_tags": [...]}, ...]} in one transaction."""
+    data = request.get_json(silent=True) or {}
+    try:
+        results = bulk_update_books(data.get('operations'))
+    except ValueError as e:
+        return jsonify(success=False, message=str(e)), 400
+    except mariadb.Error as e:
+        return jsonify(success=False, message=f"Could not apply changes: {e}"), 500
+    summary = {}
+    for result in results:
+        summary[result['outcome']] = summary.get(result['outcome'], 0) + 1
+    return jsonify(success=True, results=results, summary=summary)
+
+@api_bp.route('/books/<int:book_id>', methods=['PATCH'])
+def api_update_book(book_id):
+    """Set a book's status, and its rating if one is given."""
+    data = request.get_json(silent=True) or {}
+    status = data.get('status')
+    if not isinstance(status, str) or status not in STATUS_OPTIONS:
+        return jsonify(success=False, message=f"Status must be one of: {', '.join(STATUS_OPTIONS)}"), 400
+    if 'rating' in data:
+        rating = data['rating']
+        if isinstance(rating, bool) or not isinstance(rating, int) or not 0 <= rating <= 5:
+            return jsonify(success=False, message="Rating must be between 0 and 5"), 400
+        success = update_book_status_and_rating_by_id(book_id, status, rating)
+    else:
+        success = update_book_status_by_id(book_id, status)
+    return jsonify(success=success)
+
+@api_bp.route('/books/<int:book_id>', methods=['DELETE'])
+def api_remove_book(book_id):
+    return jsonify(success=remove_book_by_id(book_id))
+
+@api_bp.route('/books/<int:book_id>/tags')
+def api_get_book_tags(book_id):
+    return jsonify(tags=get_book_tags(book_id))
+
+@api_bp.route('/export')
+def api_export():
+    """Stream the library as NDJSON (default), CSV or JSON.
+
+    Accepts the listing filters and fields like /get_books. Rows are read
+    in batches while the response is written, so memory use stays flat.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify(success=False, message=f"format must be one of {', '.join(EXPORT_FORMATS)}"), 400
+    fields = get_requested_fields() or None
+    books = iter_books(fields=fields, **get_listing_filters())
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"bookvault-{datetime.now():%Y%m%d}.{extension}"
+    return Response(
+        stream_with_context(export_chunks(books, fmt, export_columns(fields))),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+@api_bp.route('/import', methods=['POST'])
+def api_import():
+    """Start a bulk import of a CSV or Goodreads export.
+
+    Takes the file as the 'file' form field or as the raw request body.
+    Pass enrich=0 to skip Google Books lookups. Returns 202 with a job id
+    whose progress is at /api/import/<job_id>.
+    """
+    upload = request.files.get('file')
+    data = upload.read() if upload is not None else request.get_data()
+    if not data:
+        return jsonify(success=False, message="No CSV file provided"), 400
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        return jsonify(success=False, message="CSV must be UTF-8 encoded"), 400
+    enrich = request.args.get('enrich', request.form.get('enrich', '1')) not in ('0', 'false', 'no')
+    job_id = start_import(text, enrich=enrich)
+    return jsonify(success=True, job_id=job_id), 202
+
+@api_bp.route('/import/<job_id>')
+def api_import_status(job_id):
+    report = get_import(job_id)
+    if report is None:
+        return jsonify(success=False, message="Unknown import"), 404
+    return jsonify(report)
+
+@api_bp.route("/warm_covers", methods=["POST"])
+def api_warm_covers():
+    queued = warm_all_covers()
+    return jsonify(success=True, queued=queued)
+
+@api_bp.route("/enrichment")
+def api_enrichment_status():
+    return jsonify(get_enrichment_status())
+
+@api_bp.route("/enrichment/retry", methods=["POST"])
+def api_enrichment_retry():
+    return jsonify(success=True, queued=retry_failed_enrichment())
+
+@api_bp.route("/db_pool_stats")
+def api_db_pool_stats():
+    return jsonify(get_db_pool_stats())
+
+@api_bp.route("/facet_index_stats")
+def api_facet_index_stats():
+    return jsonify(facet_index.stats())
+
+@api_bp.route("/ebook_store_stats")
+def api_ebook_store_stats():
+    return jsonify(get_ebook_store_stats())
+
+@api_bp.route("/cover_cache_stats")
+def api_cover_cache_stats():
+    return jsonify(cover_prefetcher.stats())
+
+@api_bp.route("/google_cache_stats")
+def api_google_cache_stats():
+    return jsonify(google_books_cache.stats())
+
 @api_bp.route("/isbn_lookup", methods=["POST"])
 def api_isbn_lookup():
     print("API ISBN Called")
@@ -61,30 +238,110 @@ def api_isbn_lookup():
     else:
         return "Not Found", 404
 
+@api_bp.route("/isbn_lookup/batch", methods=["POST"])
+def api_isbn_lookup_batch():
+    """Add many scanned ISBNs at once.
+
+    Takes {"isbns": [...]} and returns {"results": [...], "summary": {...}}
+    with one outcome per distinct ISBN: added, exists, multiple (with
+    candidates to choose from), not_found, invalid or error.
+    """
+    data = request.get_json(silent=True) or {}
+    isbns = data.get('isbns')
+    if not isinstance(isbns, list) or not isbns:
+        return jsonify(success=False, message="isbns must be a non-empty list"), 400
+    if len(isbns) > ISBN_BATCH_LIMIT:
+        return jsonify(success=False, message=f"At most {ISBN_BATCH_LIMIT} ISBNs per request"), 400
+    results = add_books_by_isbn(isbns)
+    summary = {}
+    for result in results:
+        summary[result['outcome']] = summary.get(result['outcome'], 0) + 1
+    return jsonify(success=True, results=results, summary=summary)
+
+@api_bp.errorhandler(413)
+def api_request_too_large(error):
+    return jsonify(success=False, message="Upload is too large"), 413
+
 @api_bp.route("/upload_ebook/<int:book_id>", methods=["POST"])
 def api_upload_ebook(book_id):
-    create_upload_folder()
-    if "ebook" not in request.files:
-        return jsonify(success=False, message="No file part"), 400
-    file = request.files["ebook"]
-    if file.filename == "":
-        return jsonify(success=False, message="No selected file"), 400
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{book_id}_{filename}")
-        file.save(save_path)
-        update_book_ebook_path(book_id, save_path)
-        return jsonify(success=True, message="File uploaded")
+    """Upload an ebook as the 'ebook' form field or as the raw request body.
+
+    A raw body is streamed to disk without being spooled first; its name
+    comes from the filename query parameter.
+    """
+    if request.mimetype == 'multipart/form-data':
+        if "ebook" not in request.files:
+            return jsonify(success=False, message="No file part"), 400
+        file = request.files["ebook"]
+        if file.filename == "":
+            return jsonify(success=False, message="No selected file"), 400
+        filename, stream = file.filename, file.stream
     else:
-        return jsonify(success=False, message="File type not allowed"), 400
+        filename, stream = request.args.get('filename', ''), request.stream
+        if not filename:
+            return jsonify(success=False, message="filename is required"), 400
+    try:
+        saved = ebook_store.save(filename, stream, length=request.content_length)
+    except UploadError as e:
+        return jsonify(success=False, message=str(e)), e.status_code
+    update_book_ebook_path(book_id, saved['path'], saved['sha256'], saved['size'], saved['filename'])
+    return jsonify(success=True, message="File uploaded", sha256=saved['sha256'], size=saved['size'],
+                   deduplicated=saved['deduplicated'])
+
+@api_bp.route("/upload_ebook/<int:book_id>/resumable", methods=["POST"])
+def api_start_ebook_upload(book_id):
+    """Open a resumable upload for {"filename": ..., "size": ...}."""
+    data = request.get_json(silent=True) or {}
+    try:
+        upload_id = ebook_store.start_upload(book_id, data.get('filename'), data.get('size'))
+    except UploadError as e:
+        return jsonify(success=False, message=str(e)), e.status_code
+    return jsonify(success=True, upload_id=upload_id, offset=0, chunk_size=UPLOAD_CHUNK_SIZE), 201
+
+@api_bp.route("/uploads/<upload_id>", methods=["GET"])
+def api_ebook_upload_status(upload_id):
+    try:
+        status = ebook_store.upload_status(upload_id)
+    except UploadError as e:
+        return jsonify(success=False, message=str(e)), e.status_code
+    return jsonify(success=True, offset=status['offset'], size=status['size'])
+
+@api_bp.route("/uploads/<upload_id>", methods=["PUT"])
+def api_ebook_upload_chunk(upload_id):
+    """Append the request body at the Upload-Offset header.
+
+    A 409 response carries the offset the upload is really at, so the
+    client can resume from there.
+    """
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify(success=False, message="Upload-Offset header is required"), 400
+    try:
+        status = ebook_store.append(upload_id, offset, request.stream)
+    except OffsetMismatch as e:
+        return jsonify(success=False, message=str(e), offset=e.offset), e.status_code
+    except UploadError as e:
+        return jsonify(success=False, message=str(e)), e.status_code
+    if 'sha256' not in status:
+        return jsonify(success=True, complete=False, offset=status['offset'])
+    update_book_ebook_path(status['book_id'], status['path'], status['sha256'], status['size'], status['filename'])
+    return jsonify(success=True, complete=True, offset=status['offset'], sha256=status['sha256'],
+                   deduplicated=status['deduplicated'])
+
+@api_bp.route("/uploads/<upload_id>", methods=["DELETE"])
+def api_abort_ebook_upload(upload_id):
+    try:
+        ebook_store.abort(upload_id)
+    except UploadError as e:
+        return jsonify(success=False, message=str(e)), e.status_code
+    return jsonify(success=True)
 
 @api_bp.route("/download_ebook/<int:book_id>", methods=["GET"])
 def api_download_ebook(book_id):
-    path = get_ebook_path_by_book_id(book_id)
-    if path and os.path.exists(path):
-        directory = os.path.abspath(os.path.dirname(path))
-        filename = os.path.basename(path)
-        return send_from_directory(directory, filename, as_attachment=True)
+    ebook = get_ebook_by_book_id(book_id)
+    if ebook and os.path.exists(ebook['path']):
+        return send_ebook(ebook['path'], ebook['sha256'], ebook['filename'])
     else:
         return jsonify(success=False, message="Ebook not found"), 404
     
@@ -93,21 +350,19 @@ def api_search_books():
     query = request.args.get('q', '').strip()
     if not query:
         return jsonify(results=[])
-    import requests as req
     clean = query.replace('-', '').replace(' ', '')
     if re.match(r'^\d{10}$|^\d{13}$', clean) and validate_isbn(clean):
-        url = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{clean}&maxResults=5"
+        google_query, max_results = f"isbn:{clean}", 5
     else:
-        url = f"https://www.googleapis.com/books/v1/volumes?q={query}&maxResults=20"
+        google_query, max_results = query, 20
     try:
-        resp = req.get(url, timeout=10)
-    except req.exceptions.RequestException:
+        items = fetch_volumes(google_query, max_results)
+    except requests.exceptions.RequestException:
         return jsonify(results=[], error="Could not reach Google Books. Check your connection."), 503
-    if resp.status_code == 429:
-        return jsonify(results=[], error="Google Books API quota exceeded. Try again tomorrow or add an API key."), 429
-    if resp.status_code != 200:
-        return jsonify(results=[], error=f"Google Books returned an error ({resp.status_code})."), 502
-    items = resp.json().get("items", [])
+    except GoogleBooksError as e:
+        if e.status_code == 429:
+            return jsonify(results=[], error="Google Books API quota exceeded. Try again tomorrow or add an API key."), 429
+        return jsonify(results=[], error=f"Google Books returned an error ({e.status_code})."), 502
     results = []
     for item in items:
         info = item["volumeInfo"]
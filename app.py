@@ -1,35 +1,60 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, send_from_directory
+import click
+from flask import Flask, render_template, request, redirect, url_for, jsonify, send_from_directory, send_file, abort
 import os
-from datetime import datetime
+import threading
 from werkzeug.utils import secure_filename
 
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
-from api_blueprint import api_bp
+from api_blueprint import api_bp, api_get_books
+from http_cache import revision_etag
+from export import EXPORT_FORMATS, export_chunks, export_columns
+from importer import import_csv
+from covers import prefetcher as cover_prefetcher, image_mimetype
+from ebooks import store as ebook_store, CompactionRefused, EBOOK_MAX_BYTES, UPLOAD_CHUNK_SIZE
 from helpers import (
     insert_book,
     get_all_books,
     update_book_status,
+    update_book_status_by_id,
     remove_book,
+    remove_book_by_id,
     get_books_stats,
-    create_table,
+    get_library_summary,
+    search_google_books_by_isbn,
+    validate_isbn,
+    migrate_database,
     update_book_status_and_rating,
-    get_read_authors,
-    find_new_books_by_authors,
+    update_book_status_and_rating_by_id,
+    get_recommendations,
+    refresh_recommendations,
+    recommendation_job,
+    enrichment_job,
+    run_enrichment,
+    ebook_compaction_job,
+    compact_ebooks,
+    FACET_INDEX_ENABLED,
+    rebuild_facet_index,
     get_all_tags,
     create_tag,
     add_tag_to_book,
     remove_tag_from_book,
+    get_book_tags,
     filter_books,
     delete_tag,
-    update_tag
+    update_tag,
+    warm_all_covers,
+    gc_covers,
+    iter_books,
+    close_request_db_connection
 )
 
 # Configuration
 STATUS_OPTIONS = ["TBR", "Reading", "Read", "DNF"]
 CACHE_DIR = 'cover_cache'
-UPLOAD_FOLDER = 'ebooks'
+COVER_MAX_AGE = 365 * 24 * 3600
+UPLOAD_FOLDER = ebook_store.root
 
 DB_CONFIG = {
     'user': os.getenv('BOOKVAULT_DBUSER'),
@@ -42,18 +67,58 @@ DB_CONFIG = {
 # App setup
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Room for one ebook plus multipart framing; larger requests get 413 before being read
+app.config['MAX_CONTENT_LENGTH'] = EBOOK_MAX_BYTES + UPLOAD_CHUNK_SIZE
 
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-def _parse_year(date_str):
-    try:
-        return datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S").year
-    except (ValueError, TypeError):
-        return None
+app.teardown_appcontext(close_request_db_connection)
+
+_startup_lock = threading.Lock()
+_started = False
+
+def start_background_work():
+    """Apply migrations, build the facet index and start the background jobs.
+
+    Runs once per serving process, on its first request, so it works the
+    same under any WSGI server. The debug reloader's watcher process never
+    serves requests; the reloaded child has WERKZEUG_RUN_MAIN set.
+    """
+    global _started
+    with _startup_lock:
+        if _started:
+            return
+        migrate_database()
+        if FACET_INDEX_ENABLED:
+            rebuild_facet_index()
+        if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            recommendation_job.start()
+            enrichment_job.start()
+            ebook_compaction_job.start()
+        _started = True
+
+@app.before_request
+def ensure_background_work():
+    if not _started and not app.testing:
+        start_background_work()
+
+def render_library(books, **context):
+    """Render the library page; the header always reflects the full library."""
+    context.setdefault('selected_tags', [])
+    context.setdefault('selected_status', [])
+    context.setdefault('selected_formats', [])
+    context.setdefault('selected_ratings', [])
+    return render_template("index.html",
+                           books=books,
+                           status_options=STATUS_OPTIONS,
+                           tags=get_all_tags(),
+                           **get_library_summary(),
+                           **context)
 
 
 @app.route("/")
+@revision_etag
 def index():
     # Handle filtering
     selected_tags = request.args.getlist('tags')
@@ -61,17 +126,6 @@ def index():
     selected_formats = request.args.getlist('format_filter')
     selected_ratings = request.args.getlist('rating_filter')
 
-    all_books = get_all_books()
-
-    # Header stats always reflect the full library
-    current_year = datetime.now().year
-    total_read = sum(1 for b in all_books if b.get('status') == 'Read')
-    read_this_year = sum(
-        1 for b in all_books
-        if b.get('status') == 'Read' and _parse_year(b.get('last_status_change')) == current_year
-    )
-    current_reading = next((b for b in all_books if b.get('status') == 'Reading'), None)
-
     # Apply filters for the displayed grid
     if selected_tags or selected_status or selected_formats or selected_ratings:
         tag_ids = [int(t) for t in selected_tags if t.isdigit()] if selected_tags else None
@@ -82,74 +136,62 @@ def index():
             tag_ids=tag_ids
         )
     else:
-        books = all_books
+        books = get_all_books()
 
-    tags = get_all_tags()
-    return render_template("index.html",
-                           books=books,
-                           status_options=STATUS_OPTIONS,
-                           tags=tags,
-                           selected_tags=selected_tags,
-                           selected_status=selected_status,
-                           selected_formats=selected_formats,
-                           selected_ratings=selected_ratings,
-                           total_books=len(all_books),
-                           total_read=total_read,
-                           read_this_year=read_this_year,
-                           current_reading=current_reading)
+    return render_library(books,
+                          selected_tags=selected_tags,
+                          selected_status=selected_status,
+                          selected_formats=selected_formats,
+                          selected_ratings=selected_ratings)
 
 @app.route("/api/get_books")
 def get_books():
     """Get books with optional filtering - kept for backward compatibility"""
-    # Get filter parameters from query string
-    status_filters = request.args.getlist('status_filter')
-    format_filters = request.args.getlist('format_filter')
-    rating_filters = request.args.getlist('rating_filter')
-    tag_ids = request.args.getlist('tags')
-    
-    # Convert tag IDs to integers
-    if tag_ids:
-        tag_ids = [int(tag_id) for tag_id in tag_ids if tag_id.isdigit()]
-    
-    # Check if any filters are applied
-    if status_filters or format_filters or rating_filters or tag_ids:
-        books = filter_books(
-            status_filters=status_filters if status_filters else None,
-            format_filters=format_filters if format_filters else None,
-            rating_filters=rating_filters if rating_filters else None,
-            tag_ids=tag_ids if tag_ids else None
-        )
-    else:
-        books = get_all_books()
-    
-    return jsonify(books)
+    return api_get_books()
+
+def requested_book_id(data):
+    """The book id from a mutation request body, or None to fall back to title/author."""
+    book_id = data.get("id")
+    if isinstance(book_id, bool):
+        return None
+    if isinstance(book_id, int):
+        return book_id
+    if isinstance(book_id, str) and book_id.isdigit():
+        return int(book_id)
+    return None
 
 @app.route("/update_status", methods=["POST"])
 def update_status():
     data = request.json or {}
+    book_id = requested_book_id(data)
     title = data.get("title")
     author = data.get("author")
     new_status = data.get("status")
     
-    if not title or not author or not new_status:
+    if (book_id is None and (not title or not author)) or not new_status:
         return jsonify(success=False, message="Missing required fields"), 400
     
-    if not isinstance(title, str) or not isinstance(author, str) or not isinstance(new_status, str):
+    if not isinstance(new_status, str) or (book_id is None and (not isinstance(title, str) or not isinstance(author, str))):
         return jsonify(success=False, message="Invalid field types"), 400
     
     if new_status not in STATUS_OPTIONS:
         return jsonify(success=False, message=f"Status must be one of: {', '.join(STATUS_OPTIONS)}"), 400
     
-    success = update_book_status(title, author, new_status)
+    if book_id is not None:
+        success = update_book_status_by_id(book_id, new_status)
+    else:
+        success = update_book_status(title, author, new_status)
     
     return jsonify(success=success)
 
 @app.route("/remove_book", methods=["POST"])
 def remove_book_route():
-    data = request.json
-    title = data.get("title")
-    author = data.get("author")
-    remove_book(title, author)
+    data = request.json or {}
+    book_id = requested_book_id(data)
+    if book_id is not None:
+        remove_book_by_id(book_id)
+    else:
+        remove_book(data.get("title"), data.get("author"))
     return jsonify(success=True)
 
 @app.route("/stats")
@@ -179,18 +221,33 @@ def stats():
 def serve_cover_cache(filename):
     return send_from_directory(CACHE_DIR, filename)
 
+@app.route('/covers/<int:book_id>/<variant>')
+def serve_cover(book_id, variant):
+    """Serve a resized cover. The URL carries the cover's version, so
+    browsers may keep it forever and revalidate with the ETag otherwise."""
+    key = request.args.get('v', '')
+    path = cover_prefetcher.variant_file(book_id, key, variant)
+    if path is None:
+        abort(404)
+    etag = os.path.basename(path)
+    response = send_file(os.path.abspath(path), mimetype=image_mimetype(path), etag=etag,
+                         max_age=COVER_MAX_AGE, conditional=True)
+    response.headers['Cache-Control'] = f'public, max-age={COVER_MAX_AGE}, immutable'
+    return response
+
 @app.route("/update_status_rating", methods=["POST"])
 def update_status_rating():
     data = request.json or {}
+    book_id = requested_book_id(data)
     title = data.get("title")
     author = data.get("author")
     new_status = data.get("status") if data else None
     rating = data.get("rating", 0)
     
-    if not title or not author or new_status is None:
+    if (book_id is None and (not title or not author)) or new_status is None:
         return jsonify(success=False, message="Missing required fields"), 400
     
-    if not isinstance(title, str) or not isinstance(author, str):
+    if book_id is None and (not isinstance(title, str) or not isinstance(author, str)):
         return jsonify(success=False, message="Invalid field types"), 400
     
     if not isinstance(new_status, str) or new_status not in STATUS_OPTIONS:
@@ -203,7 +260,10 @@ def update_status_rating():
     except (ValueError, TypeError):
         return jsonify(success=False, message="Invalid rating value"), 400
     
-    success = update_book_status_and_rating(title, author, new_status, rating_value)
+    if book_id is not None:
+        success = update_book_status_and_rating_by_id(book_id, new_status, rating_value)
+    else:
+        success = update_book_status_and_rating(title, author, new_status, rating_value)
     
     return jsonify(success=success)
 
@@ -223,35 +283,16 @@ def isbn_lookup():
         insert_book(book)
         return redirect(url_for("index", added=book['title']))
     elif len(results) > 1:
-        all_books = get_all_books()
-        tags = get_all_tags()
-        current_year = datetime.now().year
-        total_read = sum(1 for b in all_books if b.get('status') == 'Read')
-        read_this_year = sum(
-            1 for b in all_books
-            if b.get('status') == 'Read' and _parse_year(b.get('last_status_change')) == current_year
-        )
-        current_reading = next((b for b in all_books if b.get('status') == 'Reading'), None)
-        return render_template("index.html",
-                               books=all_books,
-                               status_options=STATUS_OPTIONS,
-                               search_results=results,
-                               tags=tags,
-                               selected_tags=[],
-                               selected_status=[],
-                               selected_formats=[],
-                               selected_ratings=[],
-                               total_books=len(all_books),
-                               total_read=total_read,
-                               read_this_year=read_this_year,
-                               current_reading=current_reading)
+        return render_library(get_all_books(), search_results=results)
     else:
         return redirect(url_for("index"))
     
 @app.route("/recommendations")
 def recommendations():
-    authors = get_read_authors()
-    new_books = find_new_books_by_authors(authors)
+    new_books = get_recommendations()
+    if not new_books:
+        # Nothing stored yet: ask the scheduler for a refresh instead of blocking the page
+        recommendation_job.trigger()
     return render_template("recommendations.html", books=new_books)
 
 @app.route("/add_recommended_book", methods=["POST"])
@@ -324,7 +365,9 @@ def add_tag_to_book_route():
     
     if book_id and tag_id:
         success = add_tag_to_book(book_id, tag_id)
-        return jsonify(success=success)
+        if success:
+            return jsonify(success=True, tags=get_book_tags(book_id))
+        return jsonify(success=False)
     return jsonify(success=False, message="Book ID and Tag ID are required")
 
 @app.route("/remove_tag_from_book", methods=["POST"])
@@ -335,11 +378,88 @@ def remove_tag_from_book_route():
     
     if book_id and tag_id:
         success = remove_tag_from_book(book_id, tag_id)
-        return jsonify(success=success)
+        if success:
+            return jsonify(success=True, tags=get_book_tags(book_id))
+        return jsonify(success=False)
     return jsonify(success=False, message="Book ID and Tag ID are required")
 
 app.register_blueprint(api_bp, url_prefix='/api')
 
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations."""
+    applied = migrate_database()
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        print("Schema is up to date")
+
+@app.cli.command("refresh-recommendations")
+@click.option("--force", is_flag=True, help="Search every read author again, not just changed ones.")
+def refresh_recommendations_command(force):
+    """Refresh the stored recommendations."""
+    result = refresh_recommendations(force=force)
+    print(f"Refreshed {result['refreshed']} authors, {result['pending']} pending, {result['removed']} removed")
+
+@app.cli.command("enrich")
+def enrich_command():
+    """Look up metadata for every book waiting for enrichment."""
+    result = run_enrichment()
+    print(f"Enriched {result['enriched']} books, {result['retrying']} will be retried, "
+          f"{result['failed']} failed")
+
+@app.cli.command("export")
+@click.option("--format", "fmt", type=click.Choice(list(EXPORT_FORMATS)), default="ndjson", show_default=True)
+@click.option("--output", "-o", type=click.File("w", encoding="utf-8"), default="-",
+              help="File to write, stdout by default.")
+def export_command(fmt, output):
+    """Export the whole library without loading it into memory."""
+    for chunk in export_chunks(iter_books(), fmt, export_columns()):
+        output.write(chunk)
+
+@app.cli.command("import-books")
+@click.argument("csv_file", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--no-enrich", is_flag=True, help="Skip Google Books metadata lookups.")
+def import_books_command(csv_file, no_enrich):
+    """Import books from a CSV file or Goodreads library export."""
+    def progress(report):
+        print(f"{report.processed}/{report.total} rows, {report.imported} imported, "
+              f"{len(report.errors)} errors")
+
+    report = import_csv(csv_file.read(), enrich=not no_enrich, progress=progress)
+    for error in report.errors:
+        print(f"line {error['line']}: {error['title'] or ''} {error['error']}")
+    summary = report.to_dict()
+    print(f"Imported {summary['imported']} books ({summary['enriched']} enriched, "
+          f"{summary['duplicates']} duplicates, {summary['failed']} failed) in {summary['elapsed']}s")
+
+@app.cli.command("gc-covers")
+def gc_covers_command():
+    """Delete cached covers of removed books and replaced cover URLs."""
+    result = gc_covers()
+    print(f"Removed {result['removed']} files ({result['freed'] // 1024} KiB), "
+          f"migrated {result['migrated']} to the sharded layout")
+
+@app.cli.command("compact-ebooks")
+@click.option("--force", is_flag=True, help="Delete stored ebooks even if no book references any of them.")
+def compact_ebooks_command(force):
+    """Move ebooks into the content-addressed store and delete unused files."""
+    try:
+        result = compact_ebooks(force=force)
+    except CompactionRefused as e:
+        raise click.ClickException(f"{e}. Check the database settings, or pass --force.")
+    print(f"Migrated {result['migrated']} ebooks, removed {result['removed']} unused files "
+          f"({result['freed'] // 1024} KiB)")
+    print(f"{result['books']} ebooks stored as {result['files']} files, "
+          f"deduplication saves {result['saved_bytes'] // 1024} KiB")
+
+@app.cli.command("warm-covers")
+def warm_covers_command():
+    """Download every missing cover, e.g. after a bulk import."""
+    queued = warm_all_covers()
+    print(f"Queued {queued} cover downloads")
+    cover_prefetcher.wait()
+    print("Cover cache is warm")
+
 if __name__ == "__main__":
-    create_table()
     app.run(debug=True, port=5001, host='0.0.0.0')
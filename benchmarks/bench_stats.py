@@ -0,0 +1,120 @@
+"""Compare get_books_stats() with the old get_all_books()-based version.
+
+Seeds a synthetic library into the configured database and times both
+implementations. Point BOOKVAULT_DBNAME at a scratch database: --seed
+deletes every book in it first.
+
+    BOOKVAULT_DBNAME=bookvault_bench python benchmarks/bench_stats.py --seed --books 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+import helpers
+
+STATUSES = ["TBR", "Reading", "Read", "DNF"]
+
+
+def seed(book_count, author_count=2000, tag_count=40, batch_size=5000):
+    conn = helpers.get_db_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM book_tags")
+    cur.execute("DELETE FROM books")
+    cur.execute("DELETE FROM tags")
+    cur.executemany("INSERT INTO tags (name, color) VALUES (%s, %s)",
+                    [(f"Tag {i}", '#007bff') for i in range(tag_count)])
+    cur.execute("SELECT id FROM tags")
+    tag_ids = [row[0] for row in cur.fetchall()]
+
+    rng = random.Random(42)
+    start = datetime(2015, 1, 1)
+    for offset in range(0, book_count, batch_size):
+        rows = []
+        for i in range(offset, min(offset + batch_size, book_count)):
+            status = rng.choice(STATUSES)
+            changed = start + timedelta(days=rng.randrange(3650))
+            author = f"Author {rng.randrange(author_count)}"
+            if rng.random() < 0.05:
+                # Case variants must stay separate authors in the breakdown
+                author = author.lower()
+            rows.append((f"Synthetic Book {i}", author, None,
+                         status, changed, "x" * rng.randrange(200, 2000), rng.randrange(6)))
+        cur.executemany("""
+            INSERT INTO books (title, author, cover, status, last_status_change, description, rating)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+    conn.commit()
+
+    cur.execute("SELECT id FROM books")
+    book_ids = [row[0] for row in cur.fetchall()]
+    links = {(book_id, rng.choice(tag_ids)) for book_id in book_ids for _ in range(rng.randrange(4))}
+    links = list(links)
+    for offset in range(0, len(links), batch_size):
+        cur.executemany("INSERT INTO book_tags (book_id, tag_id) VALUES (%s, %s)",
+                        links[offset:offset + batch_size])
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def legacy_get_books_stats():
+    """The previous implementation, kept here only for comparison."""
+    books = helpers.get_all_books()
+    total_books = len(books)
+    status_breakdown = Counter(book['status'].strip() for book in books)
+    author_breakdown = Counter(book['author'].strip() for book in books)
+    tag_breakdown = Counter()
+    for book in books:
+        for tag in book.get('tags', []):
+            tag_breakdown[tag['name']] += 1
+    read_years = Counter()
+    for book in books:
+        if book['status'].strip() == "Read" and book['last_status_change']:
+            year = datetime.strptime(book['last_status_change'], "%Y-%m-%d %H:%M:%S").year
+            read_years[year] += 1
+    return total_books, status_breakdown, author_breakdown, read_years, tag_breakdown
+
+
+def best_of(func, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', action='store_true', help="replace the books in the database with synthetic ones")
+    parser.add_argument('--books', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    helpers.migrate_database()
+    if args.seed:
+        print(f"Seeding {args.books} books...")
+        seed(args.books)
+
+    legacy_time, legacy = best_of(legacy_get_books_stats, args.repeat)
+    sql_time, current = best_of(helpers.get_books_stats, args.repeat)
+
+    assert legacy == current, "aggregate stats differ from the legacy implementation"
+    print(f"books:              {current[0]}")
+    print(f"legacy (rows):      {legacy_time * 1000:9.1f} ms")
+    print(f"aggregate (SQL):    {sql_time * 1000:9.1f} ms")
+    print(f"speedup:            {legacy_time / sql_time:9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
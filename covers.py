@@ -0,0 +1,398 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it the original image is served
+    Image = None  # type: ignore[assignment]
+
+CACHE_DIR = 'cover_cache'
+COVER_FETCH_TIMEOUT = 15
+# Resized variants generated next to every cached cover: name -> max width in px
+COVER_VARIANTS = {'thumb': 200, 'medium': 400}
+COVER_URL_PREFIX = '/covers'
+# Covers are spread over this many subdirectories by book id
+COVER_SHARDS = 256
+# When over max_bytes, evict down to this fraction of it
+EVICT_TO = 0.9
+
+# <book id>-<cover key>, optionally followed by .<variant>.jpg
+_ENTRY_RE = re.compile(r'^(\d+)-([0-9a-f]{12})(?:\.(\w+)\.jpg)?$')
+# Files left by the flat layout used before sharding
+_FLAT_RE = re.compile(r'^(\d+)(?:\.\w+\.jpg)?$')
+
+
+def cover_key(cover_url):
+    """Short hash of a cover URL. A new URL for a book is a new cache entry."""
+    return hashlib.sha1(cover_url.encode('utf-8')).hexdigest()[:12]
+
+
+def image_mimetype(path):
+    """Guess the type of a cached image from its first bytes."""
+    with open(path, 'rb') as f:
+        head = f.read(12)
+    if head.startswith(b'\x89PNG'):
+        return 'image/png'
+    if head.startswith(b'GIF8'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+class CoverPrefetcher:
+    """Download book covers into a bounded cover cache on a thread pool.
+
+    Listings never wait on a download: missing covers are enqueued and the
+    caller keeps using the remote URL until the cached file exists. Fetches
+    for the same book id are deduplicated while one is in flight.
+
+    Entries are named after the book id and a hash of the cover URL and live
+    in one of COVER_SHARDS subdirectories. A changed cover URL is therefore
+    a miss, and the superseded files are deleted once the new cover lands.
+    With max_bytes set, the least recently used covers are evicted whenever
+    the cache grows past it.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_workers=4, timeout=COVER_FETCH_TIMEOUT, max_bytes=0):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        # (book_id, key) -> [bytes on disk, mtime]; scanned lazily
+        self._entries = None
+        # (book_id, key) -> last time the cover was shown or served
+        self._access = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.failures = 0
+        # Bumped whenever a cover lands in or leaves the cache
+        self.generation = 0
+
+    def shard_dir(self, book_id):
+        return os.path.join(self.cache_dir, f"{int(book_id) % COVER_SHARDS:02x}")
+
+    def cache_path(self, book_id, key):
+        return os.path.join(self.shard_dir(book_id), f"{book_id}-{key}")
+
+    def variant_path(self, book_id, key, variant):
+        return f"{self.cache_path(book_id, key)}.{variant}.jpg"
+
+    def is_cached(self, book_id, cover_url):
+        return os.path.exists(self.cache_path(book_id, cover_key(cover_url)))
+
+    def variant_url(self, book_id, key, variant):
+        return f"{COVER_URL_PREFIX}/{book_id}/{variant}?v={key}"
+
+    def build_variants(self, book_id, key, data=None):
+        """Write every COVER_VARIANTS size as a JPEG. Returns False without Pillow."""
+        if Image is None:
+            return False
+        try:
+            if data is None:
+                with open(self.cache_path(book_id, key), 'rb') as f:
+                    data = f.read()
+            with Image.open(io.BytesIO(data)) as original:
+                original = original.convert('RGB')
+                for variant, width in COVER_VARIANTS.items():
+                    image = original.copy()
+                    image.thumbnail((width, width * 2), Image.LANCZOS)
+                    filename = self.variant_path(book_id, key, variant)
+                    tmp_filename = f"{filename}.part"
+                    image.save(tmp_filename, 'JPEG', quality=82, optimize=True, progressive=True)
+                    os.replace(tmp_filename, filename)
+            self._record(book_id, key)
+            return True
+        except OSError as e:
+            print(f"Error resizing cover for book {book_id}: {e}")
+            return False
+
+    def variant_file(self, book_id, key, variant):
+        """Path of a cover variant, resized on first use for covers cached
+        before variants existed. Falls back to the original without Pillow;
+        None if the cover is not cached."""
+        if variant not in COVER_VARIANTS or not _ENTRY_RE.match(f"{book_id}-{key}"):
+            return None
+        if not os.path.exists(self.cache_path(book_id, key)):
+            return None
+        with self._lock:
+            self._access[(book_id, key)] = time.time()
+        path = self.variant_path(book_id, key, variant)
+        if os.path.exists(path) or self.build_variants(book_id, key):
+            return path
+        return self.cache_path(book_id, key)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='cover-prefetch')
+        return self._executor
+
+    def enqueue(self, book_id, cover_url):
+        """Schedule a download. Returns False if not needed or already queued."""
+        if not cover_url:
+            return False
+        with self._lock:
+            if book_id in self._in_flight or self.is_cached(book_id, cover_url):
+                return False
+            future = self._get_executor().submit(self._fetch, book_id, cover_url)
+            self._in_flight[book_id] = future
+        return True
+
+    def _fetch(self, book_id, cover_url):
+        key = cover_key(cover_url)
+        try:
+            os.makedirs(self.shard_dir(book_id), exist_ok=True)
+            response = requests.get(cover_url, timeout=self.timeout)
+            if response.status_code != 200:
+                with self._lock:
+                    self.failures += 1
+                return False
+            filename = self.cache_path(book_id, key)
+            tmp_filename = f"{filename}.part"
+            with open(tmp_filename, 'wb') as f:
+                f.write(response.content)
+            os.replace(tmp_filename, filename)
+            self.build_variants(book_id, key, response.content)
+            self._record(book_id, key)
+            # The cover URL changed: drop the files cached for the old one
+            self.discard(book_id, keep=key)
+            with self._lock:
+                self.generation += 1
+            self.evict()
+            return True
+        except (requests.exceptions.RequestException, OSError) as e:
+            print(f"Error fetching cover for book {book_id}: {e}")
+            with self._lock:
+                self.failures += 1
+            return False
+        finally:
+            with self._lock:
+                self._in_flight.pop(book_id, None)
+
+    def resolve(self, book_id, cover_url):
+        """Return (src, srcset) for displaying a cover.
+
+        Cached covers point at the local thumbnail, with the larger variant
+        in srcset for high-density screens. Uncached covers return the remote
+        URL and no srcset while the download is queued.
+        """
+        if not cover_url:
+            return None, None
+        key = cover_key(cover_url)
+        if not os.path.exists(self.cache_path(book_id, key)):
+            with self._lock:
+                self.misses += 1
+            self.enqueue(book_id, cover_url)
+            return cover_url, None
+        with self._lock:
+            self.hits += 1
+            self._access[(book_id, key)] = time.time()
+        src = self.variant_url(book_id, key, 'thumb')
+        if Image is None:
+            return src, None
+        srcset = f"{src} 1x, {self.variant_url(book_id, key, 'medium')} 2x"
+        return src, srcset
+
+    def warm(self, books):
+        """Enqueue every (id, cover) pair that is not cached yet. Returns the count queued."""
+        return sum(1 for book_id, cover_url in books if self.enqueue(book_id, cover_url))
+
+    def pending(self):
+        with self._lock:
+            return len(self._in_flight)
+
+    def wait(self, timeout=None):
+        """Block until all currently queued fetches have finished."""
+        with self._lock:
+            futures = list(self._in_flight.values())
+        for future in futures:
+            future.result(timeout=timeout)
+
+    def _entry_files(self, book_id, key):
+        base = self.cache_path(book_id, key)
+        return [base] + [self.variant_path(book_id, key, variant) for variant in COVER_VARIANTS]
+
+    def _load_entries(self):
+        """Scan the shards once to learn the size of every entry. Caller holds the lock."""
+        if self._entries is not None:
+            return self._entries
+        entries = {}
+        if os.path.isdir(self.cache_dir):
+            for shard in os.scandir(self.cache_dir):
+                if not shard.is_dir():
+                    continue
+                for item in os.scandir(shard.path):
+                    match = _ENTRY_RE.match(item.name)
+                    if match is None:
+                        continue
+                    stat = item.stat()
+                    entry = entries.setdefault((int(match.group(1)), match.group(2)), [0, 0.0])
+                    entry[0] += stat.st_size
+                    entry[1] = max(entry[1], stat.st_mtime)
+        self._entries = entries
+        return entries
+
+    def _record(self, book_id, key):
+        """Refresh the size of one entry after writing it."""
+        size = 0
+        for path in self._entry_files(book_id, key):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        now = time.time()
+        with self._lock:
+            self._access[(book_id, key)] = now
+            if self._entries is not None:
+                self._entries[(book_id, key)] = [size, now]
+
+    def _remove(self, book_id, key):
+        """Delete one entry's files. Returns the bytes freed."""
+        freed = 0
+        for path in self._entry_files(book_id, key):
+            try:
+                freed += os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._access.pop((book_id, key), None)
+            if self._entries is not None:
+                self._entries.pop((book_id, key), None)
+        return freed
+
+    def discard(self, book_id, keep=None):
+        """Delete every cached cover of a book except the entry ``keep``.
+
+        Used when a book is removed or its cover URL changes. Returns the
+        bytes freed.
+        """
+        shard = self.shard_dir(book_id)
+        if not os.path.isdir(shard):
+            return 0
+        keys = set()
+        for name in os.listdir(shard):
+            match = _ENTRY_RE.match(name)
+            if match and int(match.group(1)) == int(book_id) and match.group(2) != keep:
+                keys.add(match.group(2))
+        freed = sum(self._remove(int(book_id), key) for key in keys)
+        if keys:
+            with self._lock:
+                self.generation += 1
+        return freed
+
+    def evict(self):
+        """Drop least recently used covers until the cache fits max_bytes.
+
+        Returns the number of covers evicted.
+        """
+        if not self.max_bytes:
+            return 0
+        with self._lock:
+            entries = self._load_entries()
+            total = sum(size for size, _ in entries.values())
+            if total <= self.max_bytes:
+                return 0
+            by_age = sorted(entries, key=lambda k: self._access.get(k, entries[k][1]))
+            target = self.max_bytes * EVICT_TO
+            victims = []
+            for key in by_age:
+                if total <= target:
+                    break
+                if key[0] in self._in_flight:
+                    continue
+                total -= entries[key][0]
+                victims.append(key)
+        for book_id, key in victims:
+            self._remove(book_id, key)
+        with self._lock:
+            self.evictions += len(victims)
+            self.generation += 1
+        return len(victims)
+
+    def gc(self, books):
+        """Remove cached files that do not belong to any book's current cover.
+
+        books is every (id, cover URL) pair in the library. Covers cached in
+        the flat layout used before sharding are moved into their shard when
+        they still belong to a book. Returns counts of removed and migrated
+        files and the bytes freed.
+        """
+        current = {int(book_id): cover_key(cover_url) for book_id, cover_url in books if cover_url}
+        started = time.time()
+        removed = migrated = freed = 0
+        if not os.path.isdir(self.cache_dir):
+            return {'removed': 0, 'migrated': 0, 'freed': 0}
+        with self._lock:
+            in_flight = set(self._in_flight)
+
+        for item in os.scandir(self.cache_dir):
+            if item.is_dir():
+                for entry in os.scandir(item.path):
+                    match = _ENTRY_RE.match(entry.name)
+                    if match is None:
+                        continue
+                    book_id, key = int(match.group(1)), match.group(2)
+                    if current.get(book_id) == key or book_id in in_flight:
+                        continue
+                    stat = entry.stat()
+                    if stat.st_mtime >= started:
+                        continue
+                    os.remove(entry.path)
+                    removed += 1
+                    freed += stat.st_size
+                continue
+            match = _FLAT_RE.match(item.name)
+            if match is None:
+                continue
+            book_id = int(match.group(1))
+            if item.name.isdigit() and book_id in current:
+                target = self.cache_path(book_id, current[book_id])
+                if not os.path.exists(target):
+                    os.makedirs(self.shard_dir(book_id), exist_ok=True)
+                    os.replace(item.path, target)
+                    migrated += 1
+                    continue
+            freed += item.stat().st_size
+            os.remove(item.path)
+            removed += 1
+
+        with self._lock:
+            self._entries = None
+            self._access = {k: v for k, v in self._access.items() if current.get(k[0]) == k[1]}
+            self.generation += 1
+        return {'removed': removed, 'migrated': migrated, 'freed': freed}
+
+    def stats(self):
+        with self._lock:
+            entries = self._load_entries()
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(entries),
+                'bytes': sum(size for size, _ in entries.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'failures': self.failures,
+                'pending': len(self._in_flight),
+            }
+
+
+prefetcher = CoverPrefetcher(
+    max_workers=int(os.getenv('BOOKVAULT_COVER_WORKERS', '4')),
+    max_bytes=int(os.getenv('BOOKVAULT_COVER_CACHE_MAX_MB', '500')) * 1024 * 1024,
+)
@@ -0,0 +1,176 @@
+import threading
+import time
+import weakref
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class PooledConnection:
+    """A checked-out connection. close() hands it back to the pool.
+
+    A connection that is dropped without close(), e.g. by a helper that
+    raised halfway through, is handed back when it is garbage collected, so
+    errors outside a request cannot use up the pool.
+    """
+
+    def __init__(self, pool, raw):
+        self._raw = raw
+        self._release = weakref.finalize(self, pool.release, raw)
+        self._release.atexit = False
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise AttributeError(f"connection already returned to pool: {name}")
+        return getattr(self._raw, name)
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def close(self):
+        self._raw = None
+        self._release()
+
+
+class BorrowedConnection:
+    """A view of a request-scoped connection whose close() only discards
+    uncommitted work; the owner releases the underlying connection."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        try:
+            self._conn.rollback()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of database connections.
+
+    Up to ``size`` idle connections are kept open. When they are all checked
+    out, up to ``max_overflow`` extra connections are opened and closed again
+    on release; beyond that, callers wait up to ``timeout`` seconds. Idle
+    connections older than ``idle_timeout`` seconds are closed, and with
+    ``pre_ping`` every reused connection is pinged before being handed out.
+    """
+
+    def __init__(self, connect, size=5, max_overflow=10, idle_timeout=300,
+                 pre_ping=True, timeout=30):
+        self._connect = connect
+        self.size = max(0, size)
+        self.max_overflow = max(0, max_overflow)
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self._idle = []
+        self._checked_out = 0
+        self._cond = threading.Condition()
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._discarded = 0
+
+    @property
+    def max_connections(self):
+        return max(1, self.size + self.max_overflow)
+
+    def acquire(self):
+        start = None
+        with self._cond:
+            while not self._idle and self._checked_out >= self.max_connections:
+                if start is None:
+                    start = time.monotonic()
+                    self._waits += 1
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._wait_time += time.monotonic() - start
+                    raise PoolTimeout(f"no database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+            if start is not None:
+                self._wait_time += time.monotonic() - start
+            if self._idle:
+                raw, idle_since = self._idle.pop()
+            else:
+                raw, idle_since = None, None
+            self._checked_out += 1
+            self._checkouts += 1
+
+        try:
+            if raw is not None and not self._is_usable(raw, idle_since):
+                self._close_quietly(raw)
+                raw = None
+            if raw is None:
+                raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._checked_out -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, raw)
+
+    def _is_usable(self, raw, idle_since):
+        if self.idle_timeout is not None and time.monotonic() - idle_since > self.idle_timeout:
+            with self._cond:
+                self._discarded += 1
+            return False
+        if self.pre_ping:
+            try:
+                raw.ping()
+            except Exception:
+                with self._cond:
+                    self._discarded += 1
+                return False
+        return True
+
+    def release(self, raw):
+        keep = True
+        try:
+            raw.rollback()
+        except Exception:
+            keep = False
+        with self._cond:
+            self._checked_out -= 1
+            if keep and len(self._idle) < self.size:
+                self._idle.append((raw, time.monotonic()))
+                raw = None
+            self._cond.notify()
+        if raw is not None:
+            self._close_quietly(raw)
+
+    def dispose(self):
+        """Close every idle connection. Checked-out connections are unaffected."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for raw, _ in idle:
+            self._close_quietly(raw)
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._checked_out + len(self._idle),
+                'checked_out': self._checked_out,
+                'idle': len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time': round(self._wait_time, 6),
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+            }
@@ -0,0 +1,401 @@
+"""Streaming ebook uploads and the content-addressed ebook store.
+
+Uploads are written to disk UPLOAD_CHUNK_SIZE bytes at a time while their
+SHA-256 is computed, then renamed into place so a half-written file never
+appears under its final name. Large files can also be sent as a resumable
+series of chunks that survives dropped connections.
+
+Files are stored once per content hash under blobs/; books reference them
+through books.ebookpath, so identical uploads share one file. compact()
+deletes files that no book references any more.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from flask import current_app, request
+from urllib.parse import quote
+from werkzeug.utils import secure_filename, send_file
+
+EBOOK_DIR = 'ebooks'
+ALLOWED_EXTENSIONS = {'pdf', 'epub', 'mobi', 'azw3'}
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+EBOOK_MAX_BYTES = int(os.getenv('BOOKVAULT_EBOOK_MAX_MB', '500')) * 1024 * 1024
+# Hand downloads to the front proxy: '' (serve from Flask), 'x-sendfile' or 'x-accel-redirect'
+EBOOK_OFFLOAD = os.getenv('BOOKVAULT_EBOOK_OFFLOAD', '').lower()
+# nginx location marked "internal" that maps onto the ebook directory
+EBOOK_ACCEL_PREFIX = os.getenv('BOOKVAULT_EBOOK_ACCEL_PREFIX', '/protected-ebooks/')
+# Unfinished files live here, on the same filesystem as the final ones
+PARTIAL_DIR = '.partial'
+BLOB_DIR = 'blobs'
+# Unreferenced files younger than this are kept: their book row may not be written yet
+COMPACT_GRACE = 3600
+# Resumable uploads untouched for this many seconds are deleted
+UPLOAD_SESSION_TTL = 24 * 3600
+
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+# Files written before the blob store: <book id>_<secure filename> in the root
+_LEGACY_RE = re.compile(r'^[0-9]+_.+')
+
+
+class UploadError(Exception):
+    status_code = 400
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+class UploadNotFound(UploadError):
+    status_code = 404
+
+
+class CompactionRefused(Exception):
+    """compact() found stored files but no references, which means a wrong or empty database."""
+
+
+class OffsetMismatch(UploadError):
+    """A chunk did not start where the stored upload ends."""
+    status_code = 409
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def copy_stream(src, dest, hasher, limit, written=0):
+    """Copy src into the open file dest, hashing as it goes.
+
+    Raises UploadTooLarge as soon as more than limit bytes have been
+    written in total. Returns the new total.
+    """
+    while True:
+        chunk = src.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return written
+        written += len(chunk)
+        if written > limit:
+            raise UploadTooLarge(f"Ebooks are limited to {limit // (1024 * 1024)} MB")
+        hasher.update(chunk)
+        dest.write(chunk)
+
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher
+
+
+def send_ebook(path, sha256=None, download_name=None, root=None, offload=None):
+    """Download response for an ebook file.
+
+    The ETag is the stored content hash (or derived from the file when there
+    is none), so If-None-Match, Range and If-Range all work and interrupted
+    downloads resume. With offload set, only headers are sent and the proxy
+    transfers the file itself.
+    """
+    offload = EBOOK_OFFLOAD if offload is None else offload
+    if offload == 'x-accel-redirect':
+        root = os.path.abspath(root or store.root)
+        relative = os.path.relpath(os.path.abspath(path), root)
+        response = current_app.response_class(mimetype='application/octet-stream')
+        response.headers['X-Accel-Redirect'] = EBOOK_ACCEL_PREFIX.rstrip('/') + '/' + quote(relative)
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name or os.path.basename(path))
+        if sha256:
+            response.set_etag(sha256)
+        response.last_modified = os.path.getmtime(path)
+        response.cache_control.no_cache = True
+        # nginx serves ranges itself; only answer revalidation here
+        return response.make_conditional(request.environ)
+    return send_file(
+        path,
+        request.environ,
+        as_attachment=True,
+        download_name=download_name or os.path.basename(path),
+        conditional=True,
+        etag=sha256 or True,
+        use_x_sendfile=offload == 'x-sendfile',
+        response_class=current_app.response_class,
+    )
+
+
+class EbookStore:
+    def __init__(self, root=EBOOK_DIR, max_bytes=EBOOK_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.partial_dir = os.path.join(root, PARTIAL_DIR)
+        self._lock = threading.Lock()
+        # upload id -> (offset, running sha256) so chunks are not re-read
+        self._hashers = {}
+        self._active = set()
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, BLOB_DIR, sha256[:2], sha256)
+
+    def is_blob(self, path):
+        name = os.path.basename(path)
+        return bool(_SHA256_RE.match(name)) and os.path.abspath(path) == os.path.abspath(self.blob_path(name))
+
+    def _check_filename(self, filename):
+        if not filename or not allowed_file(filename):
+            raise UploadError("File type not allowed")
+
+    def _store(self, tmp, sha256):
+        """Move a finished file into the blob store; False if the content was already there."""
+        path = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(tmp)
+            # Fresh mtime keeps compact() from reclaiming it before the book row is written
+            os.utime(path)
+            return False
+        with open(tmp, 'rb+') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return True
+
+    def _finish(self, tmp, filename, hasher, size):
+        sha256 = hasher.hexdigest()
+        stored = self._store(tmp, sha256)
+        return {'path': self.blob_path(sha256), 'sha256': sha256, 'size': size,
+                'filename': secure_filename(filename), 'deduplicated': not stored}
+
+    def save(self, filename, stream, length=None):
+        """Stream a complete upload to disk.
+
+        Returns {'path', 'sha256', 'size', 'filename', 'deduplicated'}.
+        Nothing is left behind if the upload is rejected or the connection
+        drops.
+        """
+        self._check_filename(filename)
+        if length is not None and length > self.max_bytes:
+            raise UploadTooLarge(f"Ebooks are limited to {self.max_bytes // (1024 * 1024)} MB")
+        os.makedirs(self.partial_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.partial_dir, suffix='.upload')
+        hasher = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                size = copy_stream(stream, f, hasher, self.max_bytes)
+            if size == 0:
+                raise UploadError("Empty file")
+            return self._finish(tmp, filename, hasher, size)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    # Resumable uploads: <upload id>.json holds the metadata, <upload id>.part the bytes so far
+
+    def _session_paths(self, upload_id):
+        if not _UPLOAD_ID_RE.match(upload_id or ''):
+            raise UploadNotFound("Unknown upload")
+        base = os.path.join(self.partial_dir, upload_id)
+        return base + '.json', base + '.part'
+
+    def start_upload(self, book_id, filename, size):
+        """Open a resumable upload of size bytes. Returns its id."""
+        self._check_filename(filename)
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("size must be a positive integer")
+        if size > self.max_bytes:
+            raise UploadTooLarge(f"Ebooks are limited to {self.max_bytes // (1024 * 1024)} MB")
+        os.makedirs(self.partial_dir, exist_ok=True)
+        self.expire_uploads()
+        upload_id = uuid.uuid4().hex
+        meta_path, part_path = self._session_paths(upload_id)
+        open(part_path, 'wb').close()
+        with open(meta_path, 'w') as f:
+            json.dump({'book_id': book_id, 'filename': filename, 'size': size}, f)
+        return upload_id
+
+    def upload_status(self, upload_id):
+        """{'book_id', 'filename', 'size', 'offset'} of an unfinished upload."""
+        meta_path, part_path = self._session_paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            meta['offset'] = os.path.getsize(part_path)
+        except (OSError, ValueError):
+            raise UploadNotFound("Unknown upload")
+        return meta
+
+    def _hasher(self, upload_id, part_path, offset):
+        with self._lock:
+            state = self._hashers.pop(upload_id, None)
+        if state is not None and state[0] == offset:
+            return state[1]
+        # Lost after a restart or out of step: rebuild from the bytes on disk
+        return _hash_file(part_path)
+
+    def append(self, upload_id, offset, stream):
+        """Append one chunk that starts at offset.
+
+        Returns the upload status; once every byte has arrived the file is
+        stored and the fields returned by save() are included as well.
+        """
+        meta = self.upload_status(upload_id)
+        if offset != meta['offset']:
+            raise OffsetMismatch(meta['offset'])
+        with self._lock:
+            if upload_id in self._active:
+                raise OffsetMismatch(meta['offset'])
+            self._active.add(upload_id)
+        meta_path, part_path = self._session_paths(upload_id)
+        try:
+            os.utime(meta_path)  # keep an upload that is still making progress from expiring
+            hasher = self._hasher(upload_id, part_path, offset)
+            written = offset
+            try:
+                with open(part_path, 'ab') as f:
+                    written = copy_stream(stream, f, hasher, meta['size'], offset)
+            finally:
+                with self._lock:
+                    self._hashers[upload_id] = (os.path.getsize(part_path), hasher)
+            meta['offset'] = written
+            if written < meta['size']:
+                return meta
+            with self._lock:
+                self._hashers.pop(upload_id, None)
+            meta.update(self._finish(part_path, meta['filename'], hasher, written))
+            os.remove(meta_path)
+            return meta
+        finally:
+            with self._lock:
+                self._active.discard(upload_id)
+
+    def abort(self, upload_id):
+        meta_path, part_path = self._session_paths(upload_id)
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+        found = False
+        for path in (meta_path, part_path):
+            if os.path.exists(path):
+                os.remove(path)
+                found = True
+        if not found:
+            raise UploadNotFound("Unknown upload")
+
+    def expire_uploads(self, max_age=UPLOAD_SESSION_TTL):
+        """Delete partial files untouched for max_age seconds. Returns the count."""
+        cutoff = time.time() - max_age
+        removed = 0
+        try:
+            entries = list(os.scandir(self.partial_dir))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def adopt(self, path):
+        """Copy a file stored under the old <book id>_<name> layout into the blob store.
+
+        The original is left in place for compact() to remove once no book
+        points at it. Returns {'path', 'sha256', 'size'}.
+        """
+        hasher = _hash_file(path)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        tmp = os.path.join(self.partial_dir, uuid.uuid4().hex + '.adopt')
+        try:
+            # A copy rather than a hard link, so the original's mtime and
+            # bytes stay separate from the blob until compact() removes it
+            shutil.copyfile(path, tmp)
+            self._store(tmp, hasher.hexdigest())
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return {'path': self.blob_path(hasher.hexdigest()), 'sha256': hasher.hexdigest(),
+                'size': os.path.getsize(path)}
+
+    @staticmethod
+    def _store_key(path):
+        """Location of path inside the store, or None if it is not a stored ebook.
+
+        Stored paths may be relative to whichever directory the app ran in,
+        so only their tail is compared: blobs/<xx>/<sha256> for the blob
+        store and <book id>_<name> for the legacy layout in the root.
+        """
+        parts = os.path.normpath(path).split(os.sep)
+        name = parts[-1]
+        if _SHA256_RE.match(name) and parts[-3:-1] == [BLOB_DIR, name[:2]]:
+            return os.path.join(BLOB_DIR, name[:2], name)
+        if _LEGACY_RE.match(name) and allowed_file(name):
+            return name
+        return None
+
+    def _stored_files(self):
+        """(store key, path) of every blob and legacy ebook; nothing else under root is ever listed."""
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.is_file() and self._store_key(entry.name) == entry.name:
+                yield entry.name, entry.path
+        blob_root = os.path.join(self.root, BLOB_DIR)
+        if not os.path.isdir(blob_root):
+            return
+        for shard in os.scandir(blob_root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                key = os.path.join(BLOB_DIR, shard.name, entry.name)
+                if entry.is_file() and self._store_key(key) == key:
+                    yield key, entry.path
+
+    def compact(self, referenced, grace=COMPACT_GRACE, force=False):
+        """Delete stored ebooks that no path in referenced points to.
+
+        Only blobs and legacy <book id>_<name> files are considered; anything
+        else under root, unfinished uploads and files modified within the
+        last grace seconds are left alone. Raises CompactionRefused when
+        nothing is referenced but files are stored, unless force is set.
+        Returns {'removed', 'freed'}.
+        """
+        keep = {self._store_key(path) for path in referenced if path}
+        keep.discard(None)
+        stored = list(self._stored_files())
+        if stored and not keep and not force:
+            raise CompactionRefused(f"No book references any of the {len(stored)} stored ebooks; "
+                                    "refusing to delete them")
+        cutoff = time.time() - grace
+        removed = freed = 0
+        for key, path in stored:
+            if key in keep:
+                continue
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime >= cutoff:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += stat.st_size
+        blob_root = os.path.join(self.root, BLOB_DIR)
+        if os.path.isdir(blob_root):
+            for entry in os.scandir(blob_root):
+                if entry.is_dir() and not os.listdir(entry.path):
+                    os.rmdir(entry.path)
+        return {'removed': removed, 'freed': freed}
+
+
+store = EbookStore(os.getenv('BOOKVAULT_EBOOK_DIR', EBOOK_DIR))
@@ -0,0 +1,75 @@
+"""Serialize the library as NDJSON, CSV or a JSON array, one chunk at a time."""
+import csv
+import io
+import json
+
+from helpers import resolve_book_fields
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'json': ('application/json', 'json'),
+}
+# Lines are joined into chunks of roughly this many characters
+CHUNK_SIZE = 64 * 1024
+
+
+def export_columns(fields=None):
+    """Column order of an export for the requested fields."""
+    wanted, columns = resolve_book_fields(fields)
+    return columns + (['tags'] if 'tags' in wanted else [])
+
+
+def _to_json(book):
+    return json.dumps(book, default=str, ensure_ascii=False)
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return '; '.join(tag['name'] for tag in value)
+    return '' if value is None else value
+
+
+def _lines(books, fmt, columns):
+    if fmt == 'ndjson':
+        for book in books:
+            yield _to_json(book) + '\n'
+    elif fmt == 'json':
+        separator = '[\n'
+        for book in books:
+            yield separator + _to_json(book)
+            separator = ',\n'
+        yield '[]\n' if separator == '[\n' else '\n]\n'
+    elif fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for book in books:
+            writer.writerow([_csv_value(book.get(column)) for column in columns])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.getvalue():
+            yield buffer.getvalue()
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+def export_chunks(books, fmt, columns):
+    """Yield the export of an iterable of books as text chunks.
+
+    books is consumed lazily, so a generator such as helpers.iter_books()
+    is exported without holding the library in memory.
+    """
+    buffer = []
+    size = 0
+    for line in _lines(books, fmt, columns):
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
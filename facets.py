@@ -0,0 +1,184 @@
+"""In-process bitmap index of the library filters.
+
+Every facet value (status, rating, format, tag) maps to a Python int used as
+a bitset over book ids, so any combination of the listing filters resolves
+with a few bitwise operations instead of a GROUP BY over book_tags. The index
+remembers the library revision it reflects; helpers rebuilds it when the
+revision has moved on and applies single-book writes to it directly.
+"""
+import threading
+import time
+
+# Same choices as helpers.STATUS_OPTIONS; duplicated to keep this module free of DB imports
+STATUS_OPTIONS = ["TBR", "Reading", "Read", "DNF"]
+MAX_RATING = 5
+
+
+def bits_to_ids(bits):
+    """Ids of the set bits, ascending."""
+    digits = bin(bits)[:1:-1]
+    ids = []
+    position = digits.find('1')
+    while position != -1:
+        ids.append(position)
+        position = digits.find('1', position + 1)
+    return ids
+
+
+def ids_to_bits(ids):
+    bits = 0
+    for book_id in ids:
+        bits |= 1 << book_id
+    return bits
+
+
+class FacetIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.revision = None
+        self._clear()
+        self._rebuilds = 0
+        self._updates = 0
+        self._queries = 0
+        self._built_at = None
+
+    def _clear(self):
+        self.all = 0
+        self.status = {}
+        self.rating = {}
+        self.ebook = 0
+        self.physical = 0
+        self.tags = {}
+
+    def _set(self, book_id, status, rating, has_ebook, physical):
+        bit = 1 << book_id
+        self.all |= bit
+        self.status[status] = self.status.get(status, 0) | bit
+        rating = rating or 0
+        self.rating[rating] = self.rating.get(rating, 0) | bit
+        if has_ebook:
+            self.ebook |= bit
+        if physical:
+            self.physical |= bit
+
+    def _link(self, book_id, tag_id):
+        self.tags[tag_id] = self.tags.get(tag_id, 0) | (1 << book_id)
+
+    def load(self, revision, books, links):
+        """Replace the index contents.
+
+        books holds (id, status, rating, has_ebook, physical_copy) rows and
+        links (book_id, tag_id) rows, both read at revision.
+        """
+        with self._lock:
+            self._clear()
+            for row in books:
+                self._set(*row)
+            for book_id, tag_id in links:
+                self._link(book_id, tag_id)
+            self.revision = revision
+            self._rebuilds += 1
+            self._built_at = time.time()
+
+    def update(self, revision, book_ids, books, links):
+        """Apply a write that produced revision and touched book_ids.
+
+        books and links are the current rows of those books (deleted books
+        are simply absent). If any other write happened since the index was
+        built, it is marked stale instead and rebuilt on next use.
+        """
+        with self._lock:
+            if self.revision is None or self.revision != revision - 1:
+                self.revision = None
+                return False
+            mask = ~ids_to_bits(book_ids)
+            self.all &= mask
+            self.ebook &= mask
+            self.physical &= mask
+            for facet in (self.status, self.rating, self.tags):
+                for key in facet:
+                    facet[key] &= mask
+            # Same shape as load(): no entries for tags without books, e.g. a deleted tag
+            self.tags = {tag_id: bits for tag_id, bits in self.tags.items() if bits}
+            for row in books:
+                self._set(*row)
+            for book_id, tag_id in links:
+                self._link(book_id, tag_id)
+            self.revision = revision
+            self._updates += 1
+            return True
+
+    def invalidate(self):
+        with self._lock:
+            self.revision = None
+
+    def resolve(self, status_filters=None, format_filters=None, rating_filters=None, tag_ids=None):
+        """Ids matching the listing filters, ascending.
+
+        Mirrors helpers.build_book_filters(): values within a filter are
+        ORed, filters are ANDed, and tags must all be present. Invalid
+        values are ignored the same way.
+        """
+        with self._lock:
+            self._queries += 1
+            result = self.all
+
+            valid_tags = []
+            for tag_id in tag_ids or []:
+                try:
+                    tag_id = int(tag_id)
+                except (ValueError, TypeError):
+                    continue
+                if tag_id > 0 and tag_id not in valid_tags:
+                    valid_tags.append(tag_id)
+            for tag_id in valid_tags:
+                result &= self.tags.get(tag_id, 0)
+
+            statuses = [s for s in status_filters or [] if s in STATUS_OPTIONS]
+            if statuses:
+                matched = 0
+                for status in statuses:
+                    matched |= self.status.get(status, 0)
+                result &= matched
+
+            formats = [f for f in format_filters or [] if f in ('ebook', 'physical')]
+            if formats:
+                result &= (self.ebook if 'ebook' in formats else 0) | (self.physical if 'physical' in formats else 0)
+
+            matched = None
+            for rating_filter in rating_filters or []:
+                if rating_filter == 'rated':
+                    minimum = 1
+                elif rating_filter == 'unrated':
+                    matched = (matched or 0) | self.rating.get(0, 0)
+                    continue
+                elif rating_filter.endswith('star'):
+                    try:
+                        minimum = int(rating_filter[0])
+                    except (ValueError, IndexError):
+                        continue
+                    if not 1 <= minimum <= MAX_RATING:
+                        continue
+                else:
+                    continue
+                for rating, bits in self.rating.items():
+                    if rating >= minimum:
+                        matched = (matched or 0) | bits
+                if matched is None:
+                    matched = 0
+            if matched is not None:
+                result &= matched
+
+        return bits_to_ids(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'revision': self.revision,
+                'books': bin(self.all).count('1'),
+                'tags': len(self.tags),
+                'rebuilds': self._rebuilds,
+                'updates': self._updates,
+                'queries': self._queries,
+                'built_at': self._built_at,
+            }
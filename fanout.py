@@ -0,0 +1,82 @@
+"""Bounded concurrent fan-out with a shared rate limit."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` calls per second with bursts of ``burst``."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take one token, sleeping until one is free. Returns False on timeout."""
+        if not self.rate or self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                delay = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            time.sleep(delay)
+
+
+class FanOutResult:
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+        self.timed_out = []
+
+    @property
+    def complete(self):
+        return not self.errors and not self.timed_out
+
+
+def fan_out(func, items, max_workers=8, rate_limiter=None, timeout=None):
+    """Call func(item) for every item on a bounded thread pool.
+
+    Returns a FanOutResult holding the results of the calls that finished,
+    the exception raised by any that failed, and the items still running
+    when ``timeout`` seconds elapsed. The caller never waits past the
+    timeout; calls still in flight are left to finish in the background.
+    """
+    outcome = FanOutResult()
+    items = list(dict.fromkeys(items))
+    if not items:
+        return outcome
+
+    def call(item):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return func(item)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))),
+                                  thread_name_prefix='fan-out')
+    try:
+        futures = {executor.submit(call, item): item for item in items}
+        done, not_done = wait(futures, timeout=timeout)
+        for future in done:
+            item = futures[future]
+            try:
+                outcome.results[item] = future.result()
+            except Exception as e:
+                outcome.errors[item] = e
+        outcome.timed_out = [futures[future] for future in not_done]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return outcome
@@ -0,0 +1,161 @@
+"""Google Books volume lookups with a persistent on-disk response cache.
+
+Every Google Books call in the app goes through fetch_volumes(), which keys
+responses by the normalized query and result count and stores them in a
+small SQLite database. Empty results are cached too (for a shorter TTL),
+and the least recently used entries are evicted once the cache is full.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+from fanout import RateLimiter
+
+GOOGLE_BOOKS_URL = "https://www.googleapis.com/books/v1/volumes"
+GOOGLE_BOOKS_TIMEOUT = 10
+
+
+class GoogleBooksError(Exception):
+    """Google Books answered with a non-200 status."""
+
+    def __init__(self, status_code):
+        super().__init__(f"Google Books returned {status_code}")
+        self.status_code = status_code
+
+
+def normalize_query(query, max_results):
+    return f"{' '.join(query.split()).lower()}|{max_results}"
+
+
+class GoogleBooksCache:
+    def __init__(self, path, ttl=7 * 24 * 3600, negative_ttl=24 * 3600, max_entries=5000):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _db(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    cache_key TEXT PRIMARY KEY,
+                    items TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key):
+        """Return (True, items) on a fresh hit and (False, None) otherwise."""
+        if not self.enabled:
+            return False, None
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT items, expires_at FROM responses WHERE cache_key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    db.execute("DELETE FROM responses WHERE cache_key = ?", (key,))
+                    db.commit()
+                self._counters['misses'] += 1
+                return False, None
+            db.execute("UPDATE responses SET last_access = ? WHERE cache_key = ?", (now, key))
+            db.commit()
+            items = json.loads(row[0])
+            self._counters['negative_hits' if not items else 'hits'] += 1
+            return True, items
+
+    def set(self, key, items):
+        if not self.enabled:
+            return
+        now = time.time()
+        ttl = self.ttl if items else self.negative_ttl
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "REPLACE INTO responses (cache_key, items, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(items), now + ttl, now)
+            )
+            self._counters['stores'] += 1
+            overflow = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                db.execute("""
+                    DELETE FROM responses WHERE cache_key IN (
+                        SELECT cache_key FROM responses ORDER BY last_access LIMIT ?
+                    )
+                """, (overflow,))
+                self._counters['evictions'] += overflow
+            db.commit()
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM responses")
+            db.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['enabled'] = self.enabled
+            stats['entries'] = self._db().execute("SELECT COUNT(*) FROM responses").fetchone()[0] if self.enabled else 0
+        lookups = stats['hits'] + stats['negative_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['negative_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+cache = GoogleBooksCache(
+    os.getenv('BOOKVAULT_GOOGLE_CACHE_PATH', 'google_books_cache.sqlite3'),
+    ttl=int(os.getenv('BOOKVAULT_GOOGLE_CACHE_TTL', str(7 * 24 * 3600))),
+    negative_ttl=int(os.getenv('BOOKVAULT_GOOGLE_CACHE_NEGATIVE_TTL', str(24 * 3600))),
+    max_entries=int(os.getenv('BOOKVAULT_GOOGLE_CACHE_MAX_ENTRIES', '5000')),
+)
+
+
+# Shared by every caller so concurrent fan-outs stay under Google's quota.
+rate_limiter = RateLimiter(float(os.getenv('BOOKVAULT_GOOGLE_RATE_LIMIT', '10')))
+
+
+def fetch_volumes(query, max_results, timeout=GOOGLE_BOOKS_TIMEOUT):
+    """Return the list of volume items Google Books has for query.
+
+    Network calls are throttled by the module-wide rate_limiter and give up
+    after timeout seconds.
+    Raises GoogleBooksError for non-200 responses other than 404 (which is
+    cached as an empty result); network errors propagate as
+    requests.exceptions.RequestException. Failures are never cached.
+    """
+    key = normalize_query(query, max_results)
+    hit, items = cache.get(key)
+    if hit:
+        return items
+    rate_limiter.acquire()
+    url = f"{GOOGLE_BOOKS_URL}?q={requests.utils.quote(query)}&maxResults={max_results}"
+    response = requests.get(url, timeout=timeout)
+    if response.status_code == 404:
+        items = []
+    elif response.status_code != 200:
+        raise GoogleBooksError(response.status_code)
+    else:
+        items = response.json().get("items", [])
+    cache.set(key, items)
+    return items
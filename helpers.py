@@ -3,10 +3,19 @@ import re
 import requests
 import mariadb
 from collections import Counter
-from datetime import datetime
+from datetime import datetime, timedelta
+from flask import g, has_app_context
+
+from covers import prefetcher as cover_prefetcher
+from ebooks import store as ebook_store
+from facets import FacetIndex
+from db_pool import BorrowedConnection, ConnectionPool
+from fanout import fan_out
+from scheduler import PeriodicJob
+from google_cache import GOOGLE_BOOKS_TIMEOUT, GoogleBooksError, fetch_volumes
+from migrations import run_migrations
 
 STATUS_OPTIONS = ["TBR", "Reading", "Read", "DNF"]
-CACHE_DIR = 'cover_cache'
 
 def validate_isbn(isbn: str) -> bool:
     """Validate ISBN-10 or ISBN-13 format (basic check)."""
@@ -43,106 +52,137 @@ DB_CONFIG = {
     'database': os.getenv('BOOKVAULT_DBNAME')
 }
 
-def create_upload_folder():
-    upload_folder = current_app.config['UPLOAD_FOLDER']
-    if not os.path.exists(upload_folder):
-        os.makedirs(upload_folder)
+DB_POOL_CONFIG = {
+    'size': int(os.getenv('BOOKVAULT_DB_POOL_SIZE', '5')),
+    'max_overflow': int(os.getenv('BOOKVAULT_DB_POOL_MAX_OVERFLOW', '10')),
+    'idle_timeout': int(os.getenv('BOOKVAULT_DB_POOL_IDLE_TIMEOUT', '300')),
+    'pre_ping': os.getenv('BOOKVAULT_DB_POOL_PRE_PING', '1') != '0',
+    'timeout': int(os.getenv('BOOKVAULT_DB_POOL_TIMEOUT', '30')),
+}
+
+db_pool = ConnectionPool(lambda: mariadb.connect(**DB_CONFIG), **DB_POOL_CONFIG)
 
 def get_db_connection():
-    conn = mariadb.connect(**DB_CONFIG)
-    return conn
+    """Return a pooled connection. Calling close() on it returns it to the pool.
+
+    Inside a Flask app context the same connection is reused for the whole
+    request and only released by close_request_db_connection().
+    """
+    if not has_app_context():
+        return db_pool.acquire()
+    if '_bookvault_db' not in g:
+        g._bookvault_db = db_pool.acquire()
+    return BorrowedConnection(g._bookvault_db)
 
-def create_table():
+def close_request_db_connection(exception=None):
+    """Release the request-scoped connection; registered as an app teardown."""
+    conn = g.pop('_bookvault_db', None)
+    if conn is not None:
+        conn.close()
+
+def get_db_pool_stats():
+    return db_pool.stats()
+
+def bump_library_revision(cur):
+    """Advance the library revision as part of the caller's transaction.
+
+    Every write that changes what a listing shows calls this before
+    committing, so listing ETags change exactly when the library does.
+    """
+    cur.execute("UPDATE library_revision SET revision = revision + 1 WHERE id = 1")
+
+def get_library_revision():
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS books (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            title VARCHAR(255),
-            author VARCHAR(255),
-            cover VARCHAR(512),
-            status ENUM('TBR', 'Reading', 'Read', 'DNF') DEFAULT 'TBR',
-            last_status_change DATETIME DEFAULT NULL,
-            ebookpath VARCHAR(255),
-            physical_copy BOOL DEFAULT 0,
-            UNIQUE KEY unique_book (title, author)
-        )
-    """)
-    
-    # Create tags table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS tags (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(100) UNIQUE NOT NULL,
-            color VARCHAR(7) DEFAULT '#007bff',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Create book_tags junction table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS book_tags (
-            book_id INT,
-            tag_id INT,
-            PRIMARY KEY (book_id, tag_id),
-            FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE,
-            FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
-        )
-    """)
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    try:
+        cur.execute("SELECT revision FROM library_revision WHERE id = 1")
+        row = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
+    return row[0] if row else 0
+
+FACET_INDEX_ENABLED = os.getenv('BOOKVAULT_FACET_INDEX', '0') == '1'
+facet_index = FacetIndex()
+# (id, status, rating, has_ebook, physical_copy) as FacetIndex expects them
+FACET_COLUMNS = "id, status, COALESCE(rating, 0), ebookpath IS NOT NULL AND ebookpath != '', physical_copy"
 
-def ensure_book_metadata_columns():
+def rebuild_facet_index():
+    """Load every book's facets into facet_index from one consistent snapshot."""
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("ALTER TABLE books ADD COLUMN IF NOT EXISTS isbn VARCHAR(32)")
-    except mariadb.Error:
-        pass
-    try:
-        cur.execute("ALTER TABLE books ADD COLUMN IF NOT EXISTS series VARCHAR(255)")
-    except mariadb.Error:
-        pass
-    try:
-        cur.execute("ALTER TABLE books ADD COLUMN IF NOT EXISTS publisher VARCHAR(255)")
-    except mariadb.Error:
-        pass
-    try:
-        cur.execute("ALTER TABLE books ADD COLUMN IF NOT EXISTS publishedDate VARCHAR(32)")
-    except mariadb.Error:
-        pass
-    try:
-        cur.execute("ALTER TABLE books ADD COLUMN IF NOT EXISTS description TEXT")
-    except mariadb.Error:
-        pass
+        cur.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        cur.execute("SELECT revision FROM library_revision WHERE id = 1")
+        row = cur.fetchone()
+        cur.execute(f"SELECT {FACET_COLUMNS} FROM books")
+        books = cur.fetchall()
+        cur.execute("SELECT book_id, tag_id FROM book_tags")
+        links = cur.fetchall()
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    facet_index.load(row[0] if row else 0, books, links)
+    return facet_index.stats()
+
+def _facet_snapshot(cur, book_ids=None, where=None, params=()):
+    """Read the facets of the books a write touched, inside its transaction.
+
+    Call after bump_library_revision() and hand the result to
+    _apply_facet_snapshot() once committed. Pass book_ids, or where/params
+    to select them. Returns None while the index is not in use.
+    """
+    if not FACET_INDEX_ENABLED or facet_index.revision is None:
+        return None
+    if book_ids is None:
+        cur.execute(f"SELECT id FROM books WHERE {where}", params)
+        book_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("SELECT revision FROM library_revision WHERE id = 1")
+    revision = cur.fetchone()[0]
+    books, links = [], []
+    if book_ids:
+        placeholders = ','.join(['%s'] * len(book_ids))
+        cur.execute(f"SELECT {FACET_COLUMNS} FROM books WHERE id IN ({placeholders})", list(book_ids))
+        books = cur.fetchall()
+        cur.execute(f"SELECT book_id, tag_id FROM book_tags WHERE book_id IN ({placeholders})", list(book_ids))
+        links = cur.fetchall()
+    return revision, list(book_ids), books, links
+
+def _apply_facet_snapshot(snapshot):
+    if snapshot is not None:
+        facet_index.update(*snapshot)
+
+def resolve_facets(status_filters=None, format_filters=None, rating_filters=None, tag_ids=None):
+    """Ids matching the listing filters from facet_index, or None when it is disabled.
+
+    The index is rebuilt first if the library changed in a way it did not
+    follow, e.g. a write from another worker process.
+    """
+    if not FACET_INDEX_ENABLED:
+        return None
+    if facet_index.revision != get_library_revision():
+        rebuild_facet_index()
+    return facet_index.resolve(status_filters, format_filters, rating_filters, tag_ids)
+
+def migrate_database():
+    """Bring the schema up to date. Run once at startup or via 'flask migrate'."""
+    conn = get_db_connection()
     try:
-        cur.execute("ALTER TABLE books ADD COLUMN IF NOT EXISTS selfLink VARCHAR(512)")
-    except mariadb.Error:
-        pass
-    conn.commit()
-    cur.close()
-    conn.close()
+        return run_migrations(conn)
+    finally:
+        conn.close()
 
-def get_google_books_metadata(title, author):
-    query = f"intitle:{title} inauthor:{author}"
-    url = f"https://www.googleapis.com/books/v1/volumes?q={requests.utils.quote(query)}&maxResults=1"
-    response = requests.get(url, timeout=10)
-    if response.status_code != 200:
-        return {}
-    data = response.json()
-    items = data.get("items", [])
-    if not items:
-        return {}
-    info = items[0].get("volumeInfo", {})
+def metadata_from_volume(item):
+    """Pull the stored metadata fields out of one Google Books volume item."""
+    info = item.get("volumeInfo", {})
     identifiers = info.get("industryIdentifiers", [])
     isbn = None
     for ident in identifiers:
         if "ISBN" in ident.get("type", ""):
             isbn = ident["identifier"]
             break
-    seriesinfo = items[0].get("seriesInfo", {})
+    seriesinfo = item.get("seriesInfo", {})
     series = seriesinfo.get("title") or info.get("subtitle")
     return {
         "isbn": isbn,
@@ -150,40 +190,35 @@ def get_google_books_metadata(title, author):
         "publisher": info.get("publisher"),
         "publishedDate": info.get("publishedDate"),
         "description": info.get("description"),
-        "selfLink": items[0].get("selfLink"),
+        "selfLink": item.get("selfLink"),
     }
 
+def get_google_books_metadata(title, author):
+    try:
+        items = fetch_volumes(f"intitle:{title} inauthor:{author}", 1)
+    except GoogleBooksError:
+        return {}
+    if not items:
+        return {}
+    return metadata_from_volume(items[0])
+
 def get_google_books_metadata_by_isbn(isbn: str):
     if not validate_isbn(isbn):
         return {}
-    url = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}&maxResults=1"
-    response = requests.get(url, timeout=10)
-    if response.status_code != 200:
+    try:
+        items = fetch_volumes(f"isbn:{isbn}", 1)
+    except GoogleBooksError:
         return {}
-    data = response.json()
-    items = data.get("items", [])
     if not items:
         return {}
-    info = items[0].get("volumeInfo", {})
-    identifiers = info.get("industryIdentifiers", [])
-    final_isbn = None
-    for ident in identifiers:
-        if "ISBN" in ident.get("type", ""):
-            final_isbn = ident["identifier"]
-            break
-    seriesinfo = items[0].get("seriesInfo", {})
-    series = seriesinfo.get("title") or info.get("subtitle")
-    return {
-        "isbn": final_isbn,
-        "series": series,
-        "publisher": info.get("publisher"),
-        "publishedDate": info.get("publishedDate"),
-        "description": info.get("description"),
-        "selfLink": items[0].get("selfLink"),
-    }
+    return metadata_from_volume(items[0])
 
 def insert_book(book: dict) -> bool:
-    """Insert book with validation. Returns True on success, False otherwise."""
+    """Insert book with validation. Returns True on success, False otherwise.
+
+    Books without an ISBN are committed straight away and marked pending;
+    the enrichment job fills in their metadata from Google Books later.
+    """
     if not book or not isinstance(book, dict):
         return False
     
@@ -203,59 +238,321 @@ def insert_book(book: dict) -> bool:
         if not validate_isbn(str(isbn)):
             book["isbn"] = None
     
-    ensure_book_metadata_columns()
-    # If API book, attempt to enrich with metadata
-    if "isbn" not in book or book.get("isbn") is None:
-        if book.get("title") and book.get("author"):
-            meta = get_google_books_metadata(book["title"], book["author"])
-        elif book.get("isbn"):
-            meta = get_google_books_metadata_by_isbn(book["isbn"])
-        else:
-            meta = {}
-        for field in ["isbn", "series", "publisher", "publishedDate", "description", "selfLink"]:
-            if field in meta and meta[field] is not None:
-                book[field] = meta[field]
-            else:
-                book.setdefault(field, None)
     conn = get_db_connection()
     cur = conn.cursor()
     try:
         now = datetime.now()
         cur.execute("""
             INSERT INTO books
-                (title, author, cover, status, last_status_change, isbn, series, publisher, publishedDate, description, selfLink)
+                (title, author, cover, status, last_status_change, isbn, series, publisher, publishedDate, description, selfLink,
+                 enrichment_state)
             VALUES
-                (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             ON DUPLICATE KEY UPDATE
-                cover=VALUES(cover),
+                cover=COALESCE(VALUES(cover), cover),
                 status=status,
-                isbn=VALUES(isbn),
-                series=VALUES(series),
-                publisher=VALUES(publisher),
-                publishedDate=VALUES(publishedDate),
-                description=VALUES(description),
-                selfLink=VALUES(selfLink)
+                isbn=COALESCE(VALUES(isbn), isbn),
+                series=COALESCE(VALUES(series), series),
+                publisher=COALESCE(VALUES(publisher), publisher),
+                publishedDate=COALESCE(VALUES(publishedDate), publishedDate),
+                description=COALESCE(VALUES(description), description),
+                selfLink=COALESCE(VALUES(selfLink), selfLink),
+                enrichment_state=COALESCE(enrichment_state, VALUES(enrichment_state))
         """, (
-            book['title'], book['author'], book['cover'], book['status'], now,
-            book.get('isbn'), book.get('series'), book.get('publisher'),
-            book.get('publishedDate'), book.get('description'), book.get('selfLink')
+            book['title'], book['author'], book.get('cover'), book.get('status') or 'TBR', now,
+            book.get('isbn') or None, book.get('series'), book.get('publisher'),
+            book.get('publishedDate'), book.get('description'), book.get('selfLink'),
+            None if book.get('isbn') else 'pending',
         ))
+        bump_library_revision(cur)
+        snapshot = _facet_snapshot(cur, where="title = %s AND author = %s", params=(book['title'], book['author']))
         conn.commit()
-        return True
+        _apply_facet_snapshot(snapshot)
     except mariadb.Error as e:
         print(f"Error inserting book: {e}")
         return False
     finally:
         cur.close()
         conn.close()
-    
-    return False
+    if not book.get('isbn'):
+        enrichment_job.trigger()
+    return True
 
-def get_all_books():
-    ensure_book_metadata_columns()
-    if not os.path.exists(CACHE_DIR):
-        os.makedirs(CACHE_DIR)
+def insert_books(books):
+    """Upsert many books in one transaction with a single executemany.
+
+    Existing books keep their status, and stored metadata is only replaced
+    by non-empty values. Books without an ISBN are queued for enrichment.
+    On error the batch is rolled back and the mariadb.Error is raised so the
+    caller can retry rows one at a time.
+    """
+    if not books:
+        return 0
+    now = datetime.now()
+    rows = [(
+        book['title'], book['author'], book.get('cover'), book.get('status') or 'TBR',
+        book.get('last_status_change') or now, book.get('rating') or 0,
+        book.get('isbn'), book.get('series'), book.get('publisher'),
+        book.get('publishedDate'), book.get('description'), book.get('selfLink'),
+        None if book.get('isbn') else 'pending',
+    ) for book in books]
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.executemany("""
+            INSERT INTO books
+                (title, author, cover, status, last_status_change, rating,
+                 isbn, series, publisher, publishedDate, description, selfLink, enrichment_state)
+            VALUES
+                (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                cover=COALESCE(VALUES(cover), cover),
+                isbn=COALESCE(VALUES(isbn), isbn),
+                series=COALESCE(VALUES(series), series),
+                publisher=COALESCE(VALUES(publisher), publisher),
+                publishedDate=COALESCE(VALUES(publishedDate), publishedDate),
+                description=COALESCE(VALUES(description), description),
+                selfLink=COALESCE(VALUES(selfLink), selfLink),
+                enrichment_state=COALESCE(enrichment_state, VALUES(enrichment_state))
+        """, rows)
+        bump_library_revision(cur)
+        conn.commit()
+    except mariadb.Error:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    if any(not book.get('isbn') for book in books):
+        enrichment_job.trigger()
+    return len(rows)
+
+ENRICHMENT_FIELDS = ("isbn", "series", "publisher", "publishedDate", "description", "selfLink")
+ENRICHMENT_BATCH_SIZE = 50
+ENRICHMENT_MAX_ATTEMPTS = 5
+ENRICHMENT_BACKOFF = 60
+ENRICHMENT_MAX_BACKOFF = 6 * 3600
+ENRICHMENT_WORKERS = int(os.getenv('BOOKVAULT_ENRICHMENT_WORKERS', '4'))
+# Seconds to wait for one batch of lookups; unfinished books are retried later
+ENRICHMENT_TIMEOUT = 30
 
+def enrichment_backoff(attempts):
+    """Seconds to wait before retry number ``attempts`` (1-based)."""
+    return min(ENRICHMENT_BACKOFF * 2 ** (attempts - 1), ENRICHMENT_MAX_BACKOFF)
+
+def lookup_book_metadata(book):
+    """Google Books metadata for a stored book; {} when nothing matches.
+
+    Unlike get_google_books_metadata() this raises GoogleBooksError and
+    network errors, so the caller can tell a miss from a failed lookup.
+    """
+    if book.get('isbn'):
+        items = fetch_volumes(f"isbn:{book['isbn']}", 1)
+    else:
+        items = fetch_volumes(f"intitle:{book['title']} inauthor:{book['author']}", 1)
+    return metadata_from_volume(items[0]) if items else {}
+
+def enrich_pending_books(limit=ENRICHMENT_BATCH_SIZE):
+    """Fill in metadata for books queued by insert_book().
+
+    Looks up to limit due books concurrently. Missing fields are filled in
+    and the book is marked done; failed lookups are retried with
+    exponential backoff and marked failed after ENRICHMENT_MAX_ATTEMPTS.
+    Returns {'enriched', 'retrying', 'failed'} counts for this run.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("""
+            SELECT id, title, author, isbn, enrichment_attempts
+            FROM books
+            WHERE enrichment_state = 'pending'
+              AND (enrichment_next_at IS NULL OR enrichment_next_at <= NOW())
+            ORDER BY enrichment_next_at, id
+            LIMIT %s
+        """, (limit,))
+        books = {book['id']: book for book in cur.fetchall()}
+    finally:
+        cur.close()
+        conn.close()
+    counts = {'enriched': 0, 'retrying': 0, 'failed': 0}
+    if not books:
+        return counts
+
+    outcome = fan_out(lambda book_id: lookup_book_metadata(books[book_id]), books,
+                      max_workers=ENRICHMENT_WORKERS, timeout=ENRICHMENT_TIMEOUT)
+
+    now = datetime.now()
+    done, retries = [], []
+    for book_id, book in books.items():
+        if book_id in outcome.results:
+            meta = outcome.results[book_id]
+            done.append(tuple(meta.get(field) for field in ENRICHMENT_FIELDS) + (book_id,))
+            continue
+        error = outcome.errors.get(book_id)
+        message = (str(error) or type(error).__name__) if error else 'lookup timed out'
+        attempts = book['enrichment_attempts'] + 1
+        state = 'failed' if attempts >= ENRICHMENT_MAX_ATTEMPTS else 'pending'
+        retries.append((state, attempts, now + timedelta(seconds=enrichment_backoff(attempts)),
+                        message[:255], book_id))
+        counts['failed' if state == 'failed' else 'retrying'] += 1
+    counts['enriched'] = len(done)
+
+    snapshot = None
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        if done:
+            cur.executemany(f"""
+                UPDATE books SET
+                    {', '.join(f"{field}=COALESCE({field}, %s)" for field in ENRICHMENT_FIELDS)},
+                    enrichment_state='done', enrichment_error=NULL, enrichment_next_at=NULL
+                WHERE id = %s
+            """, done)
+            bump_library_revision(cur)
+            # Enrichment never changes a facet; this only moves the index to the new revision
+            snapshot = _facet_snapshot(cur, [])
+        if retries:
+            cur.executemany("""
+                UPDATE books SET enrichment_state=%s, enrichment_attempts=%s,
+                    enrichment_next_at=%s, enrichment_error=%s
+                WHERE id = %s
+            """, retries)
+        conn.commit()
+        _apply_facet_snapshot(snapshot)
+    except mariadb.Error as e:
+        print(f"Error storing enrichment results: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    return counts
+
+def run_enrichment():
+    """Work through every book that is due, one batch at a time."""
+    totals = {'enriched': 0, 'retrying': 0, 'failed': 0}
+    while True:
+        counts = enrich_pending_books()
+        for key, value in counts.items():
+            totals[key] += value
+        if sum(counts.values()) < ENRICHMENT_BATCH_SIZE or counts['enriched'] == 0:
+            return totals
+
+enrichment_job = PeriodicJob(
+    'metadata-enrichment',
+    run_enrichment,
+    float(os.getenv('BOOKVAULT_ENRICHMENT_INTERVAL', '60')),
+)
+
+def get_enrichment_status(limit=100):
+    """Counts per enrichment state plus the books still waiting or failed."""
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT enrichment_state AS state, COUNT(*) AS count
+        FROM books
+        WHERE enrichment_state IN ('pending', 'failed')
+        GROUP BY enrichment_state
+    """)
+    counts = {row['state']: row['count'] for row in cur.fetchall()}
+    cur.execute("""
+        SELECT id, title, author, enrichment_state AS state, enrichment_attempts AS attempts,
+               enrichment_next_at AS next_attempt, enrichment_error AS error
+        FROM books
+        WHERE enrichment_state IN ('pending', 'failed')
+        ORDER BY enrichment_state DESC, enrichment_next_at, id
+        LIMIT %s
+    """, (limit,))
+    books = cur.fetchall()
+    cur.close()
+    conn.close()
+    for book in books:
+        if book['next_attempt']:
+            book['next_attempt'] = book['next_attempt'].strftime("%Y-%m-%d %H:%M:%S")
+    return {'pending': counts.get('pending', 0), 'failed': counts.get('failed', 0), 'books': books}
+
+def retry_failed_enrichment():
+    """Queue books whose enrichment gave up for another round. Returns the count."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE books SET enrichment_state='pending', enrichment_attempts=0, enrichment_next_at=NULL
+        WHERE enrichment_state = 'failed'
+    """)
+    count = cur.rowcount
+    conn.commit()
+    cur.close()
+    conn.close()
+    if count:
+        enrichment_job.trigger()
+    return count
+
+def hydrate_book_tags(cur, books, all_books=False):
+    """Attach a 'tags' list to every book using a single query.
+
+    cur must be a dictionary cursor. When all_books is True the whole
+    book_tags table is read instead of passing every id as a parameter.
+    """
+    tags_by_book = {book['id']: [] for book in books}
+    for book in books:
+        book['tags'] = tags_by_book[book['id']]
+    if not books:
+        return books
+
+    query = """
+        SELECT bt.book_id, t.id, t.name, t.color
+        FROM book_tags bt
+        JOIN tags t ON t.id = bt.tag_id
+    """
+    params = []
+    if not all_books:
+        placeholders = ','.join(['%s'] * len(tags_by_book))
+        query += f" WHERE bt.book_id IN ({placeholders})"
+        params = list(tags_by_book)
+    query += " ORDER BY t.name"
+    cur.execute(query, params)
+
+    for row in cur.fetchall():
+        book_tags = tags_by_book.get(row.pop('book_id'))
+        if book_tags is not None:
+            book_tags.append(row)
+    return books
+
+def prepare_book_rows(books):
+    """Resolve cover URLs and format timestamps for listing rows.
+
+    Covers that are not cached yet are queued on the background prefetcher
+    and the remote URL is returned in the meantime, so listings never block
+    on an image download.
+    """
+    for book in books:
+        if 'cover' in book:
+            book['cover'], book['cover_srcset'] = cover_prefetcher.resolve(book['id'], book['cover'])
+        if book.get('last_status_change'):
+            book['last_status_change'] = book['last_status_change'].strftime("%Y-%m-%d %H:%M:%S")
+    return books
+
+def get_book_covers():
+    """Return (id, cover URL) for every book that has a cover."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id, cover FROM books WHERE cover IS NOT NULL AND cover != ''")
+        return cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+def warm_all_covers():
+    """Queue a cover download for every book whose cover is not cached yet."""
+    return cover_prefetcher.warm(get_book_covers())
+
+def gc_covers():
+    """Delete cached covers that no longer belong to a book's current cover."""
+    return cover_prefetcher.gc(get_book_covers())
+
+def get_all_books():
     conn = get_db_connection()
     cur = conn.cursor(dictionary=True)
     cur.execute("""SELECT id, title, author, cover, status, COALESCE(rating, 0) as rating, last_status_change,
@@ -263,51 +560,30 @@ def get_all_books():
                    FROM books""")
     books = cur.fetchall()
 
-    # Get tags for each book
-    for book in books:
-        cur.execute("""
-            SELECT t.id, t.name, t.color 
-            FROM tags t 
-            JOIN book_tags bt ON t.id = bt.tag_id 
-            WHERE bt.book_id = %s
-        """, (book['id'],))
-        book['tags'] = cur.fetchall()
-
-        cover_url = book['cover']
-        if cover_url:
-            filename = os.path.join(CACHE_DIR, str(book['id']))
-            if not os.path.exists(filename):
-                response = requests.get(cover_url, timeout=15)
-                if response.status_code == 200:
-                    with open(filename, 'wb') as f:
-                        f.write(response.content)
-            book['cover'] = filename if os.path.exists(filename) else None
-        if book['last_status_change']:
-            book['last_status_change'] = book['last_status_change'].strftime("%Y-%m-%d %H:%M:%S")
+    # Get tags for all books in one query
+    hydrate_book_tags(cur, books, all_books=True)
+    prepare_book_rows(books)
 
     cur.close()
     conn.close()
     return books
 
-def update_book_status(title: str, author: str, status: str) -> bool:
-    """Update book status with validation. Returns True on success, False otherwise."""
-    if not title or not author or not status:
-        return False
-    
-    if not isinstance(title, str) or not isinstance(author, str) or not isinstance(status, str):
-        return False
-    
-    if status not in STATUS_OPTIONS:
-        return False
-    
+def _set_book_status(where: str, params: tuple, status: str, rating: int | None = None) -> bool:
+    """Set status (and rating, if given) on the books matching where."""
     conn = get_db_connection()
     cur = conn.cursor()
     try:
         now = datetime.now()
-        cur.execute("""
-            UPDATE books SET status = %s, last_status_change = %s WHERE title = %s AND author = %s
-        """, (status, now, title, author))
+        if rating is None:
+            cur.execute(f"UPDATE books SET status = %s, last_status_change = %s WHERE {where}",
+                        (status, now) + params)
+        else:
+            cur.execute(f"UPDATE books SET status = %s, rating = %s, last_status_change = %s WHERE {where}",
+                        (status, rating, now) + params)
+        bump_library_revision(cur)
+        snapshot = _facet_snapshot(cur, where=where, params=params)
         conn.commit()
+        _apply_facet_snapshot(snapshot)
         return True
     except mariadb.Error as e:
         print(f"Error updating book status: {e}")
@@ -316,19 +592,19 @@ def update_book_status(title: str, author: str, status: str) -> bool:
         cur.close()
         conn.close()
 
-def remove_book(title: str, author: str) -> bool:
-    """Remove book with validation. Returns True on success, False otherwise."""
-    if not title or not author:
-        return False
-    
-    if not isinstance(title, str) or not isinstance(author, str):
-        return False
-    
+def _delete_books(where: str, params: tuple) -> bool:
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("DELETE FROM books WHERE title = %s AND author = %s", (title, author))
+        cur.execute(f"SELECT id FROM books WHERE {where}", params)
+        book_ids = [row[0] for row in cur.fetchall()]
+        cur.execute(f"DELETE FROM books WHERE {where}", params)
+        bump_library_revision(cur)
+        snapshot = _facet_snapshot(cur, book_ids)
         conn.commit()
+        _apply_facet_snapshot(snapshot)
+        for book_id in book_ids:
+            cover_prefetcher.discard(book_id)
         return True
     except mariadb.Error as e:
         print(f"Error removing book: {e}")
@@ -336,10 +612,42 @@ def remove_book(title: str, author: str) -> bool:
     finally:
         cur.close()
         conn.close()
+
+def update_book_status(title: str, author: str, status: str) -> bool:
+    """Update book status with validation. Returns True on success, False otherwise."""
+    if not title or not author or not status:
+        return False
     
-    return False
+    if not isinstance(title, str) or not isinstance(author, str) or not isinstance(status, str):
+        return False
+    
+    if status not in STATUS_OPTIONS:
+        return False
+    
+    return _set_book_status("title = %s AND author = %s", (title, author), status)
+
+def update_book_status_by_id(book_id: int, status: str) -> bool:
+    """Update a book's status by primary key. Returns True on success, False otherwise."""
+    if not isinstance(status, str) or status not in STATUS_OPTIONS:
+        return False
+    return _set_book_status("id = %s", (book_id,), status)
+
+def remove_book(title: str, author: str) -> bool:
+    """Remove book with validation. Returns True on success, False otherwise."""
+    if not title or not author:
+        return False
+    
+    if not isinstance(title, str) or not isinstance(author, str):
+        return False
+    
+    return _delete_books("title = %s AND author = %s", (title, author))
 
-def search_google_books_multiple(query: str, max_results: int = 20) -> list:
+def remove_book_by_id(book_id: int) -> bool:
+    """Remove a book by primary key. Returns True on success, False otherwise."""
+    return _delete_books("id = %s", (book_id,))
+
+def search_google_books_multiple(query: str, max_results: int = 20,
+                                 timeout: float = GOOGLE_BOOKS_TIMEOUT) -> list:
     """Search Google Books with validation. Returns list of book results."""
     if not query or not isinstance(query, str):
         return []
@@ -351,12 +659,10 @@ def search_google_books_multiple(query: str, max_results: int = 20) -> list:
     except (ValueError, TypeError):
         max_results_int = 20
     
-    url = f"https://www.googleapis.com/books/v1/volumes?q={query}&maxResults={max_results_int}"
-    response = requests.get(url, timeout=10)
-    if response.status_code != 200:
+    try:
+        items = fetch_volumes(query, max_results_int, timeout=timeout)
+    except GoogleBooksError:
         return []
-    data = response.json()
-    items = data.get("items", [])
     results = []
     for item in items:
         book_info = item["volumeInfo"]
@@ -382,26 +688,88 @@ def search_google_books_multiple(query: str, max_results: int = 20) -> list:
         })
     return results
 
+def get_library_summary():
+    """Return the library page header numbers with one aggregate query.
+
+    Keys: total_books, total_read, read_this_year and current_reading (the
+    first book with status Reading as {id, title, author}, or None).
+    """
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT s.total_books, s.total_read, s.read_this_year,
+               r.id AS reading_id, r.title AS reading_title, r.author AS reading_author
+        FROM (
+            SELECT COUNT(*) AS total_books,
+                   COALESCE(SUM(status = 'Read'), 0) AS total_read,
+                   COALESCE(SUM(status = 'Read' AND YEAR(last_status_change) = %s), 0) AS read_this_year
+            FROM books
+        ) s
+        LEFT JOIN (
+            SELECT id, title, author FROM books WHERE status = 'Reading' ORDER BY id LIMIT 1
+        ) r ON 1 = 1
+    """, (datetime.now().year,))
+    row = cur.fetchone() or {}
+    cur.close()
+    conn.close()
+
+    current_reading = None
+    if row.get('reading_id') is not None:
+        current_reading = {'id': row['reading_id'], 'title': row['reading_title'], 'author': row['reading_author']}
+    return {
+        'total_books': int(row.get('total_books') or 0),
+        'total_read': int(row.get('total_read') or 0),
+        'read_this_year': int(row.get('read_this_year') or 0),
+        'current_reading': current_reading,
+    }
+
 def get_books_stats():
-    books = get_all_books()
-    total_books = len(books)
-    status_breakdown = Counter(book['status'].strip() for book in books)
-    author_breakdown = Counter(book['author'].strip() for book in books)
+    """Return (total, status, author, read-year, tag) breakdowns for /stats.
+
+    Everything is aggregated with GROUP BY queries, so no book rows are
+    loaded regardless of library size. Values are grouped by their exact
+    bytes: the default collation would merge authors that differ only in
+    case, which the breakdowns have always kept apart.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    cur.execute("SELECT MIN(TRIM(status)), COUNT(*) FROM books GROUP BY BINARY TRIM(status)")
+    status_rows = cur.fetchall()
+    total_books = sum(count for _, count in status_rows)
+    status_breakdown = Counter({status: count for status, count in status_rows if status})
+
+    cur.execute("SELECT MIN(TRIM(author)), COUNT(*) FROM books GROUP BY BINARY TRIM(author)")
+    author_breakdown = Counter({author: count for author, count in cur.fetchall() if author})
 
     # Tag breakdown
-    tag_breakdown = Counter()
-    for book in books:
-        for tag in book.get('tags', []):
-            tag_breakdown[tag['name']] += 1
+    cur.execute("""
+        SELECT t.name, COUNT(*)
+        FROM book_tags bt
+        JOIN tags t ON t.id = bt.tag_id
+        GROUP BY t.id, t.name
+    """)
+    tag_breakdown = Counter(dict(cur.fetchall()))
 
-    read_years = Counter()
-    for book in books:
-        if book['status'].strip() == "Read" and book['last_status_change']:
-            year = datetime.strptime(book['last_status_change'], "%Y-%m-%d %H:%M:%S").year
-            read_years[year] += 1
+    cur.execute("""
+        SELECT YEAR(last_status_change), COUNT(*)
+        FROM books
+        WHERE status = 'Read' AND last_status_change IS NOT NULL
+        GROUP BY YEAR(last_status_change)
+    """)
+    read_years = Counter(dict(cur.fetchall()))
 
+    cur.close()
+    conn.close()
     return total_books, status_breakdown, author_breakdown, read_years, tag_breakdown
 
+def _valid_rating(rating):
+    try:
+        rating_value = int(rating)
+    except (ValueError, TypeError):
+        return None
+    return rating_value if 0 <= rating_value <= 5 else None
+
 def update_book_status_and_rating(title: str, author: str, status: str, rating: int) -> bool:
     """Update book status and rating with validation. Returns True on success, False otherwise."""
     if not title or not author or not status:
@@ -413,48 +781,32 @@ def update_book_status_and_rating(title: str, author: str, status: str, rating:
     if status not in STATUS_OPTIONS:
         return False
     
-    try:
-        rating_value = int(rating)
-        if rating_value < 0 or rating_value > 5:
-            return False
-    except (ValueError, TypeError):
+    rating_value = _valid_rating(rating)
+    if rating_value is None:
         return False
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            ALTER TABLE books
-            ADD COLUMN IF NOT EXISTS rating INT DEFAULT 0,
-            ADD COLUMN IF NOT EXISTS last_status_change DATETIME DEFAULT NULL
-        """)
-    except mariadb.Error:
-        pass
-    try:
-        now = datetime.now()
-        cur.execute("""
-            UPDATE books SET status = %s, rating = %s, last_status_change = %s WHERE title = %s AND author = %s
-        """, (status, rating_value, now, title, author))
-        conn.commit()
-        return True
-    except mariadb.Error as e:
-        print(f"Error updating book status and rating: {e}")
+    return _set_book_status("title = %s AND author = %s", (title, author), status, rating_value)
+
+def update_book_status_and_rating_by_id(book_id: int, status: str, rating: int) -> bool:
+    """Update a book's status and rating by primary key. Returns True on success, False otherwise."""
+    if not isinstance(status, str) or status not in STATUS_OPTIONS:
         return False
-    finally:
-        cur.close()
-        conn.close()
-    
-    return False
+    rating_value = _valid_rating(rating)
+    if rating_value is None:
+        return False
+    return _set_book_status("id = %s", (book_id,), status, rating_value)
 
 def search_google_books_by_isbn(isbn: str) -> list:
     if not validate_isbn(isbn):
         return []
-    url = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}&maxResults=5"
-    response = requests.get(url, timeout=10)
-    if response.status_code != 200:
+    try:
+        items = fetch_volumes(f"isbn:{isbn}", 5)
+    except GoogleBooksError:
         return []
-    data = response.json()
-    items = data.get("items", [])
+    return isbn_results_from_volumes(items)
+
+def isbn_results_from_volumes(items: list[dict]) -> list[dict]:
+    """Convert Google Books volume items into addable book dicts."""
     results = []
     for item in items:
         book_info = item["volumeInfo"]
@@ -480,31 +832,225 @@ def search_google_books_by_isbn(isbn: str) -> list:
         })
     return results
 
-def update_book_ebook_path(bookid, save_path):
+ISBN_BATCH_LIMIT = 500
+ISBN_LOOKUP_WORKERS = int(os.getenv('BOOKVAULT_ISBN_LOOKUP_WORKERS', '8'))
+ISBN_LOOKUP_TIMEOUT = 30
+
+def clean_isbn(isbn):
+    return str(isbn or '').replace('-', '').replace(' ', '').strip().upper()
+
+def get_existing_isbns(isbns):
+    """Return the subset of isbns already stored on a book."""
+    if not isbns:
+        return set()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    placeholders = ','.join(['%s'] * len(isbns))
+    cur.execute(f"SELECT isbn FROM books WHERE isbn IN ({placeholders})", list(isbns))
+    existing = {row[0] for row in cur.fetchall()}
+    cur.close()
+    conn.close()
+    return existing
+
+def get_existing_titles(books):
+    """Return the casefolded (title, author) pairs of books already stored."""
+    if not books:
+        return set()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    placeholders = ','.join(['(%s, %s)'] * len(books))
+    params = [value for book in books for value in (book['title'], book['author'])]
+    cur.execute(f"SELECT title, author FROM books WHERE (title, author) IN ({placeholders})", params)
+    existing = {(title.casefold(), author.casefold()) for title, author in cur.fetchall()}
+    cur.close()
+    conn.close()
+    return existing
+
+def add_books_by_isbn(isbns, timeout=ISBN_LOOKUP_TIMEOUT):
+    """Look up a batch of scanned ISBNs and add the unambiguous matches.
+
+    ISBNs are deduplicated, ones already in the library are skipped, and
+    the rest are resolved concurrently through the cached, rate-limited
+    Google Books client. Single matches are stored under the scanned ISBN
+    in one transaction, unless a book with the same title and author is
+    already there (outcome exists).
+    Returns one {'isbn', 'outcome', ...} dict per distinct ISBN, in input
+    order, where outcome is added, exists, multiple, not_found, invalid
+    or error.
+    """
+    outcomes = {}
+    for isbn in dict.fromkeys(clean_isbn(isbn) for isbn in isbns):
+        if isbn:
+            outcomes[isbn] = {'isbn': isbn, 'outcome': 'invalid' if not validate_isbn(isbn) else None}
+
+    valid = [isbn for isbn, result in outcomes.items() if result['outcome'] is None]
+    for isbn in get_existing_isbns(valid):
+        outcomes[isbn]['outcome'] = 'exists'
+    pending = [isbn for isbn in valid if outcomes[isbn]['outcome'] is None]
+
+    lookup = fan_out(lambda isbn: isbn_results_from_volumes(fetch_volumes(f"isbn:{isbn}", 5)),
+                     pending, max_workers=ISBN_LOOKUP_WORKERS, timeout=timeout)
+    to_add = []
+    for isbn in pending:
+        result = outcomes[isbn]
+        if isbn in lookup.errors:
+            result.update(outcome='error', message=str(lookup.errors[isbn]) or type(lookup.errors[isbn]).__name__)
+        elif isbn not in lookup.results:
+            result.update(outcome='error', message='lookup timed out')
+        elif not lookup.results[isbn]:
+            result['outcome'] = 'not_found'
+        elif len(lookup.results[isbn]) > 1:
+            result.update(outcome='multiple', candidates=lookup.results[isbn])
+        else:
+            # Store the scanned ISBN: Google often lists the ISBN-10 first
+            book = dict(lookup.results[isbn][0], status='TBR', isbn=isbn)
+            result.update(title=book['title'], author=book['author'])
+            to_add.append((isbn, book))
+
+    # A book stored under another ISBN (or scanned twice as ISBN-10 and -13)
+    # matches on title and author, which the upsert would silently update
+    seen = get_existing_titles([book for _, book in to_add]) if to_add else set()
+    new_books = []
+    for isbn, book in to_add:
+        key = (book['title'].casefold(), book['author'].casefold())
+        outcomes[isbn]['outcome'] = 'exists' if key in seen else 'added'
+        if key not in seen:
+            seen.add(key)
+            new_books.append((isbn, book))
+    to_add = new_books
+
+    if to_add:
+        try:
+            insert_books([book for _, book in to_add])
+        except mariadb.Error as e:
+            print(f"Error adding scanned books: {e}")
+            for isbn, _ in to_add:
+                outcomes[isbn].update(outcome='error', message='could not save book')
+    return list(outcomes.values())
+
+def update_book_ebook_path(bookid, save_path, sha256=None, size=None, filename=None):
     try:
         conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("Update books set ebookpath = %s where id = %s", (save_path, bookid))
+    except Exception:
+        return False
+    cur = conn.cursor()
+    try:
+        cur.execute("""Update books set ebookpath = %s, ebook_sha256 = %s, ebook_size = %s, ebook_filename = %s
+                       where id = %s""", (save_path, sha256, size, filename, bookid))
+        bump_library_revision(cur)
+        snapshot = _facet_snapshot(cur, [bookid])
         conn.commit()
-        cur.close()
-        conn.close()
+        _apply_facet_snapshot(snapshot)
         return True
     except Exception as e:
         return False
+    finally:
+        cur.close()
+        conn.close()
     
-def get_ebook_path_by_book_id(bookid):
-    try:
+def get_ebook_by_book_id(bookid):
+    """{'path', 'sha256', 'size', 'filename'} of a book's ebook, or None if it has none."""
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""SELECT ebookpath AS path, ebook_sha256 AS sha256, ebook_size AS size, ebook_filename AS filename
+                   FROM books WHERE id = %s""", (bookid,))
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    return row if row and row['path'] else None
+
+def compact_ebooks(force=False):
+    """Move ebooks into the content-addressed store and reclaim unused files.
+
+    Files still stored as <book id>_<name> are hashed and linked into the
+    blob store, and their books are pointed at the blob. Afterwards every
+    blob or legacy file no book references is deleted; with no references
+    at all this raises CompactionRefused unless force is set. Returns
+    counts, the bytes freed and the store statistics.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT id, ebookpath FROM books WHERE ebookpath IS NOT NULL AND ebookpath != ''")
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+
+    adopted = {}
+    updates = []
+    for book_id, path in rows:
+        if ebook_store.is_blob(path) or not os.path.exists(path):
+            continue
+        if path not in adopted:
+            adopted[path] = ebook_store.adopt(path)
+        blob = adopted[path]
+        filename = os.path.basename(path)
+        prefix = f"{book_id}_"
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+        updates.append((blob['path'], blob['sha256'], blob['size'], filename, book_id))
+
+    if updates:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("SELECT ebookpath FROM books WHERE id = %s", (bookid,))
-        data = cur.fetchone()
-        cur.close()
-        conn.close()
-        if data:
-            return data[0]
-        return None
-    except Exception as e:
-        return None
+        try:
+            cur.executemany("""
+                UPDATE books SET ebookpath = %s, ebook_sha256 = %s, ebook_size = %s, ebook_filename = %s
+                WHERE id = %s
+            """, updates)
+            bump_library_revision(cur)
+            snapshot = _facet_snapshot(cur, sorted({update[-1] for update in updates}))
+            conn.commit()
+            _apply_facet_snapshot(snapshot)
+        except mariadb.Error:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT DISTINCT ebookpath FROM books WHERE ebookpath IS NOT NULL AND ebookpath != ''")
+    referenced = [row[0] for row in cur.fetchall()]
+    cur.close()
+    conn.close()
+
+    result = ebook_store.compact(referenced, force=force)
+    result['migrated'] = len(updates)
+    result.update(get_ebook_store_stats())
+    return result
+
+def get_ebook_store_stats():
+    """Stored ebooks and the bytes deduplication saves.
+
+    logical_bytes counts every book's ebook, stored_bytes each distinct
+    file once; saved_bytes is the difference.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT COUNT(*) AS files, COALESCE(SUM(refs), 0) AS books,
+               COALESCE(SUM(size * refs), 0) AS logical_bytes, COALESCE(SUM(size), 0) AS stored_bytes
+        FROM (
+            SELECT ebook_sha256, MAX(ebook_size) AS size, COUNT(*) AS refs
+            FROM books
+            WHERE ebook_sha256 IS NOT NULL
+            GROUP BY ebook_sha256
+        ) AS blobs
+    """)
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    stats = {key: int(row[key] or 0) for key in ('files', 'books', 'logical_bytes', 'stored_bytes')}
+    stats['saved_bytes'] = stats['logical_bytes'] - stats['stored_bytes']
+    return stats
+
+ebook_compaction_job = PeriodicJob(
+    'ebook-compaction',
+    compact_ebooks,
+    # Off by default: deleting files is left to `flask compact-ebooks` unless enabled
+    float(os.getenv('BOOKVAULT_EBOOK_COMPACT_INTERVAL', '0')),
+)
 
 def get_read_authors():
     conn = get_db_connection()
@@ -516,37 +1062,189 @@ def get_read_authors():
     conn.close()
     return authors
 
-def find_new_books_by_authors(authors):
-    new_books = []
-    # Get all existing books once to avoid multiple DB calls
-    existing_books = get_all_books()
-    # Create a set of (title, author) tuples for quick lookup
-    existing_book_keys = {
-        (book['title'].lower().strip(), book['author'].lower().strip()) 
-        for book in existing_books
+RECOMMENDATION_WORKERS = int(os.getenv('BOOKVAULT_RECOMMENDATION_WORKERS', '8'))
+RECOMMENDATION_TIMEOUT = float(os.getenv('BOOKVAULT_RECOMMENDATION_TIMEOUT', '20'))
+# Each author search gives up on its own after this long, so one slow author
+# cannot use up RECOMMENDATION_TIMEOUT for the others
+RECOMMENDATION_SEARCH_TIMEOUT = float(os.getenv('BOOKVAULT_RECOMMENDATION_SEARCH_TIMEOUT', '5'))
+RECOMMENDATION_MAX_AGE_DAYS = int(os.getenv('BOOKVAULT_RECOMMENDATION_MAX_AGE_DAYS', '7'))
+
+def get_existing_book_keys():
+    """Return a set of normalized (title, author) pairs already in the library."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT title, author FROM books")
+    keys = {
+        ((title or '').lower().strip(), (author or '').lower().strip())
+        for title, author in cur.fetchall()
     }
-    
-    for author in authors:
-        results = search_google_books_multiple(f"inauthor:{author}", max_results=5)  # You can tune max_results
+    cur.close()
+    conn.close()
+    return keys
+
+def find_new_books_by_authors(authors, timeout=RECOMMENDATION_TIMEOUT,
+                              search_timeout=RECOMMENDATION_SEARCH_TIMEOUT):
+    """Search Google Books for each author concurrently.
+
+    Every search has its own search_timeout; timeout only bounds the whole
+    batch as a backstop. Returns {author: [books not already in the
+    library]} for every author whose search finished in time; authors that
+    failed or timed out are left out so the caller can retry them later.
+    """
+    existing_book_keys = get_existing_book_keys()
+
+    outcome = fan_out(
+        lambda author: search_google_books_multiple(f"inauthor:{author}", max_results=5,
+                                                    timeout=search_timeout),
+        authors,
+        max_workers=RECOMMENDATION_WORKERS,
+        timeout=timeout,
+    )
+    if not outcome.complete:
+        print(f"Recommendations incomplete: {len(outcome.errors)} author searches failed, "
+              f"{len(outcome.timed_out)} timed out")
+
+    new_books = {}
+    for author, results in outcome.results.items():
+        new_books[author] = []
         for result in results:
             # Check if this book (by title and author) already exists in the library
             book_key = (result['title'].lower().strip(), result['author'].lower().strip())
             if book_key not in existing_book_keys:
-                new_books.append(result)
-    
+                new_books[author].append(result)
+
     return new_books
 
+def get_read_author_signatures():
+    """Return {author: (read_count, last_read)} for every author with a Read book."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT author, COUNT(*), MAX(last_status_change)
+        FROM books
+        WHERE status = 'Read'
+        GROUP BY author
+    """)
+    signatures = {author: (count, last_read) for author, count, last_read in cur.fetchall()}
+    cur.close()
+    conn.close()
+    return signatures
+
+def refresh_recommendations(force=False, max_age_days=RECOMMENDATION_MAX_AGE_DAYS):
+    """Refresh the stored recommendations for authors whose Read set changed.
+
+    An author is searched again when books by them were marked Read or
+    un-Read since the last run, when their entry is older than max_age_days,
+    or always with force=True. Authors with no Read books left are dropped.
+    """
+    current = get_read_author_signatures()
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT author, read_count, last_read, refreshed_at FROM recommendation_authors")
+    stored = {author: ((count, last_read), refreshed_at)
+              for author, count, last_read, refreshed_at in cur.fetchall()}
+    cur.close()
+    conn.close()
+
+    cutoff = datetime.now() - timedelta(days=max_age_days)
+    stale = [
+        author for author, signature in current.items()
+        if force or author not in stored or stored[author][0] != signature or stored[author][1] < cutoff
+    ]
+    removed = [author for author in stored if author not in current]
+
+    found = find_new_books_by_authors(stale) if stale else {}
+
+    now = datetime.now()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cleared = removed + list(found)
+        if cleared:
+            placeholders = ','.join(['%s'] * len(cleared))
+            cur.execute(f"DELETE FROM recommendations WHERE source_author IN ({placeholders})", cleared)
+        if removed:
+            placeholders = ','.join(['%s'] * len(removed))
+            cur.execute(f"DELETE FROM recommendation_authors WHERE author IN ({placeholders})", removed)
+        rows = [
+            (author, book['title'], book['author'], book.get('cover'), book.get('isbn'), book.get('series'),
+             book.get('publisher'), book.get('publishedDate'), book.get('description'), book.get('selfLink'), now)
+            for author, books in found.items() for book in books
+        ]
+        if rows:
+            cur.executemany("""
+                INSERT INTO recommendations
+                    (source_author, title, author, cover, isbn, series, publisher, publishedDate, description, selfLink, fetched_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+        if found:
+            cur.executemany("""
+                INSERT INTO recommendation_authors (author, read_count, last_read, refreshed_at)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    read_count=VALUES(read_count),
+                    last_read=VALUES(last_read),
+                    refreshed_at=VALUES(refreshed_at)
+            """, [(author, current[author][0], current[author][1], now) for author in found])
+        conn.commit()
+    except mariadb.Error as e:
+        print(f"Error storing recommendations: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    return {'refreshed': len(found), 'pending': len(stale) - len(found), 'removed': len(removed)}
+
+recommendation_job = PeriodicJob(
+    'recommendation-refresh',
+    refresh_recommendations,
+    float(os.getenv('BOOKVAULT_RECOMMENDATION_REFRESH_INTERVAL', str(6 * 3600))),
+)
+
+def get_recommendations():
+    """Read the precomputed recommendations, minus books added since the last refresh."""
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT r.title, r.author, r.cover, r.isbn, r.series, r.publisher,
+               r.publishedDate, r.description, r.selfLink, r.fetched_at
+        FROM recommendations r
+        LEFT JOIN books b ON b.title = r.title AND b.author = r.author
+        WHERE b.id IS NULL
+        ORDER BY r.source_author, r.id
+    """)
+    recommendations = []
+    seen = set()
+    for row in cur.fetchall():
+        key = (row['title'].lower().strip(), row['author'].lower().strip())
+        if key not in seen:
+            seen.add(key)
+            recommendations.append(row)
+    cur.close()
+    conn.close()
+    return recommendations
+
 def update_physical_copy(bookid, physical_copy):
     try:
         conn = get_db_connection()
-        cur = conn.cursor()
+    except Exception:
+        return False
+    cur = conn.cursor()
+    try:
         cur.execute("UPDATE books SET physical_copy = %s WHERE id = %s", (physical_copy, bookid))
+        bump_library_revision(cur)
+        snapshot = _facet_snapshot(cur, [bookid])
         conn.commit()
-        cur.close()
-        conn.close()
+        _apply_facet_snapshot(snapshot)
         return True
     except Exception as e:
         return False
+    finally:
+        cur.close()
+        conn.close()
 
 # Tag management functions
 def create_tag(name, color='#007bff'):
@@ -555,8 +1253,11 @@ def create_tag(name, color='#007bff'):
     cur = conn.cursor()
     try:
         cur.execute("INSERT INTO tags (name, color) VALUES (%s, %s)", (name, color))
-        conn.commit()
         tag_id = cur.lastrowid
+        bump_library_revision(cur)
+        snapshot = _facet_snapshot(cur, [])
+        conn.commit()
+        _apply_facet_snapshot(snapshot)
         cur.close()
         conn.close()
         return tag_id
@@ -582,7 +1283,10 @@ def add_tag_to_book(book_id, tag_id):
     cur = conn.cursor()
     try:
         cur.execute("INSERT IGNORE INTO book_tags (book_id, tag_id) VALUES (%s, %s)", (book_id, tag_id))
+        bump_library_revision(cur)
+        snapshot = _facet_snapshot(cur, [book_id])
         conn.commit()
+        _apply_facet_snapshot(snapshot)
         cur.close()
         conn.close()
         return True
@@ -598,7 +1302,10 @@ def remove_tag_from_book(book_id, tag_id):
     cur = conn.cursor()
     try:
         cur.execute("DELETE FROM book_tags WHERE book_id = %s AND tag_id = %s", (book_id, tag_id))
+        bump_library_revision(cur)
+        snapshot = _facet_snapshot(cur, [book_id])
         conn.commit()
+        _apply_facet_snapshot(snapshot)
         cur.close()
         conn.close()
         return True
@@ -608,16 +1315,127 @@ def remove_tag_from_book(book_id, tag_id):
         conn.close()
         return False
 
-def get_book_tags(book_id):
-    """Get all tags for a specific book"""
+BULK_LIMIT = 1000
+
+def _ids(values, name):
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"{name} must be a non-empty list of ids")
+    ids = []
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+            raise ValueError(f"{name} must contain positive integer ids")
+        if value not in ids:
+            ids.append(value)
+    return ids
+
+def _bulk_operation(op):
+    """Validate one bulk operation into (ids, set columns, tags to add, tags to remove)."""
+    if not isinstance(op, dict):
+        raise ValueError("each operation must be an object")
+    ids = _ids(op.get('ids'), 'ids')
+    columns = {}
+    if 'status' in op:
+        if op['status'] not in STATUS_OPTIONS:
+            raise ValueError(f"status must be one of: {', '.join(STATUS_OPTIONS)}")
+        columns['status'] = op['status']
+    if 'rating' in op:
+        rating = op['rating']
+        if isinstance(rating, bool) or not isinstance(rating, int) or not 0 <= rating <= 5:
+            raise ValueError("rating must be between 0 and 5")
+        columns['rating'] = rating
+    if 'physical_copy' in op:
+        if not isinstance(op['physical_copy'], bool):
+            raise ValueError("physical_copy must be true or false")
+        columns['physical_copy'] = int(op['physical_copy'])
+    add_tags = _ids(op['add_tags'], 'add_tags') if 'add_tags' in op else []
+    remove_tags = _ids(op['remove_tags'], 'remove_tags') if 'remove_tags' in op else []
+    if not columns and not add_tags and not remove_tags:
+        raise ValueError("operation changes nothing")
+    return ids, columns, add_tags, remove_tags
+
+def bulk_update_books(operations):
+    """Apply many changes in one transaction.
+
+    Each operation is {"ids": [...]} plus any of status, rating,
+    physical_copy, add_tags and remove_tags, applied to every listed book
+    with executemany. Books whose status changes all get the same
+    last_status_change; books already in that status keep theirs.
+    Raises ValueError for an invalid request and mariadb.Error if the
+    transaction fails (nothing is applied then). Returns one
+    {'id', 'outcome'} per book, outcome 'updated' or 'not_found'.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations must be a non-empty list")
+    parsed = [_bulk_operation(op) for op in operations]
+    all_ids = list(dict.fromkeys(book_id for ids, _, _, _ in parsed for book_id in ids))
+    if len(all_ids) > BULK_LIMIT:
+        raise ValueError(f"At most {BULK_LIMIT} books per request")
+    tag_ids = {tag_id for _, _, add, remove in parsed for tag_id in add + remove}
+
+    now = datetime.now()
     conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
+    cur = conn.cursor()
+    try:
+        placeholders = ','.join(['%s'] * len(all_ids))
+        cur.execute(f"SELECT id FROM books WHERE id IN ({placeholders})", all_ids)
+        existing = {row[0] for row in cur.fetchall()}
+        if tag_ids:
+            cur.execute(f"SELECT id FROM tags WHERE id IN ({','.join(['%s'] * len(tag_ids))})", list(tag_ids))
+            unknown = tag_ids - {row[0] for row in cur.fetchall()}
+            if unknown:
+                raise ValueError(f"Unknown tag ids: {', '.join(str(tag_id) for tag_id in sorted(unknown))}")
+
+        for ids, columns, add_tags, remove_tags in parsed:
+            ids = [book_id for book_id in ids if book_id in existing]
+            if not ids:
+                continue
+            if columns:
+                assignments, values = [], []
+                if 'status' in columns:
+                    # Assigned first: MariaDB evaluates SET left to right, so this still sees the old status
+                    assignments.append("last_status_change = IF(status <=> %s, last_status_change, %s)")
+                    values += [columns['status'], now]
+                for column, value in columns.items():
+                    assignments.append(f"{column} = %s")
+                    values.append(value)
+                cur.executemany(f"UPDATE books SET {', '.join(assignments)} WHERE id = %s",
+                                [tuple(values) + (book_id,) for book_id in ids])
+            if add_tags:
+                cur.executemany("INSERT IGNORE INTO book_tags (book_id, tag_id) VALUES (%s, %s)",
+                                [(book_id, tag_id) for book_id in ids for tag_id in add_tags])
+            if remove_tags:
+                cur.executemany("DELETE FROM book_tags WHERE book_id = %s AND tag_id = %s",
+                                [(book_id, tag_id) for book_id in ids for tag_id in remove_tags])
+        snapshot = None
+        if existing:
+            bump_library_revision(cur)
+            snapshot = _facet_snapshot(cur, sorted(existing))
+        conn.commit()
+        _apply_facet_snapshot(snapshot)
+    except (ValueError, mariadb.Error):
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    return [{'id': book_id, 'outcome': 'updated' if book_id in existing else 'not_found'}
+            for book_id in all_ids]
+
+def fetch_book_tags(cur, book_id):
+    """Tags of one book in the same shape hydrate_book_tags() uses."""
     cur.execute("""
-        SELECT t.* FROM tags t 
-        JOIN book_tags bt ON t.id = bt.tag_id 
+        SELECT t.id, t.name, t.color FROM book_tags bt
+        JOIN tags t ON t.id = bt.tag_id
         WHERE bt.book_id = %s
+        ORDER BY t.name
     """, (book_id,))
-    tags = cur.fetchall()
+    return cur.fetchall()
+
+def get_book_tags(book_id):
+    """Get all tags for a specific book"""
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    tags = fetch_book_tags(cur, book_id)
     cur.close()
     conn.close()
     return tags
@@ -627,8 +1445,15 @@ def delete_tag(tag_id):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
+        book_ids = None
+        if FACET_INDEX_ENABLED:
+            cur.execute("SELECT book_id FROM book_tags WHERE tag_id = %s", (tag_id,))
+            book_ids = [row[0] for row in cur.fetchall()]
         cur.execute("DELETE FROM tags WHERE id = %s", (tag_id,))
+        bump_library_revision(cur)
+        snapshot = _facet_snapshot(cur, book_ids)
         conn.commit()
+        _apply_facet_snapshot(snapshot)
         cur.close()
         conn.close()
         return True
@@ -644,7 +1469,10 @@ def update_tag(tag_id, name, color):
     cur = conn.cursor()
     try:
         cur.execute("UPDATE tags SET name = %s, color = %s WHERE id = %s", (name, color, tag_id))
+        bump_library_revision(cur)
+        snapshot = _facet_snapshot(cur, [])
         conn.commit()
+        _apply_facet_snapshot(snapshot)
         cur.close()
         conn.close()
         return True
@@ -707,53 +1535,23 @@ def filter_books_by_tags(tag_ids):
     
     books = cur.fetchall()
     
-    # Get tags for each book
-    for book in books:
-        cur.execute("""
-            SELECT t.id, t.name, t.color 
-            FROM tags t 
-            JOIN book_tags bt ON t.id = bt.tag_id 
-            WHERE bt.book_id = %s
-        """, (book['id'],))
-        book['tags'] = cur.fetchall()
-
-        # Handle cover caching
-        cover_url = book['cover']
-        if cover_url:
-            filename = os.path.join(CACHE_DIR, str(book['id']))
-            if not os.path.exists(filename):
-                response = requests.get(cover_url, timeout=15)
-                if response.status_code == 200:
-                    with open(filename, 'wb') as f:
-                        f.write(response.content)
-            book['cover'] = filename if os.path.exists(filename) else None
-        if book['last_status_change']:
-            book['last_status_change'] = book['last_status_change'].strftime("%Y-%m-%d %H:%M:%S")
+    # Get tags for all books in one query
+    hydrate_book_tags(cur, books)
+    prepare_book_rows(books)
     
     cur.close()
     conn.close()
     return books
 
-def filter_books(status_filters=None, format_filters=None, rating_filters=None, tag_ids=None):
-    """Filter books by multiple criteria"""
-    ensure_book_metadata_columns()
-    if not os.path.exists(CACHE_DIR):
-        os.makedirs(CACHE_DIR)
+def build_book_filters(status_filters=None, format_filters=None, rating_filters=None, tag_ids=None):
+    """Translate the listing filters into SQL conditions on books aliased as b.
 
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-    
-    # Base query
-    query = """
-        SELECT DISTINCT b.id, b.title, b.author, b.cover, b.status, COALESCE(b.rating, 0) as rating, 
-               b.last_status_change, b.isbn, b.series, b.publisher, b.publishedDate, 
-               b.description, b.selfLink, b.ebookpath, b.physical_copy
-        FROM books b
+    Returns (conditions, params); conditions are meant to be ANDed. Tag
+    filters match books that have ALL of the given tags.
     """
-    
     conditions = []
     params = []
-    
+
     # Add tag filter if specified
     if tag_ids:
         # Validate and sanitize tag_ids
@@ -761,28 +1559,33 @@ def filter_books(status_filters=None, format_filters=None, rating_filters=None,
         for tid in tag_ids:
             try:
                 tid_int = int(tid)
-                if tid_int > 0:
+                if tid_int > 0 and tid_int not in validated_tag_ids:
                     validated_tag_ids.append(tid_int)
             except (ValueError, TypeError):
                 continue
-        
+
         if validated_tag_ids:
-            query += " JOIN book_tags bt ON b.id = bt.book_id"
             placeholders = ','.join(['%s'] * len(validated_tag_ids))
-            conditions.append(f"bt.tag_id IN ({placeholders})")
+            conditions.append(f"""b.id IN (
+                SELECT bt.book_id
+                FROM book_tags bt
+                WHERE bt.tag_id IN ({placeholders})
+                GROUP BY bt.book_id
+                HAVING COUNT(DISTINCT bt.tag_id) = %s
+            )""")
             params.extend(validated_tag_ids)
-    
+            params.append(len(validated_tag_ids))
+
     # Add status filter
     if status_filters:
         # Validate status values against allowed list
-        valid_statuses = {'TBR', 'Reading', 'Read', 'DNF'}
-        validated_statuses = [s for s in status_filters if s in valid_statuses]
-        
+        validated_statuses = [s for s in status_filters if s in STATUS_OPTIONS]
+
         if validated_statuses:
             status_placeholders = ','.join(['%s'] * len(validated_statuses))
             conditions.append(f"b.status IN ({status_placeholders})")
             params.extend(validated_statuses)
-    
+
     # Add format filters
     if format_filters:
         format_conditions = []
@@ -792,7 +1595,7 @@ def filter_books(status_filters=None, format_filters=None, rating_filters=None,
             format_conditions.append("b.physical_copy = 1")
         if format_conditions:
             conditions.append(f"({' OR '.join(format_conditions)})")
-    
+
     # Add rating filters
     if rating_filters:
         rating_conditions = []
@@ -812,42 +1615,298 @@ def filter_books(status_filters=None, format_filters=None, rating_filters=None,
                     continue
         if rating_conditions:
             conditions.append(f"({' OR '.join(rating_conditions)})")
-    
+
+    return conditions, params
+
+def filter_books(status_filters=None, format_filters=None, rating_filters=None, tag_ids=None):
+    """Filter books by multiple criteria
+
+    With the facet index enabled the filters are resolved in memory and
+    the matching books are fetched by id in one query.
+    """
+    book_ids = None
+    if status_filters or format_filters or rating_filters or tag_ids:
+        book_ids = resolve_facets(status_filters, format_filters, rating_filters, tag_ids)
+        if book_ids == []:
+            return []
+
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+
+    # Base query
+    query = """
+        SELECT b.id, b.title, b.author, b.cover, b.status, COALESCE(b.rating, 0) as rating, 
+               b.last_status_change, b.isbn, b.series, b.publisher, b.publishedDate, 
+               b.description, b.selfLink, b.ebookpath, b.physical_copy
+        FROM books b
+    """
+
+    if book_ids is not None:
+        conditions = [f"b.id IN ({','.join(['%s'] * len(book_ids))})"]
+        params = list(book_ids)
+    else:
+        conditions, params = build_book_filters(status_filters, format_filters, rating_filters, tag_ids)
+
     # Add WHERE clause if there are conditions
     if conditions:
         query += " WHERE " + " AND ".join(conditions)
-    
-    # Add GROUP BY if we're filtering by tags
-    if tag_ids:
-        query += " GROUP BY b.id HAVING COUNT(DISTINCT bt.tag_id) = %s"
-        params.append(len(tag_ids))
-    
+    if book_ids is not None:
+        query += " ORDER BY b.id"
+
     cur.execute(query, params)
     books = cur.fetchall()
-    
-    # Get tags for each book
-    for book in books:
-        cur.execute("""
-            SELECT t.id, t.name, t.color 
-            FROM tags t 
-            JOIN book_tags bt ON t.id = bt.tag_id 
-            WHERE bt.book_id = %s
-        """, (book['id'],))
-        book['tags'] = cur.fetchall()
-
-        # Handle cover caching
-        cover_url = book['cover']
-        if cover_url:
-            filename = os.path.join(CACHE_DIR, str(book['id']))
-            if not os.path.exists(filename):
-                response = requests.get(cover_url, timeout=15)
-                if response.status_code == 200:
-                    with open(filename, 'wb') as f:
-                        f.write(response.content)
-            book['cover'] = filename if os.path.exists(filename) else None
-        if book['last_status_change']:
-            book['last_status_change'] = book['last_status_change'].strftime("%Y-%m-%d %H:%M:%S")
+
+    # Get tags for all books in one query
+    hydrate_book_tags(cur, books)
+    prepare_book_rows(books)
 
     cur.close()
     conn.close()
     return books
+
+# Columns a client may request through get_books_page(fields=...)
+BOOK_FIELDS = {
+    'id': 'b.id',
+    'title': 'b.title',
+    'author': 'b.author',
+    'cover': 'b.cover',
+    'status': 'b.status',
+    'rating': 'COALESCE(b.rating, 0) AS rating',
+    'last_status_change': 'b.last_status_change',
+    'isbn': 'b.isbn',
+    'series': 'b.series',
+    'publisher': 'b.publisher',
+    'publishedDate': 'b.publishedDate',
+    'description': 'b.description',
+    'selfLink': 'b.selfLink',
+    'ebookpath': 'b.ebookpath',
+    'physical_copy': 'b.physical_copy',
+}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def resolve_book_fields(fields):
+    """Validate requested fields against BOOK_FIELDS.
+
+    Returns (wanted, columns): wanted may include 'tags', columns are the
+    BOOK_FIELDS keys to select and always start with id.
+    """
+    if fields:
+        wanted = [f for f in fields if f in BOOK_FIELDS or f == 'tags']
+    else:
+        wanted = list(BOOK_FIELDS) + ['tags']
+    columns = ['id'] + [f for f in wanted if f in BOOK_FIELDS and f != 'id']
+    return wanted, columns
+
+def get_book(book_id, fields=None):
+    """Look up one book by primary key, or None if it does not exist.
+
+    fields works as in get_books_page().
+    """
+    wanted, columns = resolve_book_fields(fields)
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute(f"SELECT {', '.join(BOOK_FIELDS[c] for c in columns)} FROM books b WHERE b.id = %s",
+                (book_id,))
+    book = cur.fetchone()
+    if book is not None:
+        if 'tags' in wanted:
+            book['tags'] = fetch_book_tags(cur, book_id)
+        prepare_book_rows([book])
+    cur.close()
+    conn.close()
+    return book
+
+def get_books_page(status_filters=None, format_filters=None, rating_filters=None, tag_ids=None,
+                   limit=DEFAULT_PAGE_SIZE, cursor=None, fields=None):
+    """Return one keyset-paginated page of books ordered by id.
+
+    cursor is the next_cursor of the previous page (the last id seen);
+    limit=None returns every remaining row. fields limits the returned keys
+    to a subset of BOOK_FIELDS plus 'tags'; id is always included. Returns
+    (books, next_cursor) where next_cursor is None on the last page.
+    """
+    if limit is not None:
+        try:
+            limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        except (ValueError, TypeError):
+            limit = DEFAULT_PAGE_SIZE
+    try:
+        after_id = int(cursor) if cursor not in (None, '') else 0
+    except (ValueError, TypeError):
+        after_id = 0
+
+    wanted, columns = resolve_book_fields(fields)
+
+    conditions, params = build_book_filters(status_filters, format_filters, rating_filters, tag_ids)
+    conditions.append("b.id > %s")
+    params.append(after_id)
+
+    query = f"""
+        SELECT {', '.join(BOOK_FIELDS[c] for c in columns)}
+        FROM books b
+        WHERE {' AND '.join(conditions)}
+        ORDER BY b.id
+    """
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit + 1)
+
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute(query, params)
+    books = cur.fetchall()
+
+    next_cursor = None
+    if limit is not None and len(books) > limit:
+        books = books[:limit]
+        next_cursor = str(books[-1]['id'])
+
+    if 'tags' in wanted:
+        hydrate_book_tags(cur, books)
+    prepare_book_rows(books)
+
+    cur.close()
+    conn.close()
+    return books, next_cursor
+
+EXPORT_BATCH_SIZE = 1000
+
+def iter_books(status_filters=None, format_filters=None, rating_filters=None, tag_ids=None,
+               fields=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield every matching book in id order, reading batch_size rows at a time.
+
+    Memory use is bounded by the batch size, not the library size, and the
+    connection is returned to the pool between batches. Tags are attached
+    with one query per batch. Covers are the stored URLs rather than cached
+    paths, so the rows can be imported elsewhere.
+    """
+    wanted, columns = resolve_book_fields(fields)
+    conditions, params = build_book_filters(status_filters, format_filters, rating_filters, tag_ids)
+    conditions.append("b.id > %s")
+    query = f"""
+        SELECT {', '.join(BOOK_FIELDS[c] for c in columns)}
+        FROM books b
+        WHERE {' AND '.join(conditions)}
+        ORDER BY b.id
+        LIMIT %s
+    """
+
+    after_id = 0
+    while True:
+        conn = get_db_connection()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(query, params + [after_id, batch_size])
+            books = cur.fetchall()
+            if 'tags' in wanted:
+                hydrate_book_tags(cur, books)
+        finally:
+            cur.close()
+            conn.close()
+        for book in books:
+            if book.get('last_status_change'):
+                book['last_status_change'] = book['last_status_change'].strftime("%Y-%m-%d %H:%M:%S")
+            yield book
+        if len(books) < batch_size:
+            return
+        after_id = books[-1]['id']
+
+# InnoDB ignores full-text tokens shorter than innodb_ft_min_token_size and
+# words from its default stopword list, so those never go into MATCH()
+FULLTEXT_MIN_TOKEN = 3
+FULLTEXT_STOPWORDS = {
+    'about', 'are', 'com', 'for', 'from', 'how', 'that', 'the', 'this',
+    'und', 'was', 'what', 'when', 'where', 'who', 'will', 'with', 'www',
+}
+SEARCH_FIELDS = "b.title, b.author, b.series, b.publisher, b.description"
+
+def build_search_condition(query):
+    """Turn free text into a full-text condition for the library search.
+
+    Every indexable word must match, and the last word matches as a prefix
+    so results update while the user types. When the last word is too short
+    or a stopword it falls back to a prefix LIKE on title and author; other
+    unindexable words are ignored. Returns (condition, params,
+    boolean_query); condition is None when nothing is searchable.
+    """
+    words = [w.lower() for w in re.findall(r"\w+", query or '')]
+    terms = []
+    conditions = []
+    params = []
+    for position, word in enumerate(words):
+        is_last = position == len(words) - 1
+        indexable = len(word) >= FULLTEXT_MIN_TOKEN and word not in FULLTEXT_STOPWORDS
+        if indexable:
+            terms.append(f"+{word}*" if is_last else f"+{word}")
+        elif is_last:
+            conditions.append("(b.title LIKE %s OR b.author LIKE %s OR b.title LIKE %s OR b.author LIKE %s)")
+            params.extend([f"{word}%", f"{word}%", f"% {word}%", f"% {word}%"])
+
+    boolean_query = ' '.join(terms) or None
+    if boolean_query:
+        conditions.insert(0, f"MATCH({SEARCH_FIELDS}) AGAINST (%s IN BOOLEAN MODE)")
+        params.insert(0, boolean_query)
+    if not conditions:
+        return None, [], None
+    return ' AND '.join(conditions), params, boolean_query
+
+def search_library(query, status_filters=None, format_filters=None, rating_filters=None, tag_ids=None,
+                   limit=20, offset=0, fields=None):
+    """Full-text search over title, author, series, publisher and description.
+
+    Results are ranked by relevance (title matches first) and can be
+    combined with the same filters as filter_books(). Returns
+    (books, next_offset) where next_offset is None on the last page.
+    """
+    try:
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    except (ValueError, TypeError):
+        limit = 20
+    try:
+        offset = max(0, int(offset))
+    except (ValueError, TypeError):
+        offset = 0
+
+    search_condition, search_params, boolean_query = build_search_condition(query)
+    if search_condition is None:
+        return [], None
+
+    wanted, columns = resolve_book_fields(fields)
+
+    select_params = []
+    if boolean_query:
+        relevance = f"MATCH(b.title) AGAINST (%s IN BOOLEAN MODE) * 2 + MATCH({SEARCH_FIELDS}) AGAINST (%s IN BOOLEAN MODE)"
+        select_params = [boolean_query, boolean_query]
+    else:
+        relevance = "0"
+
+    conditions, params = build_book_filters(status_filters, format_filters, rating_filters, tag_ids)
+    conditions.insert(0, search_condition)
+    params = search_params + params
+
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute(f"""
+        SELECT {', '.join(BOOK_FIELDS[c] for c in columns)}, {relevance} AS relevance
+        FROM books b
+        WHERE {' AND '.join(conditions)}
+        ORDER BY relevance DESC, b.title, b.id
+        LIMIT %s OFFSET %s
+    """, select_params + params + [limit + 1, offset])
+    books = cur.fetchall()
+
+    next_offset = None
+    if len(books) > limit:
+        books = books[:limit]
+        next_offset = offset + limit
+    for book in books:
+        book.pop('relevance', None)
+
+    if 'tags' in wanted:
+        hydrate_book_tags(cur, books)
+    prepare_book_rows(books)
+
+    cur.close()
+    conn.close()
+    return books, next_offset
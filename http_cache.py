@@ -0,0 +1,45 @@
+"""Conditional GET support for views whose output depends on the library."""
+import hashlib
+import time
+from functools import wraps
+
+from flask import make_response, request
+
+from covers import prefetcher as cover_prefetcher
+from helpers import get_library_revision
+
+# Part of every ETag so a restart with new templates never serves a stale 304
+_BOOT_ID = str(time.time_ns())
+
+
+def library_etag(revision):
+    """Strong ETag for the current request given the library revision.
+
+    The query string is part of the tag, so every filter combination is
+    validated separately. The cover generation changes as background cover
+    downloads land, since listings switch from remote to cached cover URLs.
+    """
+    args = '&'.join(f"{key}={value}" for key, value in sorted(request.args.items(multi=True)))
+    raw = f"{_BOOT_ID}|{revision}|{cover_prefetcher.generation}|{request.path}|{args}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def revision_etag(view):
+    """Answer 304 Not Modified when the client already has this revision.
+
+    Only the library revision is read before deciding; the view itself runs
+    only when the ETag does not match.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = library_etag(get_library_revision())
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
@@ -0,0 +1,278 @@
+"""Bulk import of books from CSV files and Goodreads library exports.
+
+Rows are normalized, enriched with Google Books metadata concurrently and
+upserted with executemany in transactional batches. Every run produces an
+ImportReport with progress counters and per-row errors.
+"""
+import csv
+import io
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import mariadb
+
+from fanout import fan_out
+from helpers import (
+    STATUS_OPTIONS,
+    get_google_books_metadata,
+    get_google_books_metadata_by_isbn,
+    insert_books,
+    validate_isbn,
+)
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_WORKERS = int(os.getenv('BOOKVAULT_IMPORT_WORKERS', '8'))
+# Seconds to wait for one batch of Google lookups; unfinished rows are imported as-is
+IMPORT_ENRICH_TIMEOUT = 60
+ENRICH_FIELDS = ('isbn', 'series', 'publisher', 'publishedDate', 'description', 'selfLink')
+# Finished imports kept in memory for the progress endpoint
+MAX_IMPORT_JOBS = 20
+
+GOODREADS_SHELVES = {
+    'read': 'Read',
+    'currently-reading': 'Reading',
+    'to-read': 'TBR',
+    'did-not-finish': 'DNF',
+    'dnf': 'DNF',
+}
+STATUS_BY_NAME = {status.lower(): status for status in STATUS_OPTIONS}
+DATE_FORMATS = ('%Y/%m/%d', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S')
+# "The Way of Kings (The Stormlight Archive, #1)" as written by Goodreads
+SERIES_IN_TITLE = re.compile(r'^(?P<title>.+?)\s*\((?P<series>[^()]+?),?\s*#[\d.]+(?:-[\d.]+)?\)$')
+
+
+class ImportReport:
+    def __init__(self, total=0):
+        self.total = total
+        self.processed = 0
+        self.imported = 0
+        self.enriched = 0
+        self.duplicates = 0
+        self.errors = []
+        self.state = 'running'
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def error(self, line, message, book=None):
+        self.errors.append({
+            'line': line,
+            'title': (book or {}).get('title'),
+            'error': message,
+        })
+
+    def to_dict(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'state': self.state,
+            'total': self.total,
+            'processed': self.processed,
+            'imported': self.imported,
+            'enriched': self.enriched,
+            'duplicates': self.duplicates,
+            'failed': len(self.errors),
+            'errors': self.errors,
+            'elapsed': round(elapsed, 2),
+        }
+
+
+def _clean_isbn(value):
+    """Strip Goodreads' ="..." wrapping and punctuation; None if not an ISBN."""
+    isbn = re.sub(r'[^0-9Xx]', '', value or '').upper()
+    return isbn if validate_isbn(isbn) else None
+
+
+def _parse_date(value):
+    value = (value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_row(row):
+    """Map a CSV row (generic, BookVault export or Goodreads) to a book dict.
+
+    Header names are matched case-insensitively. Raises ValueError for rows
+    that cannot be imported.
+    """
+    row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()
+           if isinstance(value, str)}
+
+    title = row.get('title', '')
+    author = row.get('author') or row.get('authors', '')
+    if not title or not author:
+        raise ValueError("title and author are required")
+
+    series = row.get('series') or None
+    match = SERIES_IN_TITLE.match(title)
+    if match:
+        title = match.group('title')
+        series = series or match.group('series')
+
+    status_name = row.get('status') or row.get('exclusive shelf') or ''
+    status = STATUS_BY_NAME.get(status_name.lower()) or GOODREADS_SHELVES.get(status_name.lower())
+    if status_name and status is None:
+        raise ValueError(f"unknown status '{status_name}'")
+
+    rating_value = row.get('rating') or row.get('my rating') or '0'
+    try:
+        rating = int(float(rating_value))
+    except (ValueError, OverflowError):  # 'nan' and 'inf' are not ratings either
+        raise ValueError(f"rating '{rating_value}' is not a number")
+    if not 0 <= rating <= 5:
+        raise ValueError("rating must be between 0 and 5")
+
+    return {
+        'title': title[:255],
+        'author': author[:255],
+        'status': status or 'TBR',
+        'rating': rating,
+        'last_status_change': _parse_date(row.get('last_status_change') or row.get('date read')),
+        'isbn': _clean_isbn(row.get('isbn13')) or _clean_isbn(row.get('isbn')),
+        'series': series,
+        'publisher': row.get('publisher') or None,
+        'publishedDate': (row.get('publisheddate') or row.get('original publication year')
+                          or row.get('year published') or None),
+        'description': row.get('description') or None,
+        'cover': row.get('cover') or None,
+        'selfLink': row.get('selflink') or None,
+    }
+
+
+def parse_csv(text, report=None):
+    """Return [(line, book)] for every importable row of a CSV export.
+
+    Invalid rows and repeats of a title/author already seen in the file are
+    recorded on report instead.
+    """
+    report = report if report is not None else ImportReport()
+    books = []
+    seen = set()
+    for line, row in enumerate(csv.DictReader(io.StringIO(text.lstrip('\ufeff'))), start=2):
+        try:
+            book = normalize_row(row)
+        except ValueError as e:
+            report.error(line, str(e), {'title': row.get('Title') or row.get('title')})
+            continue
+        key = (book['title'].lower(), book['author'].lower())
+        if key in seen:
+            report.duplicates += 1
+            continue
+        seen.add(key)
+        books.append((line, book))
+    report.total = len(books) + len(report.errors) + report.duplicates
+    report.processed = len(report.errors) + report.duplicates
+    return books
+
+
+def _needs_enrichment(book):
+    return not book.get('isbn') or not book.get('publisher')
+
+
+def _lookup_metadata(book):
+    if book.get('isbn'):
+        meta = get_google_books_metadata_by_isbn(book['isbn'])
+        if meta:
+            return meta
+    return get_google_books_metadata(book['title'], book['author'])
+
+
+def enrich_books(books, timeout=IMPORT_ENRICH_TIMEOUT):
+    """Fill missing metadata from Google Books on IMPORT_WORKERS threads.
+
+    Lookups go through the shared Google rate limiter and response cache.
+    Books whose lookup fails or times out are left as they are. Returns
+    the number of books that gained metadata.
+    """
+    pending = [i for i, book in enumerate(books) if _needs_enrichment(book)]
+    if not pending:
+        return 0
+    outcome = fan_out(lambda i: _lookup_metadata(books[i]), pending,
+                      max_workers=IMPORT_WORKERS, timeout=timeout)
+    enriched = 0
+    for i, meta in outcome.results.items():
+        changed = False
+        for field in ENRICH_FIELDS:
+            if not books[i].get(field) and meta.get(field):
+                books[i][field] = meta[field]
+                changed = True
+        enriched += changed
+    return enriched
+
+
+def _write_batch(batch, report):
+    """Insert a batch in one transaction, falling back to single rows on error."""
+    books = [book for _, book in batch]
+    try:
+        report.imported += insert_books(books)
+        return
+    except mariadb.Error as e:
+        print(f"Import batch failed, retrying rows one by one: {e}")
+    for line, book in batch:
+        try:
+            report.imported += insert_books([book])
+        except mariadb.Error as e:
+            report.error(line, str(e), book)
+
+
+def import_csv(text, enrich=True, batch_size=IMPORT_BATCH_SIZE, report=None, progress=None):
+    """Import a CSV or Goodreads export. Returns the ImportReport.
+
+    progress, if given, is called with the report after every batch.
+    """
+    report = report if report is not None else ImportReport()
+    try:
+        rows = parse_csv(text, report)
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            if enrich:
+                report.enriched += enrich_books([book for _, book in batch])
+            _write_batch(batch, report)
+            report.processed += len(batch)
+            if progress is not None:
+                progress(report)
+        report.state = 'done'
+    except Exception as e:
+        report.state = 'failed'
+        report.error(None, f"Import aborted: {e}")
+        raise
+    finally:
+        report.finished_at = time.time()
+    return report
+
+
+_jobs: dict[str, ImportReport] = {}
+_jobs_lock = threading.Lock()
+
+
+def start_import(text, enrich=True):
+    """Run import_csv on a background thread. Returns the job id."""
+    job_id = uuid.uuid4().hex
+    report = ImportReport()
+    with _jobs_lock:
+        _jobs[job_id] = report
+        finished = [key for key, job in _jobs.items() if job.state != 'running']
+        for key in finished[:max(0, len(_jobs) - MAX_IMPORT_JOBS)]:
+            del _jobs[key]
+
+    def run():
+        try:
+            import_csv(text, enrich=enrich, report=report)
+        except Exception as e:
+            print(f"Import {job_id} failed: {e}")
+
+    threading.Thread(target=run, name=f"import-{job_id[:8]}", daemon=True).start()
+    return job_id
+
+
+def get_import(job_id):
+    """Progress report of a background import, or None if unknown."""
+    with _jobs_lock:
+        report = _jobs.get(job_id)
+    return report.to_dict() if report is not None else None
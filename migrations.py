@@ -0,0 +1,174 @@
+"""Versioned schema migrations.
+
+Each migration is a (version, description, statements) tuple. Versions are
+applied in order exactly once and recorded in the schema_version table, so
+no DDL has to run on request paths. Add new migrations to the end of
+MIGRATIONS; never edit one that has already shipped.
+"""
+from datetime import datetime
+
+MIGRATION_LOCK_NAME = 'bookvault_schema_migrations'
+MIGRATION_LOCK_TIMEOUT = 60
+
+MIGRATIONS = [
+    (1, "create books, tags and book_tags", [
+        """
+        CREATE TABLE IF NOT EXISTS books (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            title VARCHAR(255),
+            author VARCHAR(255),
+            cover VARCHAR(512),
+            status ENUM('TBR', 'Reading', 'Read', 'DNF') DEFAULT 'TBR',
+            last_status_change DATETIME DEFAULT NULL,
+            ebookpath VARCHAR(255),
+            physical_copy BOOL DEFAULT 0,
+            UNIQUE KEY unique_book (title, author)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS tags (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) UNIQUE NOT NULL,
+            color VARCHAR(7) DEFAULT '#007bff',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS book_tags (
+            book_id INT,
+            tag_id INT,
+            PRIMARY KEY (book_id, tag_id),
+            FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE,
+            FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+    (2, "add book metadata columns", [
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS isbn VARCHAR(32)",
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS series VARCHAR(255)",
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS publisher VARCHAR(255)",
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS publishedDate VARCHAR(32)",
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS description TEXT",
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS selfLink VARCHAR(512)",
+    ]),
+    (3, "add rating column", [
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS rating INT DEFAULT 0",
+    ]),
+    (4, "create recommendation store", [
+        """
+        CREATE TABLE IF NOT EXISTS recommendations (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            source_author VARCHAR(255) NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            author VARCHAR(255) NOT NULL,
+            cover VARCHAR(512),
+            isbn VARCHAR(32),
+            series VARCHAR(255),
+            publisher VARCHAR(255),
+            publishedDate VARCHAR(32),
+            description TEXT,
+            selfLink VARCHAR(512),
+            fetched_at DATETIME NOT NULL,
+            KEY recommendations_source_author (source_author)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS recommendation_authors (
+            author VARCHAR(255) PRIMARY KEY,
+            read_count INT NOT NULL,
+            last_read DATETIME DEFAULT NULL,
+            refreshed_at DATETIME NOT NULL
+        )
+        """,
+    ]),
+    (5, "create library revision counter", [
+        """
+        CREATE TABLE IF NOT EXISTS library_revision (
+            id TINYINT PRIMARY KEY,
+            revision BIGINT NOT NULL
+        )
+        """,
+        "INSERT IGNORE INTO library_revision (id, revision) VALUES (1, 1)",
+    ]),
+    (6, "add full-text index for library search", [
+        "CREATE FULLTEXT INDEX IF NOT EXISTS books_fulltext ON books (title, author, series, publisher, description)",
+        "CREATE FULLTEXT INDEX IF NOT EXISTS books_title_fulltext ON books (title)",
+    ]),
+    (7, "track background metadata enrichment", [
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS enrichment_state ENUM('pending', 'done', 'failed') DEFAULT NULL",
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS enrichment_attempts INT NOT NULL DEFAULT 0",
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS enrichment_next_at DATETIME DEFAULT NULL",
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS enrichment_error VARCHAR(255) DEFAULT NULL",
+        "CREATE INDEX IF NOT EXISTS books_enrichment ON books (enrichment_state, enrichment_next_at)",
+    ]),
+    (8, "store ebook content hash and size", [
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS ebook_sha256 CHAR(64) DEFAULT NULL",
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS ebook_size BIGINT DEFAULT NULL",
+    ]),
+    (9, "content-addressed ebook store", [
+        "ALTER TABLE books ADD COLUMN IF NOT EXISTS ebook_filename VARCHAR(255) DEFAULT NULL",
+        "CREATE INDEX IF NOT EXISTS books_ebook_sha256 ON books (ebook_sha256)",
+    ]),
+    (10, "index the listing filters", [
+        "CREATE INDEX IF NOT EXISTS books_status ON books (status)",
+        "CREATE INDEX IF NOT EXISTS books_rating ON books (rating)",
+        "CREATE INDEX IF NOT EXISTS books_physical_copy ON books (physical_copy)",
+        "CREATE INDEX IF NOT EXISTS book_tags_tag ON book_tags (tag_id, book_id)",
+    ]),
+    (11, "index the ebook format filter", [
+        "CREATE INDEX IF NOT EXISTS books_ebookpath ON books (ebookpath)",
+    ]),
+]
+
+
+def ensure_schema_version_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at DATETIME NOT NULL
+        )
+    """)
+
+
+def get_schema_version(cur):
+    """Return the highest applied migration version, or 0 for a fresh database."""
+    cur.execute("SELECT MAX(version) FROM schema_version")
+    row = cur.fetchone()
+    return row[0] if row and row[0] is not None else 0
+
+
+def pending_migrations(current_version, migrations=None):
+    migrations = MIGRATIONS if migrations is None else migrations
+    return [m for m in sorted(migrations, key=lambda m: m[0]) if m[0] > current_version]
+
+
+def run_migrations(conn, migrations=None):
+    """Apply every pending migration on conn. Returns the versions applied.
+
+    A named server lock keeps several app workers starting at once from
+    racing each other through the same migrations.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+    row = cur.fetchone()
+    if not row or row[0] != 1:
+        cur.close()
+        raise RuntimeError("Could not acquire the schema migration lock")
+    applied = []
+    try:
+        ensure_schema_version_table(cur)
+        for version, description, statements in pending_migrations(get_schema_version(cur), migrations):
+            for statement in statements:
+                cur.execute(statement)
+            cur.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+                (version, description, datetime.now())
+            )
+            conn.commit()
+            applied.append(version)
+    finally:
+        cur.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+        cur.fetchone()
+        cur.close()
+    return applied
@@ -0,0 +1,62 @@
+import threading
+import traceback
+
+
+class PeriodicJob:
+    """Run func on a daemon thread every ``interval`` seconds.
+
+    The first run happens as soon as the job starts. trigger() wakes the
+    thread for an immediate run; overlapping runs never happen because the
+    job is executed on its single thread.
+    """
+
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.last_result = None
+        self.last_error = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running or not self.interval or self.interval <= 0:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return True
+
+    def trigger(self):
+        """Ask for a run as soon as possible. Returns False if the job is not running."""
+        if not self.running:
+            return False
+        self._wake.set()
+        return True
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self):
+        try:
+            self.last_result = self.func()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+            print(f"Background job {self.name} failed: {e}")
+            traceback.print_exc()
+        return self.last_result
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            self.run_once()
+            self._wake.wait(self.interval)
@@ -12,6 +12,26 @@ os.environ['BOOKVAULT_DBPORT'] = '3306'
 os.environ['BOOKVAULT_DBNAME'] = 'test_db'
 
 
+@pytest.fixture(autouse=True)
+def reset_db_pool():
+    """Drop pooled connections so mocks never leak between tests."""
+    helpers = sys.modules.get('helpers')
+    if helpers is not None:
+        helpers.db_pool.dispose()
+    yield
+    helpers = sys.modules.get('helpers')
+    if helpers is not None:
+        helpers.db_pool.dispose()
+
+
+@pytest.fixture(autouse=True)
+def disable_google_cache():
+    """Keep Google Books responses from being cached across tests."""
+    import google_cache
+    with patch.object(google_cache, 'cache', google_cache.GoogleBooksCache(None)):
+        yield
+
+
 @pytest.fixture
 def mock_db_connection():
     with patch('helpers.mariadb.connect') as mock_connect:
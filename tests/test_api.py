@@ -0,0 +1,429 @@
+import os
+from unittest.mock import patch
+
+
+class TestGetBooksEndpoint:
+
+    def test_without_pagination_returns_plain_list(self, client):
+        with patch('api_blueprint.get_all_books', return_value=[{'id': 1, 'title': 'A'}]):
+            response = client.get('/api/get_books')
+
+        assert response.status_code == 200
+        assert response.get_json() == [{'id': 1, 'title': 'A'}]
+
+    def test_limit_returns_page_envelope(self, client):
+        with patch('api_blueprint.get_books_page', return_value=([{'id': 5}], '5')) as mock_page:
+            response = client.get('/api/get_books?limit=1&cursor=4&fields=id,title&status_filter=Read')
+
+        assert response.get_json() == {'books': [{'id': 5}], 'next_cursor': '5'}
+        kwargs = mock_page.call_args.kwargs
+        assert kwargs['limit'] == '1'
+        assert kwargs['cursor'] == '4'
+        assert kwargs['fields'] == ['id', 'title']
+        assert kwargs['status_filters'] == ['Read']
+
+    def test_fields_without_limit_returns_projected_list(self, client):
+        with patch('api_blueprint.get_books_page', return_value=([{'id': 1, 'title': 'A'}], None)) as mock_page:
+            response = client.get('/api/get_books?fields=title')
+
+        assert response.get_json() == [{'id': 1, 'title': 'A'}]
+        assert mock_page.call_args.kwargs['limit'] is None
+
+    def test_legacy_route_matches_blueprint(self, client):
+        with patch('api_blueprint.get_books_page', return_value=([], None)):
+            response = client.get('/api/get_books?limit=10')
+
+        assert response.get_json() == {'books': [], 'next_cursor': None}
+
+
+class TestSearchLibraryEndpoint:
+
+    def test_search_passes_query_and_filters(self, client):
+        with patch('api_blueprint.search_library', return_value=([{'id': 3}], 20)) as mock_search:
+            response = client.get('/api/search_library?q=dune&fields=id&offset=0&tags=2')
+
+        assert response.get_json() == {'books': [{'id': 3}], 'next_offset': 20}
+        args, kwargs = mock_search.call_args
+        assert args[0] == 'dune'
+        assert kwargs['fields'] == ['id']
+        assert kwargs['tag_ids'] == [2]
+
+
+class TestBookDetailEndpoints:
+
+    def test_get_book_by_id(self, client):
+        with patch('api_blueprint.get_book', return_value={'id': 4, 'title': 'A'}) as mock_get:
+            response = client.get('/api/books/4?fields=title')
+
+        assert response.get_json() == {'id': 4, 'title': 'A'}
+        assert mock_get.call_args == ((4,), {'fields': ['title']})
+
+    def test_missing_book_is_404(self, client):
+        with patch('api_blueprint.get_book', return_value=None):
+            response = client.get('/api/books/999')
+
+        assert response.status_code == 404
+
+    def test_get_book_tags(self, client):
+        tags = [{'id': 1, 'name': 'Fiction', 'color': '#ff0000'}]
+        with patch('api_blueprint.get_book_tags', return_value=tags):
+            response = client.get('/api/books/4/tags')
+
+        assert response.get_json() == {'tags': tags}
+
+    def test_add_tag_returns_updated_tags(self, client):
+        tags = [{'id': 2, 'name': 'Sci-Fi', 'color': '#00ff00'}]
+        with patch('app.add_tag_to_book', return_value=True), \
+                patch('app.get_book_tags', return_value=tags) as mock_tags:
+            response = client.post('/add_tag_to_book', json={'book_id': 4, 'tag_id': 2})
+
+        assert response.get_json() == {'success': True, 'tags': tags}
+        mock_tags.assert_called_once_with(4)
+
+    def test_remove_tag_returns_updated_tags(self, client):
+        with patch('app.remove_tag_from_book', return_value=True), \
+                patch('app.get_book_tags', return_value=[]):
+            response = client.post('/remove_tag_from_book', json={'book_id': 4, 'tag_id': 2})
+
+        assert response.get_json() == {'success': True, 'tags': []}
+
+
+class TestExportEndpoint:
+
+    def test_streams_csv_with_filters(self, client):
+        books = iter([{'id': 1, 'title': 'Dune'}])
+        with patch('api_blueprint.iter_books', return_value=books) as mock_iter:
+            response = client.get('/api/export?format=csv&fields=title&status_filter=Read')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        assert 'attachment' in response.headers['Content-Disposition']
+        assert response.get_data(as_text=True).splitlines() == ['id,title', '1,Dune']
+        assert mock_iter.call_args.kwargs['status_filters'] == ['Read']
+
+    def test_unknown_format_is_rejected(self, client):
+        assert client.get('/api/export?format=xml').status_code == 400
+
+
+class TestImportEndpoint:
+
+    def test_upload_starts_background_import(self, client):
+        with patch('api_blueprint.start_import', return_value='abc') as mock_start:
+            response = client.post('/api/import?enrich=0', data=b'title,author\nA,B\n',
+                                   content_type='text/csv')
+
+        assert response.status_code == 202
+        assert response.get_json() == {'success': True, 'job_id': 'abc'}
+        mock_start.assert_called_once_with('title,author\nA,B\n', enrich=False)
+
+    def test_empty_upload_is_rejected(self, client):
+        assert client.post('/api/import').status_code == 400
+
+    def test_unknown_job_is_404(self, client):
+        assert client.get('/api/import/nope').status_code == 404
+
+
+class TestIsbnBatchEndpoint:
+
+    def test_returns_outcomes_and_summary(self, client):
+        results = [{'isbn': '1', 'outcome': 'added'}, {'isbn': '2', 'outcome': 'not_found'},
+                   {'isbn': '3', 'outcome': 'added'}]
+        with patch('api_blueprint.add_books_by_isbn', return_value=results) as mock_add:
+            response = client.post('/api/isbn_lookup/batch', json={'isbns': ['1', '2', '3']})
+
+        assert response.get_json()['summary'] == {'added': 2, 'not_found': 1}
+        mock_add.assert_called_once_with(['1', '2', '3'])
+
+    def test_rejects_missing_or_oversized_batches(self, client):
+        assert client.post('/api/isbn_lookup/batch', json={}).status_code == 400
+        too_many = {'isbns': ['9780441172719'] * 501}
+        assert client.post('/api/isbn_lookup/batch', json=too_many).status_code == 400
+
+
+class TestIdBasedMutations:
+
+    def test_update_status_rating_prefers_id(self, client):
+        with patch('app.update_book_status_and_rating_by_id', return_value=True) as mock_by_id, \
+                patch('app.update_book_status_and_rating') as mock_by_title:
+            response = client.post('/update_status_rating',
+                                   json={'id': 5, 'title': 'Dune', 'author': 'Herbert', 'status': 'Read', 'rating': 4})
+
+        assert response.get_json() == {'success': True}
+        mock_by_id.assert_called_once_with(5, 'Read', 4)
+        assert not mock_by_title.called
+
+    def test_title_author_still_supported(self, client):
+        with patch('app.update_book_status', return_value=True) as mock_update, \
+                patch('app.remove_book') as mock_remove:
+            client.post('/update_status', json={'title': 'Dune', 'author': 'Herbert', 'status': 'Read'})
+            client.post('/remove_book', json={'title': 'Dune', 'author': 'Herbert'})
+
+        mock_update.assert_called_once_with('Dune', 'Herbert', 'Read')
+        mock_remove.assert_called_once_with('Dune', 'Herbert')
+
+    def test_remove_book_by_id(self, client):
+        with patch('app.remove_book_by_id') as mock_remove:
+            client.post('/remove_book', json={'id': '9'})
+
+        mock_remove.assert_called_once_with(9)
+
+    def test_patch_and_delete_book(self, client):
+        with patch('api_blueprint.update_book_status_and_rating_by_id', return_value=True) as mock_update, \
+                patch('api_blueprint.remove_book_by_id', return_value=True) as mock_remove:
+            assert client.patch('/api/books/5', json={'status': 'Read', 'rating': 5}).get_json()['success']
+            assert client.patch('/api/books/5', json={'status': 'Read', 'rating': 9}).status_code == 400
+            assert client.patch('/api/books/5', json={'status': 'Lost'}).status_code == 400
+            assert client.delete('/api/books/5').get_json()['success']
+
+        mock_update.assert_called_once_with(5, 'Read', 5)
+        mock_remove.assert_called_once_with(5)
+
+
+class TestBulkEndpoint:
+
+    def test_returns_results_and_summary(self, client):
+        results = [{'id': 1, 'outcome': 'updated'}, {'id': 2, 'outcome': 'not_found'}]
+        operations = [{'ids': [1, 2], 'status': 'Read'}]
+        with patch('api_blueprint.bulk_update_books', return_value=results) as mock_bulk:
+            response = client.post('/api/books/bulk', json={'operations': operations})
+
+        assert response.get_json()['summary'] == {'updated': 1, 'not_found': 1}
+        mock_bulk.assert_called_once_with(operations)
+
+    def test_invalid_request_is_400(self, client):
+        with patch('api_blueprint.bulk_update_books', side_effect=ValueError("bad")):
+            response = client.post('/api/books/bulk', json={})
+
+        assert response.status_code == 400
+        assert response.get_json()['message'] == 'bad'
+
+
+class TestEnrichmentEndpoints:
+
+    def test_status(self, client):
+        status = {'pending': 2, 'failed': 1, 'books': []}
+        with patch('api_blueprint.get_enrichment_status', return_value=status):
+            assert client.get('/api/enrichment').get_json() == status
+
+    def test_retry_requeues_failed_books(self, client):
+        with patch('api_blueprint.retry_failed_enrichment', return_value=3):
+            response = client.post('/api/enrichment/retry')
+
+        assert response.get_json() == {'success': True, 'queued': 3}
+
+
+class TestEbookUploadEndpoints:
+
+    def test_raw_body_upload_records_hash(self, client, tmp_path):
+        from ebooks import EbookStore
+        with patch('api_blueprint.ebook_store', EbookStore(str(tmp_path))), \
+                patch('api_blueprint.update_book_ebook_path') as mock_update:
+            response = client.post('/api/upload_ebook/4?filename=book.epub', data=b'ebook-bytes',
+                                   content_type='application/epub+zip')
+
+        body = response.get_json()
+        assert body['success'] is True and body['size'] == 11
+        assert body['deduplicated'] is False
+        sha256 = body['sha256']
+        mock_update.assert_called_once_with(4, str(tmp_path / 'blobs' / sha256[:2] / sha256), sha256, 11,
+                                            'book.epub')
+
+    def test_multipart_upload_still_works(self, client, tmp_path):
+        import io
+        from ebooks import EbookStore
+        with patch('api_blueprint.ebook_store', EbookStore(str(tmp_path))), \
+                patch('api_blueprint.update_book_ebook_path'):
+            response = client.post('/api/upload_ebook/4', data={'ebook': (io.BytesIO(b'pdf'), 'a.pdf')},
+                                   content_type='multipart/form-data')
+
+        body = response.get_json()
+        assert body['success'] is True
+        assert (tmp_path / 'blobs' / body['sha256'][:2] / body['sha256']).read_bytes() == b'pdf'
+
+    def test_oversized_upload_is_413(self, client, tmp_path):
+        from ebooks import EbookStore
+        with patch('api_blueprint.ebook_store', EbookStore(str(tmp_path), max_bytes=4)):
+            response = client.post('/api/upload_ebook/4?filename=book.pdf', data=b'12345')
+
+        assert response.status_code == 413
+
+    def test_resumable_upload(self, client, tmp_path):
+        from ebooks import EbookStore
+        with patch('api_blueprint.ebook_store', EbookStore(str(tmp_path))), \
+                patch('api_blueprint.update_book_ebook_path') as mock_update:
+            start = client.post('/api/upload_ebook/4/resumable', json={'filename': 'b.pdf', 'size': 6})
+            assert start.status_code == 201
+            url = f"/api/uploads/{start.get_json()['upload_id']}"
+
+            first = client.put(url, data=b'abc', headers={'Upload-Offset': '0'})
+            assert first.get_json() == {'success': True, 'complete': False, 'offset': 3}
+            stale = client.put(url, data=b'abc', headers={'Upload-Offset': '0'})
+            assert stale.status_code == 409 and stale.get_json()['offset'] == 3
+            assert client.get(url).get_json()['offset'] == 3
+            last = client.put(url, data=b'def', headers={'Upload-Offset': '3'})
+
+        assert last.get_json()['complete'] is True
+        assert mock_update.call_args[0][0] == 4
+        assert mock_update.call_args[0][4] == 'b.pdf'
+
+
+class TestEbookDownloadEndpoint:
+
+    SHA = 'ab' * 32
+
+    def _get(self, client, tmp_path, headers=None, offload=None):
+        path = tmp_path / '4_book.epub'
+        path.write_bytes(b'0123456789')
+        ebook = {'path': str(path), 'sha256': self.SHA, 'size': 10, 'filename': 'book.epub'}
+        with patch('api_blueprint.get_ebook_by_book_id', return_value=ebook), \
+                patch('ebooks.EBOOK_OFFLOAD', offload or ''), \
+                patch('ebooks.store.root', str(tmp_path)):
+            return client.get('/api/download_ebook/4', headers=headers or {})
+
+    def test_full_download_carries_validators(self, client, tmp_path):
+        response = self._get(client, tmp_path)
+
+        assert response.status_code == 200
+        assert response.data == b'0123456789'
+        assert response.headers['ETag'] == f'"{self.SHA}"'
+        assert 'Last-Modified' in response.headers
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        assert response.headers['Content-Disposition'] == 'attachment; filename=book.epub'
+
+    def test_range_request_resumes(self, client, tmp_path):
+        response = self._get(client, tmp_path, {'Range': 'bytes=4-', 'If-Range': f'"{self.SHA}"'})
+
+        assert response.status_code == 206
+        assert response.data == b'456789'
+        assert response.headers['Content-Range'] == 'bytes 4-9/10'
+
+    def test_stale_if_range_sends_whole_file(self, client, tmp_path):
+        response = self._get(client, tmp_path, {'Range': 'bytes=4-', 'If-Range': '"other"'})
+
+        assert response.status_code == 200
+        assert response.data == b'0123456789'
+
+    def test_if_none_match_is_304(self, client, tmp_path):
+        assert self._get(client, tmp_path, {'If-None-Match': f'"{self.SHA}"'}).status_code == 304
+
+    def test_x_sendfile_offload(self, client, tmp_path):
+        response = self._get(client, tmp_path, offload='x-sendfile')
+
+        assert response.headers['X-Sendfile'] == str(tmp_path / '4_book.epub')
+        assert response.data == b''
+
+    def test_x_accel_redirect_offload(self, client, tmp_path):
+        response = self._get(client, tmp_path, offload='x-accel-redirect')
+
+        assert response.headers['X-Accel-Redirect'] == '/protected-ebooks/4_book.epub'
+        assert response.headers['ETag'] == f'"{self.SHA}"'
+        assert response.data == b''
+
+    def test_missing_ebook_is_404(self, client):
+        with patch('api_blueprint.get_ebook_by_book_id', return_value=None):
+            assert client.get('/api/download_ebook/4').status_code == 404
+
+
+class TestListingETags:
+
+    def test_unchanged_revision_returns_304_without_running_view(self, client):
+        with patch('http_cache.get_library_revision', return_value=7):
+            with patch('api_blueprint.get_all_books', return_value=[]) as mock_get_all:
+                first = client.get('/api/get_books')
+                etag = first.headers['ETag']
+                second = client.get('/api/get_books', headers={'If-None-Match': etag})
+
+        assert first.status_code == 200
+        assert second.status_code == 304
+        assert second.headers['ETag'] == etag
+        assert mock_get_all.call_count == 1
+
+    def test_revision_change_invalidates_etag(self, client):
+        with patch('api_blueprint.get_all_books', return_value=[]):
+            with patch('http_cache.get_library_revision', return_value=7):
+                etag = client.get('/api/get_books').headers['ETag']
+            with patch('http_cache.get_library_revision', return_value=8):
+                response = client.get('/api/get_books', headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_filters_are_part_of_the_etag(self, client):
+        with patch('http_cache.get_library_revision', return_value=7):
+            with patch('api_blueprint.get_all_books', return_value=[]):
+                unfiltered = client.get('/api/get_books').headers['ETag']
+            with patch('api_blueprint.filter_books', return_value=[]):
+                filtered = client.get('/api/get_books?status_filter=Read').headers['ETag']
+
+        assert unfiltered != filtered
+
+
+class TestIndexPage:
+
+    def test_filtered_view_does_not_load_whole_library(self, client):
+        summary = {'total_books': 3, 'total_read': 1, 'read_this_year': 1, 'current_reading': None}
+        with patch('http_cache.get_library_revision', return_value=1), \
+                patch('app.get_library_summary', return_value=summary), \
+                patch('app.get_all_tags', return_value=[]), \
+                patch('app.filter_books', return_value=[]) as mock_filter, \
+                patch('app.get_all_books') as mock_get_all:
+            response = client.get('/?status_filter=Read')
+
+        assert response.status_code == 200
+        assert b'3 books' in response.data
+        assert mock_filter.called
+        assert not mock_get_all.called
+
+
+class TestCoverEndpoint:
+
+    def test_cover_is_cacheable_and_revalidates(self, client, tmp_path):
+        from covers import CoverPrefetcher, cover_key
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        key = cover_key('http://example.com/c.jpg')
+        path = prefetcher.cache_path(3, key)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'\xff\xd8cover')
+        with patch('app.cover_prefetcher', prefetcher), patch('covers.Image', None):
+            first = client.get(f'/covers/3/thumb?v={key}')
+            second = client.get(f'/covers/3/thumb?v={key}', headers={'If-None-Match': first.headers['ETag']})
+
+        assert first.status_code == 200
+        assert first.mimetype == 'image/jpeg'
+        assert 'immutable' in first.headers['Cache-Control']
+        assert second.status_code == 304
+
+    def test_missing_cover_is_404(self, client, tmp_path):
+        from covers import CoverPrefetcher
+        with patch('app.cover_prefetcher', CoverPrefetcher(cache_dir=str(tmp_path))):
+            assert client.get('/covers/3/thumb?v=0123456789ab').status_code == 404
+            assert client.get('/covers/3/thumb').status_code == 404
+
+
+class TestBackgroundStartup:
+    def _start(self, app, debug, run_main=None):
+        import app as app_module
+        env = {'WERKZEUG_RUN_MAIN': run_main} if run_main else {}
+        with patch.object(app_module, '_started', False), \
+                patch.object(app_module, 'migrate_database') as mock_migrate, \
+                patch.object(app_module, 'recommendation_job') as mock_recommendations, \
+                patch.object(app_module, 'enrichment_job'), \
+                patch.object(app_module, 'ebook_compaction_job'), \
+                patch.dict(os.environ, env), \
+                patch.dict(app.config, {'DEBUG': debug, 'TESTING': False}):
+            if not run_main:
+                os.environ.pop('WERKZEUG_RUN_MAIN', None)
+            client = app.test_client()
+            client.get('/api/db_pool_stats')
+            client.get('/api/db_pool_stats')
+            return mock_migrate.call_count, mock_recommendations.start.call_count
+
+    def test_first_request_starts_jobs_without_reloader(self, app):
+        assert self._start(app, debug=False) == (1, 1)
+
+    def test_reloader_child_starts_jobs(self, app):
+        assert self._start(app, debug=True, run_main='true') == (1, 1)
+
+    def test_debug_without_reloader_child_only_migrates(self, app):
+        assert self._start(app, debug=True) == (1, 0)
@@ -0,0 +1,221 @@
+import io
+import os
+import sys
+import threading
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from covers import CoverPrefetcher, COVER_VARIANTS, cover_key
+
+
+def _ok_response(content=b'image-bytes'):
+    response = MagicMock()
+    response.status_code = 200
+    response.content = content
+    return response
+
+
+URL = 'http://example.com/cover.jpg'
+
+
+def _cache(prefetcher, book_id, cover_url=URL, content=b'cached'):
+    """Put a cover straight into the cache as if it had been downloaded."""
+    path = prefetcher.cache_path(book_id, cover_key(cover_url))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+class TestCoverPrefetcher:
+
+    def test_resolve_returns_remote_url_and_fetches_in_background(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path), max_workers=2)
+        with patch('covers.requests.get', return_value=_ok_response()) as mock_get:
+            result = prefetcher.resolve(1, URL)
+            prefetcher.wait(timeout=5)
+
+        assert result == (URL, None)
+        mock_get.assert_called_once_with(URL, timeout=15)
+        with open(prefetcher.cache_path(1, cover_key(URL)), 'rb') as f:
+            assert f.read() == b'image-bytes'
+
+    def test_cache_is_sharded_by_book_id(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        assert os.path.dirname(prefetcher.cache_path(258, 'abc')) == str(tmp_path / '02')
+
+    def test_resolve_returns_versioned_thumbnail_without_fetching(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        _cache(prefetcher, 7)
+        with patch('covers.requests.get') as mock_get:
+            src, _ = prefetcher.resolve(7, URL)
+
+        assert src == f'/covers/7/thumb?v={cover_key(URL)}'
+        assert not mock_get.called
+
+    def test_resolve_without_cover_url(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        assert prefetcher.resolve(1, None) == (None, None)
+        assert prefetcher.pending() == 0
+
+    def test_in_flight_fetches_are_deduplicated(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path), max_workers=2)
+        release = threading.Event()
+
+        def slow_get(url, timeout):
+            release.wait(5)
+            return _ok_response()
+
+        with patch('covers.requests.get', side_effect=slow_get) as mock_get:
+            assert prefetcher.enqueue(1, 'http://example.com/a.jpg') is True
+            assert prefetcher.enqueue(1, 'http://example.com/a.jpg') is False
+            assert prefetcher.pending() == 1
+            release.set()
+            prefetcher.wait(timeout=5)
+
+        assert mock_get.call_count == 1
+        assert prefetcher.pending() == 0
+
+    def test_failed_fetch_leaves_no_file(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        response = MagicMock()
+        response.status_code = 404
+        with patch('covers.requests.get', return_value=response):
+            prefetcher.enqueue(3, 'http://example.com/missing.jpg')
+            prefetcher.wait(timeout=5)
+
+        assert not prefetcher.is_cached(3, 'http://example.com/missing.jpg')
+        assert prefetcher.stats()['failures'] == 1
+
+    def test_warm_queues_only_missing_covers(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        _cache(prefetcher, 1, 'http://a')
+        with patch('covers.requests.get', return_value=_ok_response()) as mock_get:
+            queued = prefetcher.warm([(1, 'http://a'), (2, 'http://b'), (3, None)])
+            prefetcher.wait(timeout=5)
+
+        assert queued == 1
+        mock_get.assert_called_once_with('http://b', timeout=15)
+
+
+class TestCoverStore:
+
+    def test_changed_cover_url_replaces_cached_file(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        old_path = _cache(prefetcher, 4, 'http://old')
+        with patch('covers.requests.get', return_value=_ok_response(b'new')):
+            src, _ = prefetcher.resolve(4, 'http://new')
+            prefetcher.wait(timeout=5)
+
+        assert src == 'http://new'
+        assert not os.path.exists(old_path)
+        assert prefetcher.is_cached(4, 'http://new')
+
+    def test_discard_removes_every_file_of_a_book(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        path = _cache(prefetcher, 4, content=b'12345')
+        other = _cache(prefetcher, 260, content=b'x')
+
+        assert prefetcher.discard(4) == 5
+        assert not os.path.exists(path)
+        assert os.path.exists(other)
+
+    def test_lru_eviction_keeps_recently_shown_covers(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path), max_bytes=250)
+        for book_id in (1, 2):
+            _cache(prefetcher, book_id, content=b'x' * 100)
+        prefetcher.resolve(1, URL)  # book 1 was shown more recently than book 2
+        with patch('covers.Image', None), \
+                patch('covers.requests.get', return_value=_ok_response(b'x' * 100)):
+            prefetcher.enqueue(3, URL)
+            prefetcher.wait(timeout=5)
+
+        assert prefetcher.is_cached(1, URL)
+        assert not prefetcher.is_cached(2, URL)
+        assert prefetcher.is_cached(3, URL)
+        stats = prefetcher.stats()
+        assert stats['evictions'] == 1
+        assert stats['bytes'] == 200
+
+    def test_gc_removes_orphans_and_migrates_flat_layout(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        kept = _cache(prefetcher, 1, 'http://a')
+        deleted_book = _cache(prefetcher, 2, 'http://b')
+        stale_url = _cache(prefetcher, 1, 'http://a-old')
+        (tmp_path / '5').write_bytes(b'flat')
+        (tmp_path / '6').write_bytes(b'gone')
+        past = os.stat(kept).st_mtime - 60
+        for path in (deleted_book, stale_url):
+            os.utime(path, (past, past))
+
+        result = prefetcher.gc([(1, 'http://a'), (5, 'http://e')])
+
+        assert result['removed'] == 3
+        assert result['migrated'] == 1
+        assert os.path.exists(kept)
+        assert not os.path.exists(deleted_book) and not os.path.exists(stale_url)
+        assert prefetcher.is_cached(5, 'http://e')
+        assert not (tmp_path / '6').exists()
+
+    def test_stats_report_hit_rate(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        _cache(prefetcher, 1, content=b'abc')
+        prefetcher.resolve(1, URL)
+        with patch.object(prefetcher, 'enqueue'):
+            prefetcher.resolve(2, URL)
+
+        stats = prefetcher.stats()
+        assert stats['hits'] == 1 and stats['misses'] == 1
+        assert stats['hit_rate'] == 0.5
+        assert stats['entries'] == 1 and stats['bytes'] == 3
+
+
+def _png_bytes(width, height):
+    Image = pytest.importorskip('PIL.Image')
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class TestCoverVariants:
+
+    def test_variants_are_resized_at_fetch_time(self, tmp_path):
+        Image = pytest.importorskip('PIL.Image')
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        with patch('covers.requests.get', return_value=_ok_response(_png_bytes(800, 1200))):
+            prefetcher.enqueue(5, URL)
+            prefetcher.wait(timeout=5)
+
+        for variant, width in COVER_VARIANTS.items():
+            with Image.open(prefetcher.variant_path(5, cover_key(URL), variant)) as image:
+                assert image.format == 'JPEG'
+                assert image.width == width
+        src, srcset = prefetcher.resolve(5, URL)
+        assert '/covers/5/thumb' in srcset and '/covers/5/medium' in srcset
+
+    def test_variant_file_backfills_existing_cache(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        _cache(prefetcher, 9, content=_png_bytes(600, 900))
+
+        path = prefetcher.variant_file(9, cover_key(URL), 'thumb')
+        assert path == prefetcher.variant_path(9, cover_key(URL), 'thumb')
+        assert os.path.exists(path)
+
+    def test_variant_file_falls_back_to_original_without_pillow(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        original = _cache(prefetcher, 9, content=b'not-an-image')
+        with patch('covers.Image', None):
+            assert prefetcher.variant_file(9, cover_key(URL), 'thumb') == original
+            assert prefetcher.resolve(9, URL)[1] is None
+
+    def test_unknown_variant_key_or_uncached_cover(self, tmp_path):
+        prefetcher = CoverPrefetcher(cache_dir=str(tmp_path))
+        key = cover_key(URL)
+        assert prefetcher.variant_file(1, key, 'thumb') is None
+        _cache(prefetcher, 1)
+        assert prefetcher.variant_file(1, key, 'huge') is None
+        assert prefetcher.variant_file(1, '../../etc', 'thumb') is None
@@ -0,0 +1,135 @@
+import os
+import sys
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from db_pool import BorrowedConnection, ConnectionPool, PoolTimeout
+
+
+def _make_pool(**kwargs):
+    connect = MagicMock(side_effect=lambda: MagicMock())
+    return ConnectionPool(connect, **kwargs), connect
+
+
+class TestConnectionPool:
+
+    def test_released_connection_is_reused(self):
+        pool, connect = _make_pool(size=2)
+        conn = pool.acquire()
+        raw = conn.raw
+        conn.close()
+
+        again = pool.acquire()
+
+        assert again.raw is raw
+        assert connect.call_count == 1
+        raw.ping.assert_called_once()
+
+    def test_close_is_idempotent(self):
+        pool, _ = _make_pool(size=1)
+        conn = pool.acquire()
+        conn.close()
+        conn.close()
+
+        assert pool.stats()['checked_out'] == 0
+        assert pool.stats()['idle'] == 1
+
+    def test_overflow_connections_are_closed_on_release(self):
+        pool, connect = _make_pool(size=1, max_overflow=1)
+        first = pool.acquire()
+        second = pool.acquire()
+        second_raw = second.raw
+        first.close()
+        second.close()
+
+        assert connect.call_count == 2
+        second_raw.close.assert_called_once()
+        assert pool.stats()['idle'] == 1
+
+    def test_waits_for_release_when_exhausted(self):
+        pool, _ = _make_pool(size=1, max_overflow=0, timeout=5)
+        held = pool.acquire()
+        timer = threading.Timer(0.05, held.close)
+        timer.start()
+
+        conn = pool.acquire()
+
+        stats = pool.stats()
+        assert stats['waits'] == 1
+        assert stats['wait_time'] > 0
+        conn.close()
+        timer.join()
+
+    def test_times_out_when_exhausted(self):
+        pool, _ = _make_pool(size=1, max_overflow=0, timeout=0.01)
+        held = pool.acquire()
+
+        with pytest.raises(PoolTimeout):
+            pool.acquire()
+        assert pool.stats()['timeouts'] == 1
+        held.close()
+
+    def test_stale_idle_connection_is_replaced(self):
+        pool, connect = _make_pool(size=1, idle_timeout=0)
+        conn = pool.acquire()
+        raw = conn.raw
+        conn.close()
+
+        again = pool.acquire()
+
+        assert again.raw is not raw
+        assert connect.call_count == 2
+        raw.close.assert_called_once()
+        assert pool.stats()['discarded'] == 1
+
+    def test_failed_ping_replaces_connection(self):
+        pool, connect = _make_pool(size=1)
+        conn = pool.acquire()
+        raw = conn.raw
+        raw.ping.side_effect = Exception("server has gone away")
+        conn.close()
+
+        again = pool.acquire()
+
+        assert again.raw is not raw
+        assert connect.call_count == 2
+
+    def test_connect_failure_does_not_leak_slot(self):
+        connect = MagicMock(side_effect=Exception("refused"))
+        pool = ConnectionPool(connect, size=1, max_overflow=0)
+
+        with pytest.raises(Exception):
+            pool.acquire()
+        assert pool.stats()['checked_out'] == 0
+
+    def test_dropped_connection_is_released(self):
+        pool, _ = _make_pool(size=1, max_overflow=0, timeout=0)
+        raw = pool.acquire().raw
+
+        assert pool.stats()['checked_out'] == 0
+        assert pool.acquire().raw is raw
+
+    def test_close_then_drop_releases_once(self):
+        pool, _ = _make_pool(size=1)
+        conn = pool.acquire()
+        raw = conn.raw
+        conn.close()
+        del conn
+
+        assert raw.rollback.call_count == 1
+        assert pool.stats()['checked_out'] == 0
+
+    def test_borrowed_connection_close_only_rolls_back(self):
+        pool, _ = _make_pool(size=1)
+        owner = pool.acquire()
+        borrowed = BorrowedConnection(owner)
+
+        borrowed.close()
+
+        owner.raw.rollback.assert_called_once()
+        assert pool.stats()['checked_out'] == 1
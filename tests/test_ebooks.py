@@ -0,0 +1,212 @@
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from ebooks import CompactionRefused, EbookStore, OffsetMismatch, UploadError, UploadNotFound, UploadTooLarge
+
+
+class FailingStream:
+    """Yields some bytes and then drops like a broken connection."""
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def read(self, size):
+        chunk = self.data.read(size)
+        if not chunk:
+            raise ConnectionResetError("client went away")
+        return chunk
+
+
+class TestSave:
+
+    def test_streams_to_final_path_with_hash(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        data = b'epub' * 1000
+
+        saved = store.save('My Book.epub', io.BytesIO(data))
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        assert saved['path'] == str(tmp_path / 'blobs' / sha256[:2] / sha256)
+        assert saved['sha256'] == sha256
+        assert saved['size'] == len(data)
+        assert saved['filename'] == 'My_Book.epub'
+        assert saved['deduplicated'] is False
+        with open(saved['path'], 'rb') as f:
+            assert f.read() == data
+        assert os.listdir(store.partial_dir) == []
+
+    def test_rejects_disallowed_types_and_oversized_files(self, tmp_path):
+        store = EbookStore(str(tmp_path), max_bytes=10)
+        with pytest.raises(UploadError):
+            store.save('virus.exe', io.BytesIO(b'x'))
+        with pytest.raises(UploadTooLarge):
+            store.save('big.pdf', io.BytesIO(b'x' * 11))
+        with pytest.raises(UploadTooLarge):
+            store.save('big.pdf', io.BytesIO(b''), length=11)
+
+        assert not (tmp_path / 'blobs').exists()
+        assert os.listdir(store.partial_dir) == []
+
+    def test_dropped_connection_leaves_nothing_behind(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        with pytest.raises(ConnectionResetError):
+            store.save('book.pdf', FailingStream(b'partial'))
+
+        assert os.listdir(store.partial_dir) == []
+        assert not (tmp_path / 'blobs').exists()
+
+
+class TestDeduplication:
+
+    def test_identical_content_is_stored_once(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        first = store.save('a.epub', io.BytesIO(b'same'))
+        upload_id = store.start_upload(2, 'b.epub', 4)
+        second = store.append(upload_id, 0, io.BytesIO(b'same'))
+
+        assert second['path'] == first['path']
+        assert second['deduplicated'] is True
+        assert second['filename'] == 'b.epub'
+        assert os.listdir(store.partial_dir) == []
+
+    def test_adopt_copies_legacy_file_into_store(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        legacy = tmp_path / '5_old.pdf'
+        legacy.write_bytes(b'legacy')
+
+        blob = store.adopt(str(legacy))
+
+        assert blob['sha256'] == hashlib.sha256(b'legacy').hexdigest()
+        assert store.is_blob(blob['path'])
+        assert not store.is_blob(str(legacy))
+        assert legacy.exists()
+        with open(blob['path'], 'rb') as f:
+            assert f.read() == b'legacy'
+
+    def test_compact_removes_unreferenced_files(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        kept = store.save('a.pdf', io.BytesIO(b'kept'))['path']
+        orphan = store.save('b.pdf', io.BytesIO(b'orphan!'))['path']
+        legacy = tmp_path / '3_old.pdf'
+        legacy.write_bytes(b'old')
+        upload_id = store.start_upload(1, 'c.pdf', 10)
+
+        assert store.compact([kept], grace=3600) == {'removed': 0, 'freed': 0}
+        result = store.compact([kept], grace=-1)
+
+        assert result == {'removed': 2, 'freed': 10}
+        assert os.path.exists(kept)
+        assert not os.path.exists(orphan) and not legacy.exists()
+        assert not os.path.exists(os.path.dirname(orphan))
+        assert store.upload_status(upload_id)['offset'] == 0
+
+    def test_compact_only_touches_stored_ebooks(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        kept = store.save('a.pdf', io.BytesIO(b'kept'))['path']
+        unrelated = [tmp_path / 'notes.txt', tmp_path / 'old.pdf', tmp_path / 'blobs' / 'README']
+        for path in unrelated:
+            path.write_bytes(b'mine')
+
+        assert store.compact([kept], grace=-1) == {'removed': 0, 'freed': 0}
+        assert all(path.exists() for path in unrelated)
+
+    def test_compact_matches_paths_stored_relative_to_another_directory(self, tmp_path, monkeypatch):
+        store = EbookStore(str(tmp_path / 'ebooks'))
+        saved = store.save('a.pdf', io.BytesIO(b'kept'))
+        legacy = tmp_path / 'ebooks' / '3_old.pdf'
+        legacy.write_bytes(b'old')
+        elsewhere = tmp_path / 'elsewhere'
+        elsewhere.mkdir()
+        monkeypatch.chdir(elsewhere)
+
+        referenced = [os.path.join('ebooks', 'blobs', saved['sha256'][:2], saved['sha256']),
+                      os.path.join('ebooks', '3_old.pdf')]
+        assert store.compact(referenced, grace=-1) == {'removed': 0, 'freed': 0}
+        assert os.path.exists(saved['path']) and legacy.exists()
+
+    def test_compact_refuses_when_nothing_is_referenced(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        path = store.save('a.pdf', io.BytesIO(b'kept'))['path']
+
+        with pytest.raises(CompactionRefused):
+            store.compact([], grace=-1)
+        assert os.path.exists(path)
+
+        assert store.compact([], grace=-1, force=True) == {'removed': 1, 'freed': 4}
+        assert EbookStore(str(tmp_path / 'empty')).compact([], grace=-1) == {'removed': 0, 'freed': 0}
+
+
+class TestResumableUpload:
+
+    def test_chunks_complete_the_upload(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        data = b'0123456789'
+        upload_id = store.start_upload(3, 'book.pdf', len(data))
+
+        assert store.append(upload_id, 0, io.BytesIO(data[:4]))['offset'] == 4
+        result = store.append(upload_id, 4, io.BytesIO(data[4:]))
+
+        assert result['sha256'] == hashlib.sha256(data).hexdigest()
+        assert result['path'] == store.blob_path(result['sha256'])
+        with open(result['path'], 'rb') as f:
+            assert f.read() == data
+        with pytest.raises(UploadNotFound):
+            store.upload_status(upload_id)
+
+    def test_resume_after_dropped_chunk(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        data = b'abcdefghij'
+        upload_id = store.start_upload(3, 'book.pdf', len(data))
+        with pytest.raises(ConnectionResetError):
+            store.append(upload_id, 0, FailingStream(data[:6]))
+
+        offset = store.upload_status(upload_id)['offset']
+        assert offset == 6
+        with pytest.raises(OffsetMismatch) as excinfo:
+            store.append(upload_id, 2, io.BytesIO(data[2:]))
+        assert excinfo.value.offset == 6
+
+        result = store.append(upload_id, offset, io.BytesIO(data[offset:]))
+        assert result['sha256'] == hashlib.sha256(data).hexdigest()
+
+    def test_hash_is_rebuilt_after_restart(self, tmp_path):
+        data = b'abcdefghij'
+        upload_id = EbookStore(str(tmp_path)).start_upload(3, 'book.pdf', len(data))
+        first = EbookStore(str(tmp_path))
+        first.append(upload_id, 0, io.BytesIO(data[:5]))
+
+        restarted = EbookStore(str(tmp_path))
+        result = restarted.append(upload_id, 5, io.BytesIO(data[5:]))
+
+        assert result['sha256'] == hashlib.sha256(data).hexdigest()
+
+    def test_chunks_beyond_declared_size_are_rejected(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        upload_id = store.start_upload(3, 'book.pdf', 4)
+        with pytest.raises(UploadTooLarge):
+            store.append(upload_id, 0, io.BytesIO(b'12345'))
+
+    def test_abort_and_expiry(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        upload_id = store.start_upload(3, 'book.pdf', 4)
+        store.abort(upload_id)
+        with pytest.raises(UploadNotFound):
+            store.upload_status(upload_id)
+
+        store.start_upload(3, 'book.pdf', 4)
+        assert store.expire_uploads(max_age=-1) == 2
+        assert os.listdir(store.partial_dir) == []
+
+    def test_unknown_or_malformed_upload_id(self, tmp_path):
+        store = EbookStore(str(tmp_path))
+        with pytest.raises(UploadNotFound):
+            store.upload_status('0' * 32)
+        with pytest.raises(UploadNotFound):
+            store.upload_status('../../etc/passwd')
@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from export import export_chunks, export_columns
+
+BOOKS = [
+    {'id': 1, 'title': 'Dune', 'author': 'Frank Herbert',
+     'tags': [{'id': 1, 'name': 'Sci-Fi', 'color': '#00ff00'}, {'id': 2, 'name': 'Classic', 'color': '#000'}]},
+    {'id': 2, 'title': 'Emma, Revised', 'author': None, 'tags': []},
+]
+COLUMNS = ['id', 'title', 'author', 'tags']
+
+
+def _export(books, fmt):
+    return ''.join(export_chunks(iter(books), fmt, COLUMNS))
+
+
+class TestExportFormats:
+
+    def test_ndjson_is_one_object_per_line(self):
+        lines = _export(BOOKS, 'ndjson').splitlines()
+        assert [json.loads(line) for line in lines] == BOOKS
+
+    def test_json_is_a_valid_array(self):
+        assert json.loads(_export(BOOKS, 'json')) == BOOKS
+        assert json.loads(_export([], 'json')) == []
+
+    def test_csv_flattens_tags_and_quotes_values(self):
+        rows = list(csv.reader(io.StringIO(_export(BOOKS, 'csv'))))
+        assert rows[0] == COLUMNS
+        assert rows[1] == ['1', 'Dune', 'Frank Herbert', 'Sci-Fi; Classic']
+        assert rows[2] == ['2', 'Emma, Revised', '', '']
+
+    def test_csv_without_books_has_header(self):
+        assert _export([], 'csv').strip() == 'id,title,author,tags'
+
+    def test_books_are_consumed_lazily(self):
+        consumed = []
+
+        def books():
+            for i in range(5000):
+                consumed.append(i)
+                yield {'id': i, 'title': 'x' * 50}
+
+        chunks = export_chunks(books(), 'ndjson', ['id', 'title'])
+        next(chunks)
+        assert 0 < len(consumed) < 5000
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError):
+            _export(BOOKS, 'xml')
+
+    def test_columns_follow_requested_fields(self):
+        assert export_columns(['title', 'tags']) == ['id', 'title', 'tags']
+        assert export_columns(['bogus']) == ['id']
@@ -0,0 +1,93 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from facets import FacetIndex, bits_to_ids, ids_to_bits
+
+# (id, status, rating, has_ebook, physical_copy)
+BOOKS = [
+    (1, 'Read', 5, 1, 0),
+    (2, 'Read', 3, 0, 1),
+    (3, 'TBR', 0, 0, 0),
+    (4, 'Reading', None, 1, 1),
+    (70, 'DNF', 1, 0, 0),
+]
+LINKS = [(1, 10), (1, 11), (2, 10), (4, 11), (70, 10)]
+
+
+def _index():
+    index = FacetIndex()
+    index.load(5, BOOKS, LINKS)
+    return index
+
+
+class TestBits:
+
+    def test_round_trip(self):
+        ids = [0, 3, 64, 200]
+        assert bits_to_ids(ids_to_bits(ids)) == ids
+        assert bits_to_ids(0) == []
+
+
+class TestResolve:
+
+    def test_no_filters_returns_every_book(self):
+        assert _index().resolve() == [1, 2, 3, 4, 70]
+
+    def test_status_values_are_ored(self):
+        assert _index().resolve(status_filters=['Read', 'DNF', 'bogus']) == [1, 2, 70]
+
+    def test_formats_are_ored(self):
+        index = _index()
+        assert index.resolve(format_filters=['ebook']) == [1, 4]
+        assert index.resolve(format_filters=['ebook', 'physical']) == [1, 2, 4]
+
+    def test_rating_filters(self):
+        index = _index()
+        assert index.resolve(rating_filters=['rated']) == [1, 2, 70]
+        assert index.resolve(rating_filters=['unrated']) == [3, 4]
+        assert index.resolve(rating_filters=['3star']) == [1, 2]
+        assert index.resolve(rating_filters=['5star', 'unrated']) == [1, 3, 4]
+        assert index.resolve(rating_filters=['9star']) == [1, 2, 3, 4, 70]
+
+    def test_tags_must_all_match(self):
+        index = _index()
+        assert index.resolve(tag_ids=['10']) == [1, 2, 70]
+        assert index.resolve(tag_ids=[10, 11]) == [1]
+        assert index.resolve(tag_ids=[99]) == []
+        assert index.resolve(tag_ids=['x', -1]) == [1, 2, 3, 4, 70]
+
+    def test_filters_are_anded(self):
+        assert _index().resolve(status_filters=['Read'], tag_ids=[10], format_filters=['physical']) == [2]
+
+
+class TestUpdate:
+
+    def test_applies_the_next_revision(self):
+        index = _index()
+        assert index.update(6, [3, 70], [(3, 'Read', 4, 0, 0)], [(3, 11)]) is True
+
+        assert index.revision == 6
+        assert index.resolve(status_filters=['Read']) == [1, 2, 3]
+        assert index.resolve(tag_ids=[11]) == [1, 3, 4]
+        assert 70 not in index.resolve()
+
+    def test_tags_without_books_are_dropped(self):
+        index = _index()
+        index.update(6, [1, 4], [(1, 'Read', 5, 1, 0), (4, 'Reading', None, 1, 1)], [(1, 10)])
+        assert index.stats()['tags'] == 1
+        assert index.resolve(tag_ids=[11]) == []
+
+    def test_missed_revision_marks_index_stale(self):
+        index = _index()
+        assert index.update(8, [3], [], []) is False
+        assert index.revision is None
+
+    def test_stats(self):
+        index = _index()
+        index.resolve()
+        stats = index.stats()
+        assert stats['books'] == 5 and stats['tags'] == 2
+        assert stats['rebuilds'] == 1 and stats['queries'] == 1
@@ -0,0 +1,93 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from fanout import RateLimiter, fan_out
+
+
+class TestFanOut:
+
+    def test_calls_run_concurrently(self):
+        barrier = threading.Barrier(4, timeout=5)
+
+        def call(item):
+            barrier.wait()
+            return item * 2
+
+        outcome = fan_out(call, [1, 2, 3, 4], max_workers=4, timeout=5)
+
+        assert outcome.results == {1: 2, 2: 4, 3: 6, 4: 8}
+        assert outcome.complete
+
+    def test_duplicate_items_are_called_once(self):
+        calls = []
+
+        def call(item):
+            calls.append(item)
+            return item
+
+        fan_out(call, ['a', 'b', 'a'], max_workers=2)
+
+        assert sorted(calls) == ['a', 'b']
+
+    def test_errors_are_collected_per_item(self):
+        def call(item):
+            if item == 'bad':
+                raise ValueError("boom")
+            return item
+
+        outcome = fan_out(call, ['good', 'bad'])
+
+        assert outcome.results == {'good': 'good'}
+        assert isinstance(outcome.errors['bad'], ValueError)
+        assert not outcome.complete
+
+    def test_slow_items_time_out_with_partial_results(self):
+        release = threading.Event()
+
+        def call(item):
+            if item == 'slow':
+                release.wait(5)
+            return item
+
+        start = time.monotonic()
+        outcome = fan_out(call, ['fast', 'slow'], max_workers=2, timeout=0.1)
+        elapsed = time.monotonic() - start
+        release.set()
+
+        assert outcome.results == {'fast': 'fast'}
+        assert outcome.timed_out == ['slow']
+        assert elapsed < 2
+
+    def test_empty_input(self):
+        outcome = fan_out(lambda item: item, [])
+        assert outcome.results == {}
+        assert outcome.complete
+
+
+class TestRateLimiter:
+
+    def test_burst_is_available_immediately(self):
+        limiter = RateLimiter(rate=1, burst=3)
+        start = time.monotonic()
+        assert all(limiter.acquire() for _ in range(3))
+        assert time.monotonic() - start < 0.5
+
+    def test_acquire_times_out_when_exhausted(self):
+        limiter = RateLimiter(rate=0.1, burst=1)
+        assert limiter.acquire() is True
+        assert limiter.acquire(timeout=0.01) is False
+
+    def test_zero_rate_disables_limiting(self):
+        limiter = RateLimiter(rate=0)
+        assert all(limiter.acquire(timeout=0) for _ in range(100))
+
+    def test_fan_out_respects_rate_limit(self):
+        limiter = RateLimiter(rate=20, burst=1)
+        start = time.monotonic()
+        fan_out(lambda item: item, range(5), max_workers=5, rate_limiter=limiter)
+        assert time.monotonic() - start >= 0.15
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+import google_cache
+from google_cache import GoogleBooksCache, GoogleBooksError, fetch_volumes, normalize_query
+
+
+def _response(status_code=200, items=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = {'items': items} if items is not None else {}
+    return response
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = GoogleBooksCache(str(tmp_path / 'google.sqlite3'), max_entries=3)
+    with patch.object(google_cache, 'cache', cache):
+        yield cache
+
+
+class TestNormalizeQuery:
+
+    def test_whitespace_and_case_are_normalized(self):
+        assert normalize_query('  The   Hobbit ', 20) == normalize_query('the hobbit', 20)
+
+    def test_result_count_is_part_of_the_key(self):
+        assert normalize_query('hobbit', 5) != normalize_query('hobbit', 20)
+
+
+class TestFetchVolumes:
+
+    def test_second_lookup_is_served_from_cache(self, cache):
+        items = [{'volumeInfo': {'title': 'The Hobbit'}}]
+        with patch('google_cache.requests.get', return_value=_response(items=items)) as mock_get:
+            assert fetch_volumes('The Hobbit', 20) == items
+            assert fetch_volumes('the  hobbit', 20) == items
+
+        assert mock_get.call_count == 1
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+
+    def test_empty_results_are_negatively_cached(self, cache):
+        with patch('google_cache.requests.get', return_value=_response(items=[])) as mock_get:
+            assert fetch_volumes('nothing here', 20) == []
+            assert fetch_volumes('nothing here', 20) == []
+
+        assert mock_get.call_count == 1
+        assert cache.stats()['negative_hits'] == 1
+
+    def test_404_is_cached_as_empty(self, cache):
+        with patch('google_cache.requests.get', return_value=_response(404)) as mock_get:
+            assert fetch_volumes('isbn:0000000000', 1) == []
+            assert fetch_volumes('isbn:0000000000', 1) == []
+
+        assert mock_get.call_count == 1
+
+    def test_errors_raise_and_are_not_cached(self, cache):
+        with patch('google_cache.requests.get', return_value=_response(429)) as mock_get:
+            with pytest.raises(GoogleBooksError) as excinfo:
+                fetch_volumes('rate limited', 20)
+            with pytest.raises(GoogleBooksError):
+                fetch_volumes('rate limited', 20)
+
+        assert excinfo.value.status_code == 429
+        assert mock_get.call_count == 2
+
+    def test_disabled_cache_always_fetches(self):
+        with patch.object(google_cache, 'cache', GoogleBooksCache(None)):
+            with patch('google_cache.requests.get', return_value=_response(items=[])) as mock_get:
+                fetch_volumes('q', 20)
+                fetch_volumes('q', 20)
+
+        assert mock_get.call_count == 2
+
+    def test_timeout_is_passed_to_requests(self):
+        with patch.object(google_cache, 'cache', GoogleBooksCache(None)):
+            with patch('google_cache.requests.get', return_value=_response(items=[])) as mock_get:
+                fetch_volumes('q', 20)
+                fetch_volumes('q', 20, timeout=2.5)
+
+        assert [call.kwargs['timeout'] for call in mock_get.call_args_list] == [google_cache.GOOGLE_BOOKS_TIMEOUT, 2.5]
+
+
+class TestGoogleBooksCache:
+
+    def test_expired_entries_are_misses(self, tmp_path):
+        cache = GoogleBooksCache(str(tmp_path / 'c.sqlite3'), ttl=-1)
+        cache.set('key', [{'id': 1}])
+
+        assert cache.get('key') == (False, None)
+
+    def test_least_recently_used_entry_is_evicted(self, tmp_path):
+        cache = GoogleBooksCache(str(tmp_path / 'c.sqlite3'), max_entries=2)
+        now = time.time()
+        with patch('google_cache.time.time', side_effect=[now + 1, now + 2, now + 3, now + 4]):
+            cache.set('a', [{'id': 'a'}])
+            cache.set('b', [{'id': 'b'}])
+            cache.get('a')
+            cache.set('c', [{'id': 'c'}])
+
+        assert cache.get('a')[0] is True
+        assert cache.get('b') == (False, None)
+        assert cache.get('c')[0] is True
+        assert cache.stats()['evictions'] == 1
+
+    def test_cache_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / 'c.sqlite3')
+        GoogleBooksCache(path).set('key', [{'id': 1}])
+
+        assert GoogleBooksCache(path).get('key') == (True, [{'id': 1}])
@@ -1,4 +1,5 @@
 import pytest
+import requests
 import sys
 import os
 import importlib
@@ -34,18 +35,56 @@ class TestGetDBConnection:
             conn = helpers_module.get_db_connection()
             assert conn is not None
 
+    def test_get_db_connection_reuses_pooled_connection(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            helpers_module.get_db_connection().close()
+            helpers_module.get_db_connection().close()
+
+            assert mock_connect.call_count == 1
+            assert helpers_module.get_db_pool_stats()['checkouts'] == 2
+
+    def test_get_db_connection_is_shared_within_app_context(self, helpers_module):
+        from flask import Flask
+        with patch('helpers.mariadb.connect') as mock_connect:
+            with Flask(__name__).app_context():
+                first = helpers_module.get_db_connection()
+                first.close()
+                second = helpers_module.get_db_connection()
+                second.close()
+                assert helpers_module.get_db_pool_stats()['checked_out'] == 1
+                helpers_module.close_request_db_connection()
+
+            assert mock_connect.call_count == 1
+            assert helpers_module.get_db_pool_stats()['checked_out'] == 0
+
+    def test_failing_helpers_do_not_leak_connections(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_connect.return_value.cursor.return_value.execute.side_effect = helpers_module.mariadb.Error
+            for _ in range(helpers_module.db_pool.max_connections + 1):
+                with pytest.raises(helpers_module.mariadb.Error):
+                    helpers_module.get_all_tags()
+                with pytest.raises(helpers_module.mariadb.Error):
+                    helpers_module.get_library_revision()
+                assert helpers_module.update_physical_copy(1, True) is False
+
+            assert helpers_module.get_db_pool_stats()['checked_out'] == 0
+            assert helpers_module.get_db_pool_stats()['timeouts'] == 0
+
 
-class TestCreateTable:
-    def test_create_table_creates_all_tables(self, helpers_module):
+class TestMigrateDatabase:
+    def test_migrate_database_applies_pending_migrations(self, helpers_module):
         with patch('helpers.mariadb.connect') as mock_connect:
             mock_conn = MagicMock()
             mock_cursor = MagicMock()
             mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.fetchone.side_effect = [(1,), (None,), (1,)]
             mock_connect.return_value = mock_conn
-            
-            helpers_module.create_table()
-            
-            assert mock_cursor.execute.call_count >= 3
+
+            applied = helpers_module.migrate_database()
+
+            from migrations import MIGRATIONS
+            assert applied == [m[0] for m in MIGRATIONS]
+            assert mock_conn.commit.call_count == len(MIGRATIONS)
 
 
 class TestInsertBook:
@@ -83,6 +122,64 @@ class TestInsertBook:
             
             assert mock_cursor.execute.called
 
+    def test_insert_book_without_isbn_is_queued_for_enrichment(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect, \
+                patch('helpers.fetch_volumes') as mock_fetch, \
+                patch.object(helpers_module.enrichment_job, 'trigger') as mock_trigger:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_connect.return_value = mock_conn
+
+            assert helpers_module.insert_book({'title': 'Dune', 'author': 'Frank Herbert'}) is True
+
+        assert not mock_fetch.called
+        insert = next(call for call in mock_cursor.execute.call_args_list if 'INSERT INTO books' in call[0][0])
+        assert insert[0][1][-1] == 'pending'
+        mock_trigger.assert_called_once()
+
+
+class TestInsertBooks:
+    def test_one_executemany_per_batch(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_connect.return_value = mock_conn
+
+            count = helpers_module.insert_books([
+                {'title': 'A', 'author': 'X'},
+                {'title': 'B', 'author': 'Y', 'status': 'Read', 'rating': 4},
+            ])
+
+        assert count == 2
+        sql, rows = mock_cursor.executemany.call_args[0]
+        assert 'COALESCE(VALUES(isbn), isbn)' in sql
+        assert [row[:2] for row in rows] == [('A', 'X'), ('B', 'Y')]
+        assert rows[1][3] == 'Read' and rows[1][5] == 4
+        mock_conn.commit.assert_called_once()
+
+    def test_error_rolls_back_and_raises(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.executemany.side_effect = helpers_module.mariadb.Error("boom")
+            mock_connect.return_value = mock_conn
+
+            with pytest.raises(helpers_module.mariadb.Error):
+                helpers_module.insert_books([{'title': 'A', 'author': 'X'}])
+            mock_conn.rollback.assert_called()
+
+    def test_books_without_isbn_wake_the_enrichment_job(self, helpers_module):
+        with patch('helpers.mariadb.connect'), patch('helpers.enrichment_job') as mock_job:
+            helpers_module.insert_books([{'title': 'A', 'author': 'X', 'isbn': '9780441172719'}])
+            assert not mock_job.trigger.called
+
+            helpers_module.insert_books([{'title': 'A', 'author': 'X', 'isbn': '9780441172719'},
+                                         {'title': 'B', 'author': 'Y'}])
+            mock_job.trigger.assert_called_once()
+
 
 class TestGetAllBooks:
     def test_get_all_books_returns_list(self, helpers_module):
@@ -115,7 +212,7 @@ class TestGetAllBooks:
                     [{'id': 1, 'title': 'Book 1', 'author': 'Author 1',
                       'cover': None, 'status': 'TBR', 'rating': 0,
                       'last_status_change': None}],
-                    [{'id': 1, 'name': 'Fiction', 'color': '#ff0000'}],
+                    [{'book_id': 1, 'id': 1, 'name': 'Fiction', 'color': '#ff0000'}],
                     []
                 ]
                 mock_connect.return_value = mock_conn
@@ -150,6 +247,65 @@ class TestGetAllBooks:
                     assert 'cover' in books[0]
 
 
+class TestTagHydration:
+    @staticmethod
+    def _execute_count(helpers_module, book_count, func, **kwargs):
+        helpers_module.db_pool.dispose()
+        with patch('helpers.mariadb.connect') as mock_connect:
+            with patch('helpers.os.path.exists', return_value=True):
+                mock_conn = MagicMock()
+                mock_cursor = MagicMock()
+                mock_conn.cursor.return_value = mock_cursor
+                books = [{'id': i, 'title': f'Book {i}', 'author': 'Author',
+                          'cover': None, 'status': 'TBR', 'rating': 0,
+                          'last_status_change': None}
+                         for i in range(1, book_count + 1)]
+                tag_rows = [{'book_id': i, 'id': 1, 'name': 'Fiction', 'color': '#ff0000'}
+                            for i in range(1, book_count + 1)]
+                mock_cursor.fetchall.side_effect = [books, tag_rows]
+                mock_connect.return_value = mock_conn
+
+                result = func(**kwargs)
+
+                assert len(result) == book_count
+                assert all(book['tags'] == [{'id': 1, 'name': 'Fiction', 'color': '#ff0000'}]
+                           for book in result)
+                return mock_cursor.execute.call_count
+
+    @pytest.mark.parametrize('func_name, kwargs', [
+        ('get_all_books', {}),
+        ('filter_books', {'status_filters': ['TBR']}),
+        ('filter_books_by_tags', {'tag_ids': [1]}),
+    ])
+    def test_query_count_independent_of_library_size(self, helpers_module, func_name, kwargs):
+        func = getattr(helpers_module, func_name)
+        small = self._execute_count(helpers_module, 1, func, **kwargs)
+        large = self._execute_count(helpers_module, 500, func, **kwargs)
+        assert small == large
+
+    def test_hydrate_book_tags_groups_rows_by_book(self, helpers_module):
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [
+            {'book_id': 1, 'id': 1, 'name': 'Fiction', 'color': '#ff0000'},
+            {'book_id': 2, 'id': 2, 'name': 'Sci-Fi', 'color': '#00ff00'},
+            {'book_id': 1, 'id': 2, 'name': 'Sci-Fi', 'color': '#00ff00'},
+        ]
+        books = [{'id': 1}, {'id': 2}, {'id': 3}]
+
+        helpers_module.hydrate_book_tags(cursor, books)
+
+        assert [t['name'] for t in books[0]['tags']] == ['Fiction', 'Sci-Fi']
+        assert [t['name'] for t in books[1]['tags']] == ['Sci-Fi']
+        assert books[2]['tags'] == []
+        assert cursor.execute.call_count == 1
+        assert cursor.execute.call_args[0][1] == [1, 2, 3]
+
+    def test_hydrate_book_tags_skips_query_for_empty_list(self, helpers_module):
+        cursor = MagicMock()
+        assert helpers_module.hydrate_book_tags(cursor, []) == []
+        assert not cursor.execute.called
+
+
 class TestUpdateBookStatus:
     def test_update_book_status(self, helpers_module):
         with patch('helpers.mariadb.connect') as mock_connect:
@@ -162,6 +318,19 @@ class TestUpdateBookStatus:
             
             assert mock_cursor.execute.called
 
+    def test_update_book_status_bumps_library_revision(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_connect.return_value = mock_conn
+
+            helpers_module.update_book_status('Test Book', 'Test Author', 'Read')
+
+            statements = [c[0][0] for c in mock_cursor.execute.call_args_list]
+            assert any('library_revision' in sql for sql in statements)
+            mock_conn.commit.assert_called_once()
+
 
 class TestRemoveBook:
     def test_remove_book(self, helpers_module):
@@ -175,6 +344,44 @@ class TestRemoveBook:
             
             assert mock_cursor.execute.called
 
+    def test_remove_book_by_id(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect, \
+                patch.object(helpers_module.cover_prefetcher, 'discard') as mock_discard:
+            mock_cursor = mock_connect.return_value.cursor.return_value
+            mock_cursor.fetchall.return_value = [(7,)]
+
+            assert helpers_module.remove_book_by_id(7) is True
+
+        delete = next(c for c in mock_cursor.execute.call_args_list if c[0][0].startswith('DELETE'))
+        assert delete[0] == ("DELETE FROM books WHERE id = %s", (7,))
+        mock_discard.assert_called_once_with(7)
+
+
+class TestUpdateBookById:
+    def test_status_by_id(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_cursor = mock_connect.return_value.cursor.return_value
+            assert helpers_module.update_book_status_by_id(3, 'Read') is True
+
+        sql, params = mock_cursor.execute.call_args_list[0][0]
+        assert sql.endswith('WHERE id = %s')
+        assert params[0] == 'Read' and params[-1] == 3
+
+    def test_status_and_rating_by_id(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_cursor = mock_connect.return_value.cursor.return_value
+            assert helpers_module.update_book_status_and_rating_by_id(3, 'Read', 4) is True
+
+        sql, params = mock_cursor.execute.call_args_list[0][0]
+        assert 'rating = %s' in sql and sql.endswith('WHERE id = %s')
+        assert params[:2] == ('Read', 4) and params[-1] == 3
+
+    def test_invalid_values_are_rejected(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            assert helpers_module.update_book_status_by_id(3, 'Lost') is False
+            assert helpers_module.update_book_status_and_rating_by_id(3, 'Read', 9) is False
+            assert not mock_connect.called
+
 
 class TestSearchGoogleBooks:
     def test_search_google_books_multiple(self, helpers_module):
@@ -237,6 +444,389 @@ class TestSearchGoogleBooks:
             assert results[0]['isbn'] == '1234567890'
 
 
+class TestFindNewBooksByAuthors:
+    def test_skips_books_already_in_library(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            with patch('helpers.search_google_books_multiple') as mock_search:
+                mock_conn = MagicMock()
+                mock_cursor = MagicMock()
+                mock_conn.cursor.return_value = mock_cursor
+                mock_cursor.fetchall.return_value = [('Owned Book', 'Author A')]
+                mock_connect.return_value = mock_conn
+                mock_search.side_effect = lambda query, max_results, timeout: {
+                    'inauthor:Author A': [{'title': 'Owned Book', 'author': 'Author A'},
+                                          {'title': 'New Book', 'author': 'Author A'}],
+                    'inauthor:Author B': [{'title': 'Other Book', 'author': 'Author B'}],
+                }[query]
+
+                books = helpers_module.find_new_books_by_authors(['Author A', 'Author B'])
+
+                assert [b['title'] for b in books['Author A']] == ['New Book']
+                assert [b['title'] for b in books['Author B']] == ['Other Book']
+                assert mock_search.call_count == 2
+                assert all(call.kwargs['timeout'] == helpers_module.RECOMMENDATION_SEARCH_TIMEOUT
+                           for call in mock_search.call_args_list)
+
+    def test_failed_author_search_returns_partial_results(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            with patch('helpers.search_google_books_multiple') as mock_search:
+                mock_conn = MagicMock()
+                mock_conn.cursor.return_value.fetchall.return_value = []
+                mock_connect.return_value = mock_conn
+
+                def search(query, max_results, timeout):
+                    if query == 'inauthor:Broken':
+                        raise RuntimeError("timeout")
+                    return [{'title': 'Good Book', 'author': 'Fine'}]
+                mock_search.side_effect = search
+
+                books = helpers_module.find_new_books_by_authors(['Broken', 'Fine'])
+
+                assert list(books) == ['Fine']
+                assert [b['title'] for b in books['Fine']] == ['Good Book']
+
+
+class TestRefreshRecommendations:
+    def test_only_changed_authors_are_searched(self, helpers_module):
+        from datetime import datetime
+        recent = datetime.now()
+        with patch('helpers.mariadb.connect') as mock_connect:
+            with patch('helpers.find_new_books_by_authors') as mock_find:
+                mock_conn = MagicMock()
+                mock_cursor = MagicMock()
+                mock_conn.cursor.return_value = mock_cursor
+                mock_connect.return_value = mock_conn
+                mock_cursor.fetchall.side_effect = [
+                    # Read authors now
+                    [('Unchanged', 2, recent), ('Newly Read', 1, recent), ('More Read', 3, recent)],
+                    # Stored signatures
+                    [('Unchanged', 2, recent, recent), ('More Read', 2, recent, recent),
+                     ('No Longer Read', 1, recent, recent)],
+                ]
+                mock_find.return_value = {
+                    'Newly Read': [{'title': 'Rec', 'author': 'Newly Read'}],
+                    'More Read': [],
+                }
+
+                result = helpers_module.refresh_recommendations()
+
+                assert sorted(mock_find.call_args[0][0]) == ['More Read', 'Newly Read']
+                assert result == {'refreshed': 2, 'pending': 0, 'removed': 1}
+                deleted = [c for c in mock_cursor.execute.call_args_list
+                           if 'DELETE FROM recommendations ' in c[0][0]]
+                assert sorted(deleted[0][0][1]) == ['More Read', 'Newly Read', 'No Longer Read']
+                inserted = mock_cursor.executemany.call_args_list[0][0][1]
+                assert [row[:3] for row in inserted] == [('Newly Read', 'Rec', 'Newly Read')]
+                mock_conn.commit.assert_called()
+
+    def test_up_to_date_store_skips_google(self, helpers_module):
+        from datetime import datetime
+        recent = datetime.now()
+        with patch('helpers.mariadb.connect') as mock_connect:
+            with patch('helpers.find_new_books_by_authors') as mock_find:
+                mock_conn = MagicMock()
+                mock_cursor = MagicMock()
+                mock_conn.cursor.return_value = mock_cursor
+                mock_connect.return_value = mock_conn
+                mock_cursor.fetchall.side_effect = [
+                    [('Author', 2, recent)],
+                    [('Author', 2, recent, recent)],
+                ]
+
+                result = helpers_module.refresh_recommendations()
+
+                assert not mock_find.called
+                assert result == {'refreshed': 0, 'pending': 0, 'removed': 0}
+
+
+class TestGetEbookByBookId:
+    def test_returns_path_and_hash(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_cursor = mock_connect.return_value.cursor.return_value
+            mock_cursor.fetchone.return_value = {'path': 'ebooks/1_a.pdf', 'sha256': 'ab', 'size': 3}
+            assert helpers_module.get_ebook_by_book_id(1)['sha256'] == 'ab'
+
+    def test_book_without_ebook(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_cursor = mock_connect.return_value.cursor.return_value
+            mock_cursor.fetchone.return_value = {'path': None, 'sha256': None, 'size': None}
+            assert helpers_module.get_ebook_by_book_id(1) is None
+
+
+class TestCompactEbooks:
+    def test_migrates_legacy_files_and_deduplicates(self, helpers_module, tmp_path):
+        from ebooks import EbookStore
+        store = EbookStore(str(tmp_path))
+        first, second = tmp_path / '1_dune.epub', tmp_path / '2_dune copy.epub'
+        first.write_bytes(b'same')
+        second.write_bytes(b'same')
+        past = os.stat(first).st_mtime - 7200
+        for path in (first, second):
+            os.utime(path, (past, past))
+
+        with patch('helpers.mariadb.connect') as mock_connect, \
+                patch.object(helpers_module, 'ebook_store', store):
+            mock_cursor = mock_connect.return_value.cursor.return_value
+            blob = store.blob_path(__import__('hashlib').sha256(b'same').hexdigest())
+            mock_cursor.fetchall.side_effect = [
+                [(1, str(first)), (2, str(second))],
+                [(blob,)],
+            ]
+            mock_cursor.fetchone.return_value = {'files': 1, 'books': 2, 'logical_bytes': 8, 'stored_bytes': 4}
+
+            result = helpers_module.compact_ebooks()
+
+        updates = mock_cursor.executemany.call_args[0][1]
+        assert [(row[0], row[3], row[4]) for row in updates] == [(blob, 'dune.epub', 1), (blob, 'dune copy.epub', 2)]
+        assert result['migrated'] == 2
+        assert result['removed'] == 2 and result['freed'] == 8
+        assert result['saved_bytes'] == 4
+        assert not first.exists() and not second.exists()
+        assert os.path.exists(blob)
+
+
+class TestBulkUpdateBooks:
+    def _run(self, helpers_module, operations, books=((1,), (2,)), tags=((7,),)):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = mock_connect.return_value
+            mock_cursor = mock_conn.cursor.return_value
+            mock_cursor.fetchall.side_effect = [list(books), list(tags)]
+            results = helpers_module.bulk_update_books(operations)
+        return results, mock_conn, mock_cursor
+
+    def test_one_transaction_with_executemany(self, helpers_module):
+        results, mock_conn, mock_cursor = self._run(helpers_module, [
+            {'ids': [1, 2, 3], 'status': 'Read', 'rating': 5},
+            {'ids': [2], 'physical_copy': True, 'add_tags': [7], 'remove_tags': [7]},
+        ])
+
+        assert results == [{'id': 1, 'outcome': 'updated'}, {'id': 2, 'outcome': 'updated'},
+                           {'id': 3, 'outcome': 'not_found'}]
+        calls = mock_cursor.executemany.call_args_list
+        assert len(calls) == 4
+        sql, rows = calls[0][0]
+        assert sql.index('last_status_change') < sql.index('status = %s')
+        assert [row[-1] for row in rows] == [1, 2]
+        assert rows[0][1] == rows[1][1]  # one timestamp for the whole batch
+        assert calls[1][0][1] == [(1, 2)]
+        assert calls[2][0] == ("INSERT IGNORE INTO book_tags (book_id, tag_id) VALUES (%s, %s)", [(2, 7)])
+        mock_conn.commit.assert_called_once()
+
+    def test_unknown_tag_rolls_back(self, helpers_module):
+        with pytest.raises(ValueError, match='Unknown tag ids: 9'):
+            self._run(helpers_module, [{'ids': [1], 'add_tags': [9]}], tags=[])
+
+    @pytest.mark.parametrize('operations', [
+        [],
+        [{'ids': [], 'status': 'Read'}],
+        [{'ids': [1]}],
+        [{'ids': [1], 'status': 'Lost'}],
+        [{'ids': [1], 'rating': 6}],
+        [{'ids': ['1'], 'rating': 1}],
+        [{'ids': list(range(1, 1002)), 'rating': 1}],
+    ])
+    def test_invalid_requests(self, helpers_module, operations):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            with pytest.raises(ValueError):
+                helpers_module.bulk_update_books(operations)
+            assert not mock_connect.called
+
+
+class TestFacetIndex:
+    def test_filter_books_fetches_resolved_ids(self, helpers_module):
+        with patch.object(helpers_module, 'FACET_INDEX_ENABLED', True), \
+                patch('helpers.mariadb.connect') as mock_connect:
+            mock_cursor = mock_connect.return_value.cursor.return_value
+            mock_cursor.fetchone.return_value = (4,)
+            mock_cursor.fetchall.side_effect = [
+                [(1, 'Read', 5, 0, 0), (2, 'TBR', 0, 0, 0), (3, 'Read', 0, 0, 1)],  # facets
+                [(3, 9)],  # tag links
+                [],  # books
+                [],  # tags for hydration
+            ]
+
+            helpers_module.filter_books(status_filters=['Read'], format_filters=['physical'])
+
+        sql, params = next(c[0] for c in mock_cursor.execute.call_args_list if 'b.id IN' in c[0][0])
+        assert 'HAVING' not in sql and sql.rstrip().endswith('ORDER BY b.id')
+        assert params == [3]
+        assert helpers_module.facet_index.revision == 4
+
+    def test_no_match_skips_the_query(self, helpers_module):
+        with patch.object(helpers_module, 'FACET_INDEX_ENABLED', True), \
+                patch.object(helpers_module, 'resolve_facets', return_value=[]), \
+                patch('helpers.mariadb.connect') as mock_connect:
+            assert helpers_module.filter_books(tag_ids=[5]) == []
+            assert not mock_connect.called
+
+    def test_writes_update_the_index_in_place(self, helpers_module):
+        helpers_module.facet_index.load(4, [(3, 'Read', 0, 0, 0)], [])
+        with patch.object(helpers_module, 'FACET_INDEX_ENABLED', True), \
+                patch('helpers.mariadb.connect') as mock_connect:
+            mock_cursor = mock_connect.return_value.cursor.return_value
+            mock_cursor.fetchone.return_value = (5,)
+            mock_cursor.fetchall.side_effect = [[(3, 'Read', 0, 0, 1)], []]
+
+            helpers_module.update_physical_copy(3, 1)
+
+        assert helpers_module.facet_index.revision == 5
+        assert helpers_module.facet_index.resolve(format_filters=['physical']) == [3]
+
+    def test_insert_adds_the_book_in_place(self, helpers_module):
+        helpers_module.facet_index.load(4, [(3, 'Read', 0, 0, 0)], [])
+        with patch.object(helpers_module, 'FACET_INDEX_ENABLED', True), \
+                patch('helpers.mariadb.connect') as mock_connect:
+            mock_cursor = mock_connect.return_value.cursor.return_value
+            mock_cursor.fetchone.return_value = (5,)
+            mock_cursor.fetchall.side_effect = [[(7,)], [(7, 'TBR', 0, 0, 0)], []]
+
+            assert helpers_module.insert_book({'title': 'Dune', 'author': 'Frank Herbert',
+                                               'isbn': '9780441172719'})
+
+        assert helpers_module.facet_index.revision == 5
+        assert helpers_module.facet_index.resolve(status_filters=['TBR']) == [7]
+        assert helpers_module.facet_index.stats()['rebuilds'] == 1
+
+    def test_tag_delete_drops_links_in_place(self, helpers_module):
+        helpers_module.facet_index.load(4, [(3, 'Read', 0, 0, 0), (4, 'TBR', 0, 0, 0)], [(3, 9), (4, 9), (4, 2)])
+        with patch.object(helpers_module, 'FACET_INDEX_ENABLED', True), \
+                patch('helpers.mariadb.connect') as mock_connect:
+            mock_cursor = mock_connect.return_value.cursor.return_value
+            mock_cursor.fetchone.return_value = (5,)
+            mock_cursor.fetchall.side_effect = [
+                [(3,), (4,)],  # books that had the tag
+                [(3, 'Read', 0, 0, 0), (4, 'TBR', 0, 0, 0)],
+                [(4, 2)],  # links left afterwards
+            ]
+
+            assert helpers_module.delete_tag(9)
+
+        assert helpers_module.facet_index.revision == 5
+        assert helpers_module.facet_index.resolve(tag_ids=[9]) == []
+        assert helpers_module.facet_index.resolve(tag_ids=[2]) == [4]
+        assert helpers_module.facet_index.stats()['tags'] == 1
+
+
+class TestMetadataEnrichment:
+    PENDING = [
+        {'id': 1, 'title': 'Dune', 'author': 'Frank Herbert', 'isbn': None, 'enrichment_attempts': 0},
+        {'id': 2, 'title': 'Emma', 'author': 'Jane Austen', 'isbn': None, 'enrichment_attempts': 1},
+        {'id': 3, 'title': 'Lost', 'author': 'Nobody', 'isbn': None, 'enrichment_attempts': 4},
+    ]
+
+    def _run(self, helpers_module, fetch):
+        with patch('helpers.mariadb.connect') as mock_connect, \
+                patch('helpers.fetch_volumes', side_effect=fetch):
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.fetchall.return_value = [dict(book) for book in self.PENDING]
+            mock_connect.return_value = mock_conn
+            counts = helpers_module.enrich_pending_books()
+        updates = {call[0][0].split('SET')[1].split()[0]: call[0][1]
+                   for call in mock_cursor.executemany.call_args_list}
+        return counts, updates, mock_conn
+
+    def test_success_retry_and_give_up(self, helpers_module):
+        from google_cache import GoogleBooksError
+
+        def fetch(query, n):
+            if 'Dune' in query:
+                return [{'volumeInfo': {'publisher': 'Ace', 'industryIdentifiers': [
+                    {'type': 'ISBN_13', 'identifier': '9780441172719'}]}}]
+            raise GoogleBooksError(503)
+
+        counts, updates, mock_conn = self._run(helpers_module, fetch)
+
+        assert counts == {'enriched': 1, 'retrying': 1, 'failed': 1}
+        done = updates['isbn=COALESCE(isbn,']
+        assert done == [('9780441172719', None, 'Ace', None, None, None, 1)]
+        retries = {row[-1]: row for row in updates['enrichment_state=%s,']}
+        assert retries[2][:2] == ('pending', 2)
+        assert retries[3][:2] == ('failed', 5)
+        mock_conn.commit.assert_called_once()
+
+    def test_not_found_is_done(self, helpers_module):
+        counts, updates, _ = self._run(helpers_module, lambda query, n: [])
+        assert counts == {'enriched': 3, 'retrying': 0, 'failed': 0}
+
+    def test_backoff_doubles_up_to_cap(self, helpers_module):
+        assert helpers_module.enrichment_backoff(1) == helpers_module.ENRICHMENT_BACKOFF
+        assert helpers_module.enrichment_backoff(3) == 4 * helpers_module.ENRICHMENT_BACKOFF
+        assert helpers_module.enrichment_backoff(30) == helpers_module.ENRICHMENT_MAX_BACKOFF
+
+
+class TestAddBooksByIsbn:
+    @staticmethod
+    def _volume(title, isbn):
+        return {'volumeInfo': {'title': title, 'authors': ['Author'],
+                               'industryIdentifiers': [{'type': 'ISBN_13', 'identifier': isbn}]}}
+
+    def test_outcomes_and_single_transaction(self, helpers_module):
+        volumes = {
+            'isbn:9780441172719': [self._volume('Dune', '9780441172719')],
+            'isbn:9780141439587': [self._volume('Emma', '1'), self._volume('Emma (Annotated)', '2')],
+            'isbn:9780000000002': [],
+        }
+        with patch('helpers.mariadb.connect') as mock_connect, \
+                patch('helpers.fetch_volumes', side_effect=lambda query, n: volumes[query]) as mock_fetch:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.fetchall.side_effect = [[('9780765326355',)], []]
+            mock_connect.return_value = mock_conn
+
+            results = helpers_module.add_books_by_isbn([
+                '978-0-441-17271-9', '9780441172719', '9780141439587',
+                '9780000000002', '9780765326355', 'not-an-isbn',
+            ])
+
+        assert [(r['isbn'], r['outcome']) for r in results] == [
+            ('9780441172719', 'added'),
+            ('9780141439587', 'multiple'),
+            ('9780000000002', 'not_found'),
+            ('9780765326355', 'exists'),
+            ('NOTANISBN', 'invalid'),
+        ]
+        assert len(results[1]['candidates']) == 2
+        assert mock_fetch.call_count == 3
+        rows = mock_cursor.executemany.call_args[0][1]
+        assert [row[0] for row in rows] == ['Dune']
+        mock_conn.commit.assert_called_once()
+
+    def test_stores_scanned_isbn_and_reports_existing_titles(self, helpers_module):
+        volumes = {
+            'isbn:9780441172719': [self._volume('Dune', '0441172717')],
+            'isbn:9780141439587': [self._volume('Emma', '0141439580')],
+            'isbn:0141439580': [self._volume('Emma', '0141439580')],
+        }
+        with patch('helpers.mariadb.connect') as mock_connect, \
+                patch('helpers.fetch_volumes', side_effect=lambda query, n: volumes[query]):
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.fetchall.side_effect = [[], [('DUNE', 'author')]]
+            mock_connect.return_value = mock_conn
+
+            results = helpers_module.add_books_by_isbn(['9780441172719', '9780141439587', '0141439580'])
+
+        assert [(r['isbn'], r['outcome']) for r in results] == [
+            ('9780441172719', 'exists'),
+            ('9780141439587', 'added'),
+            ('0141439580', 'exists'),
+        ]
+        rows = mock_cursor.executemany.call_args[0][1]
+        assert [(row[0], row[6]) for row in rows] == [('Emma', '9780141439587')]
+
+    def test_failed_lookup_is_an_error(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect, \
+                patch('helpers.fetch_volumes', side_effect=requests.exceptions.ConnectionError("offline")):
+            mock_connect.return_value.cursor.return_value.fetchall.return_value = []
+            results = helpers_module.add_books_by_isbn(['9780441172719'])
+
+        assert results == [{'isbn': '9780441172719', 'outcome': 'error', 'message': 'offline'}]
+
+
 class TestFilterBooks:
     def test_filter_books_with_status(self, helpers_module):
         with patch('helpers.mariadb.connect') as mock_connect:
@@ -265,24 +855,267 @@ class TestFilterBooks:
                 assert isinstance(books, list)
 
 
+class TestGetBooksPage:
+    @staticmethod
+    def _run(helpers_module, rows, **kwargs):
+        helpers_module.db_pool.dispose()
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.fetchall.side_effect = [rows, []]
+            mock_connect.return_value = mock_conn
+
+            books, next_cursor = helpers_module.get_books_page(**kwargs)
+            return books, next_cursor, mock_cursor
+
+    def test_page_uses_keyset_condition_and_limit(self, helpers_module):
+        rows = [{'id': i, 'title': f'Book {i}'} for i in (11, 12, 13)]
+        books, next_cursor, cursor = self._run(
+            helpers_module, rows, limit=2, cursor='10', fields=['title'])
+
+        sql, params = cursor.execute.call_args_list[0][0]
+        assert 'b.id > %s' in sql
+        assert 'ORDER BY b.id' in sql
+        assert params[-2:] == [10, 3]
+        assert [b['id'] for b in books] == [11, 12]
+        assert next_cursor == '12'
+
+    def test_last_page_has_no_cursor(self, helpers_module):
+        books, next_cursor, _ = self._run(
+            helpers_module, [{'id': 1, 'title': 'Only'}], limit=5, fields=['title'])
+
+        assert len(books) == 1
+        assert next_cursor is None
+
+    def test_projection_selects_only_requested_columns(self, helpers_module):
+        _, _, cursor = self._run(
+            helpers_module, [], limit=5, fields=['title', 'status', 'bogus; DROP TABLE books'])
+
+        sql = cursor.execute.call_args_list[0][0][0]
+        select = sql.split('FROM')[0]
+        assert 'b.title' in select and 'b.status' in select and 'b.id' in select
+        assert 'description' not in select
+        assert 'DROP' not in sql
+
+    def test_tags_are_hydrated_only_when_requested(self, helpers_module):
+        _, _, cursor = self._run(helpers_module, [{'id': 1}], limit=5, fields=['title'])
+        assert cursor.execute.call_count == 1
+
+        _, _, cursor = self._run(helpers_module, [{'id': 1}], limit=5, fields=['title', 'tags'])
+        assert cursor.execute.call_count == 2
+
+    def test_filters_are_applied(self, helpers_module):
+        _, _, cursor = self._run(
+            helpers_module, [], limit=5, status_filters=['Read'], tag_ids=[3])
+
+        sql, params = cursor.execute.call_args_list[0][0]
+        assert 'b.status IN' in sql
+        assert 'bt.tag_id IN' in sql
+        assert 'Read' in params and 3 in params
+
+    def test_limit_is_capped(self, helpers_module):
+        _, _, cursor = self._run(helpers_module, [], limit=10**6)
+        assert cursor.execute.call_args_list[0][0][1][-1] == helpers_module.MAX_PAGE_SIZE + 1
+
+
+class TestSearchLibrary:
+    def test_last_word_is_a_prefix_match(self, helpers_module):
+        condition, params, boolean_query = helpers_module.build_search_condition('Dune Messi')
+
+        assert 'MATCH(' in condition
+        assert boolean_query == '+dune +messi*'
+        assert params == ['+dune +messi*']
+
+    def test_short_last_word_falls_back_to_like(self, helpers_module):
+        condition, params, boolean_query = helpers_module.build_search_condition('harry po')
+
+        assert boolean_query == '+harry'
+        assert 'LIKE' in condition
+        assert params[0] == '+harry'
+        assert 'po%' in params
+
+    def test_operators_are_not_passed_through(self, helpers_module):
+        _, _, boolean_query = helpers_module.build_search_condition('-dune "messiah')
+        assert boolean_query == '+dune +messiah*'
+
+    def test_empty_query_returns_nothing(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            assert helpers_module.search_library('   ') == ([], None)
+            mock_connect.assert_not_called()
+
+    def test_ranked_and_paginated_with_filters(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            rows = [{'id': i, 'title': f'Dune {i}', 'relevance': 1.0} for i in (1, 2, 3)]
+            mock_cursor.fetchall.return_value = rows
+            mock_connect.return_value = mock_conn
+
+            books, next_offset = helpers_module.search_library(
+                'dune', status_filters=['Read'], limit=2, offset=4, fields=['title'])
+
+        sql, params = mock_cursor.execute.call_args_list[0][0]
+        assert 'ORDER BY relevance DESC' in sql
+        assert 'b.status IN' in sql
+        assert 'Read' in params
+        assert params[-2:] == [3, 4]
+        assert [b['id'] for b in books] == [1, 2]
+        assert 'relevance' not in books[0]
+        assert next_offset == 6
+        assert mock_cursor.execute.call_count == 1
+
+
+class TestGetBook:
+    def test_primary_key_lookup_with_tags(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.fetchone.return_value = {'id': 4, 'title': 'A'}
+            mock_cursor.fetchall.return_value = [{'id': 1, 'name': 'Fiction', 'color': '#ff0000'}]
+            mock_connect.return_value = mock_conn
+
+            book = helpers_module.get_book(4, fields=['title', 'tags'])
+
+        sql, params = mock_cursor.execute.call_args_list[0][0]
+        assert 'WHERE b.id = %s' in sql
+        assert params == (4,)
+        assert book == {'id': 4, 'title': 'A',
+                        'tags': [{'id': 1, 'name': 'Fiction', 'color': '#ff0000'}]}
+        assert mock_cursor.execute.call_count == 2
+
+    def test_missing_book_returns_none(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.fetchone.return_value = None
+            mock_connect.return_value = mock_conn
+
+            assert helpers_module.get_book(999) is None
+            assert mock_cursor.execute.call_count == 1
+
+
+class TestIterBooks:
+    def test_reads_in_keyset_batches_with_tags(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.fetchall.side_effect = [
+                [{'id': 1}, {'id': 2}], [],
+                [{'id': 5}], [],
+            ]
+            mock_connect.return_value = mock_conn
+
+            books = list(helpers_module.iter_books(fields=['title', 'tags'], batch_size=2))
+
+        assert [b['id'] for b in books] == [1, 2, 5]
+        assert all(b['tags'] == [] for b in books)
+        first_batch, second_batch = (call[0][1] for call in mock_cursor.execute.call_args_list[::2])
+        assert first_batch[-2:] == [0, 2]
+        assert second_batch[-2:] == [2, 2]
+        assert mock_cursor.execute.call_count == 4
+
+    def test_is_lazy(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            books = helpers_module.iter_books()
+            assert not mock_connect.called
+
+
+class TestGetLibrarySummary:
+    def test_summary_comes_from_one_query(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.fetchone.return_value = {
+                'total_books': 12, 'total_read': 5, 'read_this_year': 2,
+                'reading_id': 3, 'reading_title': 'Dune', 'reading_author': 'Frank Herbert'
+            }
+            mock_connect.return_value = mock_conn
+
+            summary = helpers_module.get_library_summary()
+
+            assert mock_cursor.execute.call_count == 1
+            assert summary == {
+                'total_books': 12, 'total_read': 5, 'read_this_year': 2,
+                'current_reading': {'id': 3, 'title': 'Dune', 'author': 'Frank Herbert'},
+            }
+
+    def test_summary_without_current_reading(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.fetchone.return_value = {
+                'total_books': 0, 'total_read': None, 'read_this_year': None,
+                'reading_id': None, 'reading_title': None, 'reading_author': None
+            }
+            mock_connect.return_value = mock_conn
+
+            summary = helpers_module.get_library_summary()
+
+            assert summary['total_read'] == 0
+            assert summary['current_reading'] is None
+
+
 class TestGetBooksStats:
     def test_get_books_stats(self, helpers_module):
-        with patch('helpers.get_all_books') as mock_get_all:
-            from collections import Counter
-            mock_get_all.return_value = [
-                {'id': 1, 'title': 'Book 1', 'author': 'Author 1',
-                 'status': 'Read', 'last_status_change': '2024-01-15 10:30:00',
-                 'tags': []},
-                {'id': 2, 'title': 'Book 2', 'author': 'Author 1',
-                 'status': 'TBR', 'last_status_change': None,
-                 'tags': []}
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_conn = MagicMock()
+            mock_cursor = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_cursor.fetchall.side_effect = [
+                [('Read', 1), ('TBR', 1)],
+                [('Author 1', 2)],
+                [('Fiction', 2)],
+                [(2024, 1)],
             ]
-            
+            mock_connect.return_value = mock_conn
+
             total, status_breakdown, author_breakdown, years, tag_breakdown = helpers_module.get_books_stats()
-            
+
             assert total == 2
             assert status_breakdown['Read'] == 1
             assert status_breakdown['TBR'] == 1
+            assert author_breakdown['Author 1'] == 2
+            assert tag_breakdown['Fiction'] == 2
+            assert years[2024] == 1
+
+    def test_get_books_stats_never_loads_book_rows(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            with patch('helpers.get_all_books') as mock_get_all:
+                mock_conn = MagicMock()
+                mock_cursor = MagicMock()
+                mock_conn.cursor.return_value = mock_cursor
+                mock_cursor.fetchall.return_value = []
+                mock_connect.return_value = mock_conn
+
+                total, *_ = helpers_module.get_books_stats()
+
+                assert total == 0
+                assert not mock_get_all.called
+                statements = [c[0][0] for c in mock_cursor.execute.call_args_list]
+                assert all('GROUP BY' in sql for sql in statements)
+
+    def test_case_variant_authors_stay_separate(self, helpers_module):
+        with patch('helpers.mariadb.connect') as mock_connect:
+            mock_cursor = mock_connect.return_value.cursor.return_value
+            mock_cursor.fetchall.side_effect = [
+                [('Read', 3)],
+                [('Ursula K. Le Guin', 2), ('ursula k. le guin', 1)],
+                [],
+                [],
+            ]
+
+            _, _, author_breakdown, _, _ = helpers_module.get_books_stats()
+
+            assert author_breakdown == {'Ursula K. Le Guin': 2, 'ursula k. le guin': 1}
+            author_sql = mock_cursor.execute.call_args_list[1][0][0]
+            assert 'GROUP BY BINARY TRIM(author)' in author_sql
 
 
 class TestTagManagement:
@@ -0,0 +1,125 @@
+import os
+import sys
+from datetime import datetime
+from unittest.mock import patch
+
+import mariadb
+import pytest
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+import importer
+from importer import ImportReport, import_csv, normalize_row, parse_csv
+
+GOODREADS_CSV = (
+    'Book Id,Title,Author,ISBN,ISBN13,My Rating,Publisher,Year Published,Date Read,Exclusive Shelf\n'
+    '1,"The Way of Kings (The Stormlight Archive, #1)",Brandon Sanderson,"=""0765326353""",'
+    '"=""9780765326355""",5,Tor Books,2010,2023/04/01,read\n'
+    '2,Dune,Frank Herbert,"=""""","=""""",0,,1965,,to-read\n'
+    '3,,Nobody,,,0,,,,read\n'
+    '4,Dune,Frank Herbert,,,0,,,,to-read\n'
+)
+
+
+class TestNormalizeRow:
+
+    def test_goodreads_row(self):
+        book = parse_csv(GOODREADS_CSV)[0][1]
+
+        assert book['title'] == 'The Way of Kings'
+        assert book['series'] == 'The Stormlight Archive'
+        assert book['author'] == 'Brandon Sanderson'
+        assert book['isbn'] == '9780765326355'
+        assert book['status'] == 'Read'
+        assert book['rating'] == 5
+        assert book['last_status_change'] == datetime(2023, 4, 1)
+        assert book['publishedDate'] == '2010'
+
+    def test_generic_row_with_lowercase_headers(self):
+        book = normalize_row({'title': 'Emma', 'author': 'Jane Austen', 'status': 'reading', 'rating': '4'})
+        assert book['status'] == 'Reading'
+        assert book['rating'] == 4
+        assert book['isbn'] is None
+
+    @pytest.mark.parametrize('row, message', [
+        ({'title': 'Emma'}, 'required'),
+        ({'title': 'Emma', 'author': 'A', 'status': 'lost'}, 'status'),
+        ({'title': 'Emma', 'author': 'A', 'rating': '9'}, 'between'),
+        ({'title': 'Emma', 'author': 'A', 'rating': 'great'}, 'number'),
+        ({'title': 'Emma', 'author': 'A', 'rating': 'inf'}, 'number'),
+        ({'title': 'Emma', 'author': 'A', 'rating': 'nan'}, 'number'),
+    ])
+    def test_invalid_rows(self, row, message):
+        with pytest.raises(ValueError, match=message):
+            normalize_row(row)
+
+    def test_errors_and_duplicates_are_reported(self):
+        report = ImportReport()
+        books = parse_csv(GOODREADS_CSV, report)
+
+        assert [line for line, _ in books] == [2, 3]
+        assert report.errors == [{'line': 4, 'title': None, 'error': 'title and author are required'}]
+        assert report.duplicates == 1
+        assert report.total == 4
+
+
+class TestImportCsv:
+
+    def test_batches_use_one_insert_each(self):
+        csv_text = 'title,author\n' + ''.join(f'Book {i},Author\n' for i in range(5))
+        with patch('importer.insert_books', side_effect=lambda books: len(books)) as mock_insert:
+            report = import_csv(csv_text, enrich=False, batch_size=2)
+
+        assert [len(call[0][0]) for call in mock_insert.call_args_list] == [2, 2, 1]
+        assert report.imported == 5
+        assert report.processed == 5
+        assert report.state == 'done'
+
+    def test_failed_batch_is_retried_row_by_row(self):
+        def insert(books):
+            if len(books) > 1 or books[0]['title'] == 'Bad':
+                raise mariadb.Error("data too long")
+            return 1
+
+        with patch('importer.insert_books', side_effect=insert):
+            report = import_csv('title,author\nGood,A\nBad,B\n', enrich=False)
+
+        assert report.imported == 1
+        assert report.errors == [{'line': 3, 'title': 'Bad', 'error': 'data too long'}]
+
+    def test_missing_metadata_is_enriched_concurrently(self):
+        meta = {'isbn': '9780441172719', 'publisher': 'Ace', 'series': None}
+        csv_text = 'title,author,isbn,publisher\nDune,Frank Herbert,,\nEmma,Jane Austen,9780141439587,Penguin\n'
+        with patch('importer.get_google_books_metadata', return_value=meta) as mock_lookup, \
+                patch('importer.insert_books', side_effect=lambda books: len(books)) as mock_insert:
+            report = import_csv(csv_text)
+
+        mock_lookup.assert_called_once_with('Dune', 'Frank Herbert')
+        written = mock_insert.call_args[0][0]
+        assert written[0]['isbn'] == '9780441172719' and written[0]['publisher'] == 'Ace'
+        assert report.enriched == 1
+
+    def test_progress_is_reported_per_batch(self):
+        seen = []
+        with patch('importer.insert_books', side_effect=lambda books: len(books)):
+            import_csv('title,author\nA,B\nC,D\nE,F\n', enrich=False, batch_size=2,
+                       progress=lambda report: seen.append(report.processed))
+
+        assert seen == [2, 3]
+
+
+class TestImportJobs:
+
+    def test_background_import_reports_progress(self):
+        with patch('importer.insert_books', side_effect=lambda books: len(books)):
+            job_id = importer.start_import('title,author\nA,B\n', enrich=False)
+            for _ in range(100):
+                status = importer.get_import(job_id)
+                if status['state'] != 'running':
+                    break
+                importer.time.sleep(0.01)
+
+        assert status['state'] == 'done'
+        assert status['imported'] == 1
+        assert importer.get_import('missing') is None
@@ -0,0 +1,79 @@
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+import migrations
+
+
+def _connection(current_version, lock_result=1):
+    conn = MagicMock()
+    cursor = MagicMock()
+    conn.cursor.return_value = cursor
+    cursor.fetchone.side_effect = [(lock_result,), (current_version,), (1,)]
+    return conn, cursor
+
+
+def _executed(cursor):
+    return [call[0][0] for call in cursor.execute.call_args_list]
+
+
+class TestRunMigrations:
+
+    def test_fresh_database_applies_everything_in_order(self):
+        conn, cursor = _connection(None)
+
+        applied = migrations.run_migrations(conn)
+
+        assert applied == sorted(m[0] for m in migrations.MIGRATIONS)
+        recorded = [call[0][1][0] for call in cursor.execute.call_args_list
+                    if 'INSERT INTO schema_version' in call[0][0]]
+        assert recorded == applied
+        assert conn.commit.call_count == len(applied)
+
+    def test_only_newer_migrations_are_applied(self):
+        test_migrations = [
+            (1, "one", ["CREATE TABLE one (id INT)"]),
+            (2, "two", ["CREATE TABLE two (id INT)"]),
+            (3, "three", ["CREATE TABLE three (id INT)"]),
+        ]
+        conn, cursor = _connection(2)
+
+        applied = migrations.run_migrations(conn, test_migrations)
+
+        assert applied == [3]
+        executed = _executed(cursor)
+        assert "CREATE TABLE three (id INT)" in executed
+        assert "CREATE TABLE one (id INT)" not in executed
+
+    def test_up_to_date_database_runs_no_ddl(self):
+        latest = max(m[0] for m in migrations.MIGRATIONS)
+        conn, cursor = _connection(latest)
+
+        assert migrations.run_migrations(conn) == []
+        assert not any('ALTER TABLE' in sql for sql in _executed(cursor))
+        assert not conn.commit.called
+
+    def test_lock_is_released_when_a_migration_fails(self):
+        conn, cursor = _connection(0)
+
+        def execute(sql, params=None):
+            if sql == "BROKEN":
+                raise RuntimeError("syntax error")
+
+        cursor.execute.side_effect = execute
+
+        with pytest.raises(RuntimeError):
+            migrations.run_migrations(conn, [(1, "broken", ["BROKEN"])])
+        assert any('RELEASE_LOCK' in sql for sql in _executed(cursor))
+
+    def test_refuses_to_run_without_lock(self):
+        conn, cursor = _connection(0, lock_result=0)
+
+        with pytest.raises(RuntimeError):
+            migrations.run_migrations(conn)
+        assert not any('schema_version' in sql for sql in _executed(cursor))
@@ -0,0 +1,41 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from scheduler import PeriodicJob
+
+
+class TestPeriodicJob:
+
+    def test_runs_immediately_and_on_trigger(self):
+        ran = threading.Semaphore(0)
+        job = PeriodicJob('test-job', lambda: ran.release(), interval=3600)
+        try:
+            assert job.start() is True
+            assert ran.acquire(timeout=5)
+            assert job.trigger() is True
+            assert ran.acquire(timeout=5)
+        finally:
+            job.stop(timeout=5)
+        assert not job.running
+
+    def test_disabled_when_interval_is_zero(self):
+        job = PeriodicJob('disabled', lambda: None, interval=0)
+        assert job.start() is False
+        assert job.trigger() is False
+
+    def test_failures_are_recorded_and_do_not_stop_the_job(self):
+        def fail():
+            raise RuntimeError("boom")
+
+        job = PeriodicJob('failing', fail, interval=3600)
+        assert job.run_once() is None
+        assert isinstance(job.last_error, RuntimeError)
+
+    def test_run_once_records_result(self):
+        job = PeriodicJob('ok', lambda: {'refreshed': 1}, interval=3600)
+        assert job.run_once() == {'refreshed': 1}
+        assert job.last_error is None